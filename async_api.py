@@ -0,0 +1,403 @@
+"""
+Asyncio API for embedding the pipeline in async services.
+
+:class:`AsyncPipeline` lets one event loop drive many jobs at once:
+
+* network I/O never blocks the loop -- playlists are fetched with asyncio
+  streams and yt-dlp runs as an asyncio subprocess;
+* downloads are limited by ``max_downloads`` (a semaphore);
+* transcription runs on a thread pool with ``inference_workers`` threads,
+  each holding its own model copy (see :func:`transcriber.set_model_slot`),
+  so at most that many jobs use the CPU/GPU at a time.
+
+:meth:`AsyncPipeline.events` is an async iterator of progress and segment
+events for one job; :func:`agenerate_transcript` is the awaitable
+equivalent of :func:`workflow.generate_transcript`.
+
+Cancelling a job (cancelling the task, or leaving the ``async for`` early)
+terminates its yt-dlp process and removes the partial download.  Once
+inference has started, the worker thread stops at the next window
+boundary (segments are produced in :data:`workflow.STREAM_WINDOW_SECONDS`
+windows) and the temporary audio is removed when it does.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import itertools
+import logging
+import os
+import ssl
+import subprocess
+import sys
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from download_scheduler import default_scheduler
+from hls import (
+    DEFAULT_MIN_BANDWIDTH,
+    FETCH_TIMEOUT_SECONDS,
+    USER_AGENT,
+    choose_rendition,
+    is_master_playlist,
+    parse_master_playlist,
+)
+from logger import job_context
+from resources import plan_resources
+from scratch import default_scratch
+from search_index import DEFAULT_INDEX_PATH
+from transcriber import make_temp_audio_path, set_model_slot, validate_url, ytdlp_command
+from workflow import keep_temp_audio, remove_temp_audio, resolve_output_path, transcribe_to_output
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_DOWNLOADS = 100
+_MAX_REDIRECTS = 5
+_REDIRECT_CODES = {301, 302, 303, 307, 308}
+
+
+class TranscriptionCancelled(Exception):
+    """Raised inside an inference thread to stop a cancelled job."""
+
+
+# ---------------------------------------------------------------------------
+# Non-blocking network I/O
+# ---------------------------------------------------------------------------
+
+async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> bytes:
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        return b"".join(chunks)
+    if "content-length" in headers:
+        return await reader.readexactly(int(headers["content-length"]))
+    return await reader.read()
+
+
+async def _get(url: str) -> Tuple[int, str, Dict[str, str], bytes]:
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Unsupported URL: {url}")
+    https = parts.scheme == "https"
+    port = parts.port or (443 if https else 80)
+    reader, writer = await asyncio.open_connection(
+        parts.hostname, port,
+        ssl=ssl.create_default_context() if https else None,
+    )
+    try:
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        host = parts.hostname if parts.port is None else f"{parts.hostname}:{parts.port}"
+        writer.write(
+            f"GET {target} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {USER_AGENT}\r\n"
+            "Accept-Encoding: identity\r\nConnection: close\r\n\r\n".encode("latin-1")
+        )
+        await writer.drain()
+
+        status_line = (await reader.readline()).decode("latin-1").split(" ", 2)
+        if len(status_line) < 2:
+            raise urllib.error.URLError(f"malformed response from {parts.hostname}")
+        status, reason = int(status_line[1]), status_line[2].strip() if len(status_line) > 2 else ""
+        headers: Dict[str, str] = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = b"" if status in _REDIRECT_CODES else await _read_body(reader, headers)
+        return status, reason, headers, body
+    finally:
+        writer.close()
+        with contextlib.suppress(OSError):
+            await writer.wait_closed()
+
+
+async def afetch_text(url: str, timeout: float = FETCH_TIMEOUT_SECONDS) -> str:
+    """
+    Async :func:`hls.fetch_text`: GET *url* (following redirects) as UTF-8.
+
+    Each request waits for its host under the process-wide download
+    scheduler's limits; 429/503 answers are retried as for blocking fetches.
+
+    Raises:
+        urllib.error.HTTPError: For 4xx/5xx responses.
+        urllib.error.URLError: On timeouts, too many redirects or bad responses.
+        OSError: If the host cannot be reached.
+    """
+    scheduler = default_scheduler()
+    for _ in range(_MAX_REDIRECTS + 1):
+        try:
+            # A new coroutine per attempt: 429/503 answers are retried
+            status, reason, headers, body = await scheduler.aexchange(
+                url, lambda: asyncio.wait_for(_get(url), timeout),
+            )
+        except asyncio.TimeoutError:
+            raise urllib.error.URLError(f"timed out fetching {url}") from None
+        if status in _REDIRECT_CODES and "location" in headers:
+            url = urljoin(url, headers["location"])
+            continue
+        if status >= 400:
+            raise urllib.error.HTTPError(url, status, reason, None, None)  # type: ignore[arg-type]
+        return body.decode("utf-8", errors="replace")
+    raise urllib.error.URLError(f"too many redirects fetching {url}")
+
+
+async def _apick_audio_rendition(url: str, min_bandwidth: int) -> str:
+    """Async counterpart of ``transcriber._pick_audio_rendition`` (no size estimates)."""
+    if not urlsplit(url).path.lower().endswith(".m3u8"):
+        return url
+    try:
+        text = await afetch_text(url)
+    except (urllib.error.URLError, OSError, ValueError) as exc:
+        log.warning("Could not inspect master playlist (%s); using yt-dlp default.", exc)
+        return url
+    if not is_master_playlist(text):
+        return url
+    choice = choose_rendition(parse_master_playlist(text, url), min_bandwidth=min_bandwidth)
+    if choice is None:
+        return url
+    log.info("Selected %s (%s)", choice["kind"], choice["uri"])
+    return choice["uri"]
+
+
+async def adownload_audio(
+    m3u8_url: str,
+    output_path: str,
+    select_audio: bool = True,
+    min_bandwidth: int = DEFAULT_MIN_BANDWIDTH,
+) -> str:
+    """
+    Async :func:`transcriber.download_audio`; yt-dlp runs as a subprocess.
+
+    If the calling task is cancelled, yt-dlp is terminated and any partial
+    output is removed before :class:`asyncio.CancelledError` propagates.
+    """
+    m3u8_url = validate_url(m3u8_url)
+    source_url = await _apick_audio_rendition(m3u8_url, min_bandwidth) if select_audio else m3u8_url
+
+    async with default_scheduler().atransfer(source_url) as ticket:
+        log.info("Downloading audio from %s using yt-dlp...", source_url)
+        cmd, expected_file = ytdlp_command(source_url, output_path, rate_limit=ticket["rate_limit"])
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdin=asyncio.subprocess.DEVNULL, stdout=sys.stderr,
+        )
+        try:
+            returncode = await proc.wait()
+        except asyncio.CancelledError:
+            if proc.returncode is None:
+                proc.terminate()
+                await asyncio.shield(proc.wait())
+            base_name = os.path.splitext(output_path)[0]
+            for leftover in (expected_file, f"{base_name}.part", f"{base_name}.mp3.part"):
+                remove_temp_audio(leftover)
+            raise
+        if returncode == 0 and os.path.exists(expected_file):
+            ticket["output_bytes"] = os.path.getsize(expected_file)
+
+    if returncode != 0:
+        log.error("yt-dlp failed with exit code %d", returncode)
+        raise subprocess.CalledProcessError(returncode, cmd)
+    if os.path.exists(expected_file):
+        log.info("Audio saved to %s", expected_file)
+        return expected_file
+    raise FileNotFoundError(f"yt-dlp finished but {expected_file} was not found.")
+
+
+# ---------------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------------
+
+class AsyncPipeline:
+    """
+    Shared download limit and inference thread pool for async callers.
+
+    Args:
+        inference_workers: Threads running inference (default: from
+            :func:`resources.plan_resources` for *max_downloads* jobs).
+        max_downloads: Downloads allowed to run at once.
+    """
+
+    def __init__(
+        self,
+        inference_workers: Optional[int] = None,
+        max_downloads: int = DEFAULT_MAX_DOWNLOADS,
+    ) -> None:
+        if inference_workers is None:
+            inference_workers = plan_resources(jobs=max_downloads).inference_workers
+        self.inference_workers = inference_workers
+        self.max_downloads = max_downloads
+        slots = itertools.count()
+        self._executor = ThreadPoolExecutor(
+            max_workers=inference_workers,
+            thread_name_prefix="inference",
+            initializer=lambda: set_model_slot(next(slots)),
+        )
+        self._downloads: Optional[asyncio.Semaphore] = None
+
+    def _download_slots(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore belongs to the running loop
+        if self._downloads is None:
+            self._downloads = asyncio.Semaphore(self.max_downloads)
+        return self._downloads
+
+    async def events(
+        self,
+        url: str,
+        model_name: str = "base",
+        output_path: Optional[str] = None,
+        output_format: str = "pdf",
+        language: Optional[str] = None,
+        index_path: Optional[str] = DEFAULT_INDEX_PATH,
+        keep_audio: bool = False,
+        select_audio: bool = True,
+        min_bandwidth: int = DEFAULT_MIN_BANDWIDTH,
+        stream_segments: bool = True,
+        **options: Any,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run one job, yielding its events as they happen.
+
+        Events are dicts with a ``type``:
+
+        * ``status`` -- ``stage`` (``download`` / ``transcribe``) and ``message``;
+        * ``segment`` -- ``segment``, a final Whisper segment (only with
+          *stream_segments*);
+        * ``done`` -- ``output`` (transcript path) and ``result``.
+
+        Streaming segments transcribes window by window, as for NDJSON
+        output, so segment boundaries can differ from a
+        :func:`workflow.generate_transcript` run.  Without
+        *stream_segments* the audio is transcribed exactly as there.
+
+        Other keyword arguments are passed to
+        :func:`workflow.transcribe_to_output` (``refine_model``,
+        ``diarize``, ...).  Errors are raised from the iterator.
+        """
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        cancelled = False
+        output = resolve_output_path(output_path, fmt=output_format)
+        audio_path = make_temp_audio_path()
+
+        def _from_worker(event: Dict[str, Any]) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        def _on_segment(segment: Dict[str, Any]) -> None:
+            if cancelled:
+                raise TranscriptionCancelled(url)
+            _from_worker({"type": "segment", "segment": segment})
+
+        def _on_status(message: str) -> None:
+            if cancelled:
+                raise TranscriptionCancelled(url)
+            _from_worker({"type": "status", "stage": "transcribe", "message": message})
+
+        def _transcribe() -> dict:
+            try:
+                return transcribe_to_output(
+                    audio_path, url, output,
+                    model_name=model_name, output_format=output_format, language=language,
+                    on_status=_on_status, on_segment=_on_segment if stream_segments else None,
+                    index_path=index_path, **options,
+                )
+            finally:
+                if keep_audio:
+                    keep_temp_audio(audio_path)
+                else:
+                    remove_temp_audio(audio_path)
+
+        with job_context(os.path.splitext(os.path.basename(output))[0]):
+            inference: Optional["asyncio.Future[dict]"] = None
+            try:
+                yield {"type": "status", "stage": "download", "message": "Waiting for a download slot..."}
+                async with self._download_slots():
+                    scratch = default_scratch()
+                    if not scratch.has_space():
+                        yield {"type": "status", "stage": "download", "message": "Waiting for scratch space..."}
+                        await scratch.await_for_space()
+                    yield {"type": "status", "stage": "download", "message": "Downloading audio..."}
+                    await adownload_audio(url, audio_path, select_audio=select_audio,
+                                          min_bandwidth=min_bandwidth)
+
+                yield {"type": "status", "stage": "transcribe", "message": "Waiting for an inference slot..."}
+                # The worker thread inherits this job's logging context
+                context = contextvars.copy_context()
+                inference = loop.run_in_executor(self._executor, functools.partial(context.run, _transcribe))
+                while not inference.done() or not queue.empty():
+                    getter = asyncio.ensure_future(queue.get())
+                    try:
+                        await asyncio.wait({getter, inference}, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        # A cancelled get() leaves its item in the queue
+                        if not getter.done():
+                            getter.cancel()
+                    if getter.done() and not getter.cancelled():
+                        yield getter.result()
+                result = inference.result()
+                yield {"type": "done", "output": output, "result": result}
+            except BaseException:
+                cancelled = True
+                if inference is None and not keep_audio:
+                    remove_temp_audio(audio_path)
+                raise
+
+    async def transcribe(self, url: str, **kwargs: Any) -> str:
+        """
+        Run one job to completion and return the transcript path.
+
+        Segments are not streamed, so the transcript matches
+        :func:`workflow.generate_transcript` for the same input.
+        """
+        kwargs.setdefault("stream_segments", False)
+        output = ""
+        async for event in self.events(url, **kwargs):
+            if event["type"] == "done":
+                output = event["output"]
+        return output
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the inference threads (after running jobs finish if *wait*)."""
+        self._executor.shutdown(wait=wait)
+
+    async def __aenter__(self) -> "AsyncPipeline":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+
+
+_default_pipeline: Optional[AsyncPipeline] = None
+
+
+def default_pipeline() -> AsyncPipeline:
+    """Process-wide pipeline used by :func:`agenerate_transcript`."""
+    global _default_pipeline
+    if _default_pipeline is None:
+        _default_pipeline = AsyncPipeline()
+    return _default_pipeline
+
+
+async def agenerate_transcript(
+    url: str,
+    pipeline: Optional[AsyncPipeline] = None,
+    **kwargs: Any,
+) -> str:
+    """
+    Awaitable :func:`workflow.generate_transcript`.
+
+    Arguments match :func:`AsyncPipeline.events`; jobs share *pipeline*
+    (default: :func:`default_pipeline`) and its download and inference
+    limits.
+
+    Returns:
+        The path to the generated transcript file.
+    """
+    return await (pipeline or default_pipeline()).transcribe(url, **kwargs)
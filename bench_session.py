@@ -0,0 +1,99 @@
+"""
+Benchmark: per-chunk latency of a TranscriptionSession versus independent calls.
+
+Audio is cut into fixed chunks (as a streaming caller would receive it) and
+transcribed two ways:
+
+* ``independent`` -- one cold ``model.transcribe`` per chunk: no prompt,
+  language detected again every time;
+* ``session``     -- :class:`transcriber.TranscriptionSession` fed the same
+  chunks: language pinned, prompt carried, encoder output reused within a
+  chunk.
+
+Encoder passes are counted with a forward hook.  ``--untrained`` uses a
+small randomly initialised model (decoding greedily) so the script runs
+without downloading weights; its timings only show the mechanics, not
+real-world numbers.
+
+    python bench_session.py --audio talk.mp3 --model base --minutes 5
+"""
+
+import argparse
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+import whisper
+from whisper.model import ModelDimensions, Whisper
+
+from transcriber import SAMPLE_RATE, TranscriptionSession, get_model
+
+
+def untrained_model() -> Any:
+    torch.manual_seed(0)
+    dims = ModelDimensions(
+        n_mels=80, n_audio_ctx=1500, n_audio_state=32, n_audio_head=2, n_audio_layer=1,
+        n_vocab=51865, n_text_ctx=448, n_text_state=32, n_text_head=2, n_text_layer=1,
+    )
+    return Whisper(dims).eval()
+
+
+def _summary(name: str, latencies: List[float], encoder_passes: int) -> str:
+    ms = np.array(latencies) * 1000
+    return (
+        f"{name:<12} {len(ms):>6} {ms.mean():>9.0f} {np.percentile(ms, 95):>8.0f} "
+        f"{ms.sum() / 1000:>9.1f} {encoder_passes:>9}"
+    )
+
+
+def run(model: Any, audio: np.ndarray, chunk_seconds: float, options: Dict[str, Any]) -> None:
+    step = int(chunk_seconds * SAMPLE_RATE)
+    chunks = [audio[i:i + step] for i in range(0, len(audio), step)]
+    passes = [0]
+    handle = model.encoder.register_forward_hook(lambda *args: passes.__setitem__(0, passes[0] + 1))
+    try:
+        independent = []
+        for chunk in chunks:
+            started = time.perf_counter()
+            model.transcribe(chunk, **options)
+            independent.append(time.perf_counter() - started)
+        independent_passes, passes[0] = passes[0], 0
+
+        session = TranscriptionSession(model, chunk_seconds=chunk_seconds, **options)
+        for chunk in chunks:
+            session.feed(chunk)
+        session.flush()
+    finally:
+        handle.remove()
+
+    print(f"{len(audio) / SAMPLE_RATE:.0f} s of audio in {chunk_seconds:g} s chunks")
+    print(f"{'mode':<12} {'chunks':>6} {'mean (ms)':>9} {'p95 (ms)':>8} {'total (s)':>9} {'encoder':>9}")
+    print(_summary("independent", independent, independent_passes))
+    print(_summary("session", [s["seconds"] for s in session.chunk_stats], passes[0]))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--audio", help="Audio file (default: synthetic noise)")
+    parser.add_argument("--model", default="base", help="Whisper model (default: base)")
+    parser.add_argument("--untrained", action="store_true", help="Use a small random model (offline)")
+    parser.add_argument("--minutes", type=float, default=3.0, help="Audio to use (default: 3)")
+    parser.add_argument("--chunk-seconds", type=float, default=30.0, help="Chunk length (default: 30)")
+    args = parser.parse_args(argv)
+
+    model = untrained_model() if args.untrained else get_model(args.model)
+    samples = int(args.minutes * 60 * SAMPLE_RATE)
+    if args.audio:
+        audio = whisper.load_audio(args.audio)[:samples]
+    else:
+        audio = (0.05 * np.random.default_rng(0).standard_normal(samples)).astype(np.float32)
+    options: Dict[str, Any] = {"fp16": torch.cuda.is_available()}
+    if args.untrained:
+        # Sampling from random weights can hit all -inf logits; decode greedily
+        options["temperature"] = 0.0
+    run(model, audio, args.chunk_seconds, options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark: handing decoded audio to worker processes.
+
+Compares three ways for a pool of worker processes to get at one decoded
+recording and process it chunk by chunk:
+
+* ``path``   -- each worker is given the PCM file path and loads/converts
+  the whole file itself (what passing a path to ``transcribe_audio`` does);
+* ``pickle`` -- each worker is sent the decoded float32 array (pickled);
+* ``shared`` -- each worker attaches to one :class:`SharedAudio` buffer.
+
+The per-chunk work is a cheap stand-in for inference, so the numbers show
+the cost of the handoff itself.  Memory is the sum of the workers' PSS
+(proportional set size, so shared pages are only counted once) plus the
+parent's; on systems without ``/proc/self/smaps_rollup`` peak RSS is used.
+
+    python bench_shared_audio.py --minutes 60 --workers 4
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from shared_audio import SAMPLE_RATE, SharedAudio
+
+_MIB = 1024 * 1024
+
+# Worker-side state set by _init
+_audio: Any = None
+
+
+def _memory_bytes() -> int:
+    """PSS of this process if the kernel reports it, else peak RSS."""
+    try:
+        with open("/proc/self/smaps_rollup", encoding="utf-8") as fh:
+            for line in fh:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _init(mode: str, source: Any) -> None:
+    global _audio
+    if mode == "path":
+        _audio = np.fromfile(source, dtype=np.int16).astype(np.float32) / 32768.0
+    else:
+        # A pickled array is a private copy; a SharedAudio attaches on unpickling
+        _audio = source
+
+
+def _work(span: Tuple[int, int]) -> Tuple[int, float, int]:
+    samples = _audio.samples if isinstance(_audio, SharedAudio) else _audio
+    chunk = samples[span[0]:span[1]]
+    rms = float(np.sqrt(np.mean(chunk * chunk)))
+    return os.getpid(), rms, _memory_bytes()
+
+
+def _write_pcm(path: str, seconds: float) -> None:
+    rng = np.random.default_rng(0)
+    remaining = int(seconds * SAMPLE_RATE)
+    with open(path, "wb") as fh:
+        while remaining:
+            n = min(remaining, 60 * SAMPLE_RATE)
+            fh.write(rng.integers(-8000, 8000, n, dtype=np.int16).tobytes())
+            remaining -= n
+
+
+def run(mode: str, pcm_path: str, workers: int, chunk_seconds: float) -> Dict[str, float]:
+    """Time one handoff *mode*; returns seconds and memory figures."""
+    ctx = mp.get_context("spawn")
+    start = time.perf_counter()
+    shared: Optional[SharedAudio] = None
+    if mode == "path":
+        source: Any = pcm_path
+        total = os.path.getsize(pcm_path) // 2
+    elif mode == "pickle":
+        source = np.fromfile(pcm_path, dtype=np.int16).astype(np.float32) / 32768.0
+        total = len(source)
+    else:
+        shared = source = SharedAudio.from_pcm_file(pcm_path)
+        total = len(shared)
+
+    step = int(chunk_seconds * SAMPLE_RATE)
+    spans = [(i, min(i + step, total)) for i in range(0, total, step)]
+    per_worker: Dict[int, int] = {}
+    try:
+        with ctx.Pool(workers, initializer=_init, initargs=(mode, source)) as pool:
+            for pid, _rms, memory in pool.imap_unordered(_work, spans):
+                per_worker[pid] = max(per_worker.get(pid, 0), memory)
+            parent = _memory_bytes()
+    finally:
+        if shared is not None:
+            shared.close()
+    return {
+        "seconds": time.perf_counter() - start,
+        "workers_mib": sum(per_worker.values()) / _MIB,
+        "parent_mib": parent / _MIB,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--minutes", type=float, default=30.0, help="Audio length (default: 30)")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes (default: 4)")
+    parser.add_argument("--chunk-seconds", type=float, default=60.0, help="Chunk per task (default: 60)")
+    parser.add_argument("--modes", nargs="+", default=["path", "pickle", "shared"],
+                        choices=["path", "pickle", "shared"])
+    args = parser.parse_args(argv)
+
+    fd, pcm_path = tempfile.mkstemp(suffix=".pcm")
+    os.close(fd)
+    try:
+        _write_pcm(pcm_path, args.minutes * 60)
+        decoded = os.path.getsize(pcm_path) * 2 / _MIB
+        print(f"{args.minutes:g} min of audio ({decoded:.0f} MiB as float32), {args.workers} workers")
+        print(f"{'mode':<8} {'time (s)':>9} {'workers (MiB)':>14} {'parent (MiB)':>13}")
+        for mode in args.modes:
+            r = run(mode, pcm_path, args.workers, args.chunk_seconds)
+            print(f"{mode:<8} {r['seconds']:>9.2f} {r['workers_mib']:>14.0f} {r['parent_mib']:>13.0f}")
+    finally:
+        os.remove(pcm_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: SRT/TXT writers, per-segment formatting versus the bulk path.
+
+The ``legacy`` writers below are the previous implementations (one
+``timedelta`` per timestamp, one ``write`` per segment); the ``bulk``
+numbers are the current :func:`writers.write_srt` / :func:`writers.write_txt`.
+Both outputs are compared byte for byte before timing.
+
+    python bench_writers.py --segments 200000
+"""
+
+import argparse
+import os
+import tempfile
+import timeit
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from writers import _srt_timestamp, format_seconds, write_srt, write_txt
+
+
+def legacy_srt(segments: List[Dict[str, Any]], output_path: str) -> None:
+    with open(output_path, "w", encoding="utf-8") as fh:
+        for idx, seg in enumerate(segments, start=1):
+            start_ts = _srt_timestamp(seg["start"])
+            end_ts = _srt_timestamp(seg["end"])
+            text = seg["text"].strip()
+            fh.write(f"{idx}\n{start_ts} --> {end_ts}\n{text}\n\n")
+
+
+def legacy_txt(segments: List[Dict[str, Any]], output_path: str) -> None:
+    with open(output_path, "w", encoding="utf-8") as fh:
+        for seg in segments:
+            start = format_seconds(seg["start"])
+            end = format_seconds(seg["end"])
+            text = seg["text"].strip()
+            fh.write(f"[{start} - {end}]  {text}\n")
+
+
+def make_segments(count: int) -> List[Dict[str, Any]]:
+    """*count* Whisper-like segments of 1-8 s with short sentences."""
+    rng = np.random.default_rng(0)
+    ends = np.cumsum(rng.uniform(1.0, 8.0, count))
+    starts = np.concatenate(([0.0], ends[:-1]))
+    return [
+        {"start": float(s), "end": float(e), "text": f" Segment number {i} of the archive."}
+        for i, (s, e) in enumerate(zip(starts, ends))
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--segments", type=int, default=200_000, help="Segments (default: 200000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N runs (default: 3)")
+    args = parser.parse_args(argv)
+
+    segments = make_segments(args.segments)
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy")
+        bulk_path = os.path.join(tmp, "bulk")
+        print(f"{args.segments} segments, best of {args.repeat}")
+        print(f"{'writer':<6} {'legacy (s)':>11} {'bulk (s)':>9} {'speedup':>8}")
+        for name, legacy, bulk in (("srt", legacy_srt, write_srt), ("txt", legacy_txt, write_txt)):
+            legacy(segments, legacy_path)
+            bulk(segments, bulk_path)
+            with open(legacy_path, "rb") as a, open(bulk_path, "rb") as b:
+                if a.read() != b.read():
+                    raise SystemExit(f"{name}: bulk output differs from legacy output")
+
+            old = min(timeit.repeat(lambda: legacy(segments, legacy_path), number=1, repeat=args.repeat))
+            new = min(timeit.repeat(lambda: bulk(segments, bulk_path), number=1, repeat=args.repeat))
+            print(f"{name:<6} {old:>11.3f} {new:>9.3f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
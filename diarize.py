@@ -0,0 +1,321 @@
+"""
+Speaker diarization of an already decoded recording.
+
+:func:`diarize` labels transcript segments with speakers in three steps:
+
+1. **Embeddings** -- the audio under the transcript's segments is cut into
+   overlapping :data:`WINDOW_SECONDS` windows on a fixed grid.  Each
+   window is described by the mean and standard deviation of its
+   mel-cepstral coefficients (a speaker's vocal-tract "fingerprint"),
+   computed for :data:`BATCH_SIZE` windows at a time with one batched STFT
+   on the CPU.
+2. **Clustering** -- embeddings are over-clustered with spherical k-means,
+   then the clusters are merged agglomeratively (average cosine similarity)
+   until no pair is more similar than *threshold*, or until
+   *num_speakers* remain when the count is known.
+3. **Labelling** -- each segment gets the majority speaker of the windows
+   centred inside it.
+
+Because the window grid depends only on the audio, embeddings are cached
+per audio hash (``<cache_dir>/<sha256>.npz``): re-running with another
+model or language only computes windows not seen before.  The cost is a
+few seconds per hour of audio, a small fraction of transcription.
+"""
+
+import hashlib
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from whisper.audio import HOP_LENGTH, N_FFT, SAMPLE_RATE, mel_filters
+
+log = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 1.5
+HOP_SECONDS = 0.75
+BATCH_SIZE = 256
+# Merge clusters while their average cosine similarity is above this
+DEFAULT_THRESHOLD = 0.6
+MAX_SPEAKERS = 20
+# Bump when the embedding features change so stale caches are ignored
+EMBEDDING_VERSION = 1
+
+_N_MELS = 80
+_N_CEPSTRA = 20
+# Windows quieter than this (RMS of float samples) carry no speaker information
+_SILENCE_RMS = 1e-3
+_KMEANS_CLUSTERS = 32
+_KMEANS_ITERATIONS = 20
+
+_WINDOW = int(WINDOW_SECONDS * SAMPLE_RATE)
+_HOP = int(HOP_SECONDS * SAMPLE_RATE)
+
+
+def speaker_label(index: int) -> str:
+    """Display name for the *index*-th speaker (0-based, in order of appearance)."""
+    return f"Speaker {index + 1}"
+
+
+# ---------------------------------------------------------------------------
+# Embeddings
+# ---------------------------------------------------------------------------
+
+def audio_hash(samples: np.ndarray) -> str:
+    """SHA-256 of the decoded samples, used as the embedding cache key."""
+    return hashlib.sha256(np.ascontiguousarray(samples).data).hexdigest()
+
+
+def speech_windows(segments: List[Dict[str, Any]], total_samples: int) -> np.ndarray:
+    """Grid indices of the windows that overlap any segment, ascending."""
+    last = (total_samples - _WINDOW) // _HOP
+    if last < 0:
+        return np.zeros(0, dtype=np.int64)
+    wanted = set()
+    for seg in segments:
+        first = max(0, int((seg["start"] * SAMPLE_RATE - _WINDOW) // _HOP) + 1)
+        stop = min(last, int(seg["end"] * SAMPLE_RATE // _HOP))
+        wanted.update(range(first, stop + 1))
+    return np.array(sorted(wanted), dtype=np.int64)
+
+
+def _dct_matrix(n_in: int, n_out: int) -> torch.Tensor:
+    """Orthonormal DCT-II basis, ``(n_out, n_in)``."""
+    k = torch.arange(n_out, dtype=torch.float32)[:, None]
+    n = torch.arange(n_in, dtype=torch.float32)[None, :]
+    basis = torch.cos(torch.pi / n_in * (n + 0.5) * k) * (2.0 / n_in) ** 0.5
+    basis[0] /= 2 ** 0.5
+    return basis
+
+
+def embed_windows(samples: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """
+    Embeddings for grid windows *indices* of *samples*, ``(len(indices), 2 * cepstra)``.
+
+    The first cepstral coefficient (overall loudness) is dropped, so the
+    embedding describes spectral shape rather than level.  All-zero rows
+    are returned for silent windows.
+    """
+    dim = 2 * (_N_CEPSTRA - 1)
+    out = np.zeros((len(indices), dim), dtype=np.float32)
+    if not len(indices):
+        return out
+
+    filters = mel_filters("cpu", _N_MELS)
+    # Lifter by coefficient index so the small high-order cepstra, which
+    # carry most of the speaker detail, weigh as much as the low ones
+    dct = _dct_matrix(_N_MELS, _N_CEPSTRA)[1:] * torch.arange(1, _N_CEPSTRA, dtype=torch.float32)[:, None]
+    window = torch.hann_window(N_FFT)
+    offsets = np.arange(_WINDOW)
+
+    with torch.inference_mode():
+        for first in range(0, len(indices), BATCH_SIZE):
+            batch = indices[first:first + BATCH_SIZE]
+            frames = torch.from_numpy(
+                samples[(batch * _HOP)[:, None] + offsets].astype(np.float32, copy=False)
+            )
+            stft = torch.stft(frames, N_FFT, HOP_LENGTH, window=window, return_complex=True)
+            power = stft[..., :-1].abs() ** 2
+            log_mel = torch.clamp(filters @ power, min=1e-10).log10()
+            cepstra = dct @ log_mel  # (batch, cepstra, frames)
+            feats = torch.cat([cepstra.mean(dim=-1), cepstra.std(dim=-1)], dim=1).numpy()
+
+            rms = np.sqrt(np.mean(frames.numpy() ** 2, axis=1))
+            feats[rms < _SILENCE_RMS] = 0.0
+            out[first:first + len(batch)] = feats
+    return out
+
+
+def cached_embeddings(
+    samples: np.ndarray,
+    indices: np.ndarray,
+    cache_dir: Optional[str] = None,
+) -> np.ndarray:
+    """:func:`embed_windows`, reusing and extending ``<cache_dir>/<hash>.npz``."""
+    if not cache_dir:
+        return embed_windows(samples, indices)
+
+    path = os.path.join(cache_dir, f"{audio_hash(samples)}.npz")
+    known: Dict[int, np.ndarray] = {}
+    try:
+        with np.load(path) as cache:
+            if int(cache["version"]) == EMBEDDING_VERSION:
+                known = dict(zip(cache["indices"].tolist(), cache["embeddings"]))
+    except (OSError, KeyError, ValueError) as exc:
+        if os.path.exists(path):
+            log.warning("Ignoring unreadable diarization cache %s: %s", path, exc)
+
+    missing = np.array([i for i in indices.tolist() if i not in known], dtype=np.int64)
+    log.debug("Diarization cache: %d of %d windows cached", len(indices) - len(missing), len(indices))
+    if len(missing):
+        known.update(zip(missing.tolist(), embed_windows(samples, missing)))
+        all_indices = np.array(sorted(known), dtype=np.int64)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp, version=EMBEDDING_VERSION, indices=all_indices,
+            embeddings=np.stack([known[i] for i in all_indices.tolist()]),
+        )
+        os.replace(tmp, path)
+
+    if not len(indices):
+        return np.zeros((0, 2 * (_N_CEPSTRA - 1)), dtype=np.float32)
+    return np.stack([known[i] for i in indices.tolist()])
+
+
+# ---------------------------------------------------------------------------
+# Clustering
+# ---------------------------------------------------------------------------
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _kmeans(x: np.ndarray, k: int) -> np.ndarray:
+    """Spherical k-means on unit rows; returns cluster assignments."""
+    rng = np.random.default_rng(0)
+    # Farthest-point initialization keeps small speakers from being swallowed
+    centers = [x[rng.integers(len(x))]]
+    similarity = x @ centers[0]
+    for _ in range(1, k):
+        centers.append(x[int(np.argmin(similarity))])
+        similarity = np.maximum(similarity, x @ centers[-1])
+    centroids = np.stack(centers)
+
+    assign = np.argmax(x @ centroids.T, axis=1)
+    for _ in range(_KMEANS_ITERATIONS):
+        for c in range(k):
+            members = x[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = _normalize(centroids)
+        new = np.argmax(x @ centroids.T, axis=1)
+        if np.array_equal(new, assign):
+            break
+        assign = new
+    return assign
+
+
+def cluster_embeddings(
+    embeddings: np.ndarray,
+    num_speakers: Optional[int] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> np.ndarray:
+    """
+    Speaker index per embedding, numbered in order of first appearance.
+
+    Embeddings are compared by cosine similarity as they are, not centred
+    on this recording's mean, so the threshold means the same thing
+    whether one speaker or ten are present.
+
+    Args:
+        embeddings: ``(n, dim)`` window embeddings (all-zero rows = silence).
+        num_speakers: Exact number of speakers, if known.
+        threshold: Without *num_speakers*, keep merging clusters while
+            their average cosine similarity exceeds this.
+
+    Returns:
+        ``(n,)`` int array; silent windows get -1.
+    """
+    labels = np.full(len(embeddings), -1, dtype=np.int64)
+    voiced = np.flatnonzero(np.any(embeddings != 0, axis=1))
+    if not len(voiced):
+        return labels
+    if len(voiced) == 1 or num_speakers == 1:
+        labels[voiced] = 0
+        return labels
+
+    x = _normalize(embeddings[voiced].astype(np.float64))
+    assign = _kmeans(x, min(_KMEANS_CLUSTERS, len(x)))
+    clusters = {int(c): np.flatnonzero(assign == c) for c in np.unique(assign)}
+    sums = {c: x[members].sum(axis=0) for c, members in clusters.items()}
+    target = min(num_speakers or 1, len(clusters))
+
+    # Average linkage: mean pairwise similarity = dot(sum_a, sum_b) / (n_a * n_b)
+    while len(clusters) > target:
+        ids = list(clusters)
+        best: Tuple[float, int, int] = (-np.inf, -1, -1)
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                sim = float(sums[a] @ sums[b]) / (len(clusters[a]) * len(clusters[b]))
+                if sim > best[0]:
+                    best = (sim, a, b)
+        sim, a, b = best
+        if num_speakers is None and sim < threshold and len(clusters) <= MAX_SPEAKERS:
+            break
+        log.debug("Merging speaker clusters at similarity %.3f", sim)
+        clusters[a] = np.concatenate([clusters[a], clusters.pop(b)])
+        sums[a] = sums[a] + sums.pop(b)
+
+    merged = np.empty(len(x), dtype=np.int64)
+    for c, members in clusters.items():
+        merged[members] = c
+    order = {c: i for i, c in enumerate(dict.fromkeys(merged.tolist()))}
+    labels[voiced] = [order[c] for c in merged.tolist()]
+    return labels
+
+
+# ---------------------------------------------------------------------------
+# Segment labelling
+# ---------------------------------------------------------------------------
+
+def label_segments(
+    segments: List[Dict[str, Any]],
+    indices: np.ndarray,
+    labels: np.ndarray,
+) -> List[Dict[str, Any]]:
+    """Copies of *segments* with a ``speaker`` key from the windows inside each."""
+    centres = (indices * _HOP + _WINDOW / 2) / SAMPLE_RATE
+    keep = labels >= 0
+    centres, labels = centres[keep], labels[keep]
+
+    labelled = []
+    for seg in segments:
+        seg = dict(seg)
+        if len(labels):
+            lo, hi = np.searchsorted(centres, [seg["start"], seg["end"]])
+            inside = labels[lo:hi]
+            if len(inside):
+                speaker = int(np.bincount(inside).argmax())
+            else:
+                # Shorter than a window: take the nearest one
+                nearest = int(np.argmin(np.abs(centres - (seg["start"] + seg["end"]) / 2)))
+                speaker = int(labels[nearest])
+            seg["speaker"] = speaker_label(speaker)
+        labelled.append(seg)
+    return labelled
+
+
+def diarize(
+    samples: np.ndarray,
+    segments: List[Dict[str, Any]],
+    num_speakers: Optional[int] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    cache_dir: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Attach ``speaker`` labels to transcript *segments*.
+
+    Args:
+        samples: Decoded 16 kHz mono float32 audio the segments refer to.
+        segments: Whisper segments (times in seconds).
+        num_speakers: Exact number of speakers, if known.
+        threshold: Cluster merge threshold when *num_speakers* is None.
+        cache_dir: Directory for per-audio embedding caches (None = no cache).
+
+    Returns:
+        New segment dicts with ``"speaker": "Speaker N"`` added.
+    """
+    if num_speakers is not None and not 1 <= num_speakers <= MAX_SPEAKERS:
+        raise ValueError(f"num_speakers must be between 1 and {MAX_SPEAKERS}.")
+    indices = speech_windows(segments, len(samples))
+    embeddings = cached_embeddings(samples, indices, cache_dir)
+    labels = cluster_embeddings(embeddings, num_speakers, threshold)
+    result = label_segments(segments, indices, labels)
+    log.info(
+        "Diarization: %d speaker(s) over %d window(s)",
+        len(set(labels[labels >= 0].tolist())), len(indices),
+    )
+    return result
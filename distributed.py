@@ -0,0 +1,586 @@
+"""
+Distributed transcription: one coordinator, many workers.
+
+The coordinator downloads and decodes the audio once, detects its
+language, splits it into fixed-length chunks and serves them over plain
+HTTP.  Each chunk is sent with ``overlap_seconds`` of the neighbouring
+audio on both sides, so words at a chunk edge are heard whole by at least
+one worker.  Workers on any host pull a chunk, transcribe it with their
+warm model and post the segments back; the coordinator shifts them to
+absolute time and, once every chunk is in, stitches them in order, keeping
+each segment only from the chunk whose own span holds its midpoint.
+
+Protocol (all ``POST`` bodies are JSON):
+
+``POST /lease``  ``{"worker": id}``
+    200 with the chunk (overlap included) as raw s16le PCM and
+    ``X-Chunk``/``X-Offset``/
+    ``X-Lease-Seconds`` (and ``X-Language`` once known) headers;
+    204 with ``X-Done: 1`` when finished, or ``Retry-After`` when every
+    remaining chunk is leased.
+``POST /renew``  ``{"worker": id, "chunk": n}``
+    Extends a lease; 410 if the chunk no longer needs this worker.
+``POST /result`` ``{"worker": id, "chunk": n, "segments": [...], ...}``
+    Delivers a chunk's segments (chunk-relative times).
+``GET /status``
+    Progress counters.
+
+Leases expire if not renewed, so chunks held by lost workers go back to
+the pending pool.  When nothing is pending, idle workers steal the chunk
+that has been leased longest, and the first result to arrive wins.
+"""
+
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from scratch import default_scratch, make_scratch_file
+from search_index import DEFAULT_INDEX_PATH
+from transcriber import (
+    SAMPLE_RATE,
+    decode_to_pcm,
+    detect_language,
+    download_audio,
+    make_temp_audio_path,
+    pcm_to_float,
+    transcribe_samples,
+)
+from workflow import index_transcript, keep_temp_audio, remove_temp_audio, resolve_output_path
+from writers import write_transcript
+
+log = logging.getLogger(__name__)
+
+# Loopback by default: pass --host 0.0.0.0 to let workers on other hosts in
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_CHUNK_SECONDS = 60.0
+DEFAULT_OVERLAP_SECONDS = 5.0
+DEFAULT_DETECT_MODEL = "base"
+DEFAULT_LEASE_SECONDS = 120.0
+
+# A chunk is handed to at most this many workers at once (1 owner + stealers).
+MAX_COPIES = 2
+_RETRY_AFTER_SECONDS = 1
+_PCM_BYTES = 2
+
+
+# ---------------------------------------------------------------------------
+# Coordinator
+# ---------------------------------------------------------------------------
+
+class Coordinator:
+    """
+    Chunk bookkeeping for one audio file.
+
+    Args:
+        pcm_path: Decoded 16 kHz mono s16le audio.
+        chunk_seconds: Chunk length handed to each worker, before overlap.
+        lease_seconds: How long a worker may hold a chunk without renewing.
+        language: Optional language code forwarded to workers.  If None,
+            the language reported with the first result is pinned.
+        overlap_seconds: Audio from each neighbouring chunk sent along with
+            a chunk.  Segments up to twice this long that straddle a chunk
+            edge are transcribed whole by one of the two workers.
+    """
+
+    def __init__(
+        self,
+        pcm_path: str,
+        chunk_seconds: float = DEFAULT_CHUNK_SECONDS,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        language: Optional[str] = None,
+        overlap_seconds: float = DEFAULT_OVERLAP_SECONDS,
+    ) -> None:
+        if chunk_seconds <= 0:
+            raise ValueError("chunk_seconds must be positive.")
+        if overlap_seconds < 0:
+            raise ValueError("overlap_seconds must not be negative.")
+        self.pcm_path = pcm_path
+        self.lease_seconds = lease_seconds
+        self.language = language
+
+        total = os.path.getsize(pcm_path) // _PCM_BYTES
+        step = int(chunk_seconds * SAMPLE_RATE)
+        overlap = int(overlap_seconds * SAMPLE_RATE)
+        # Each chunk's own span; its segments are kept if their midpoint falls in it
+        self.spans: List[Tuple[int, int]] = [
+            (start, min(start + step, total)) for start in range(0, total, step)
+        ]
+        # What is sent to workers: the span plus the overlap on both sides
+        self.chunks: List[Tuple[int, int]] = [
+            (max(start - overlap, 0), min(stop + overlap, total)) for start, stop in self.spans
+        ]
+        self._pending: Deque[int] = deque(range(len(self.chunks)))
+        # chunk -> {worker: (leased_at, deadline)}
+        self._leases: Dict[int, Dict[str, Tuple[float, float]]] = {}
+        self._results: Dict[int, Dict[str, Any]] = {}
+        self._worker_chunks: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.done = threading.Event()
+        if not self.chunks:
+            self.done.set()
+
+    # -- lease management ----------------------------------------------
+
+    def _reclaim_expired(self, now: float) -> None:
+        for chunk in list(self._leases):
+            holders = self._leases[chunk]
+            for worker, (_at, deadline) in list(holders.items()):
+                if deadline < now:
+                    log.warning("Lease on chunk %d by %s expired", chunk, worker)
+                    del holders[worker]
+            if not holders:
+                del self._leases[chunk]
+                if chunk not in self._results:
+                    self._pending.appendleft(chunk)
+
+    def lease(self, worker: str) -> Optional[int]:
+        """
+        Hand *worker* a chunk index, or None if nothing is available now.
+
+        Prefers pending chunks; otherwise steals the longest-held chunk
+        that this worker is not already working on.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._reclaim_expired(now)
+            chunk: Optional[int] = None
+            if self._pending:
+                chunk = self._pending.popleft()
+            else:
+                candidates = [
+                    (min(at for at, _d in holders.values()), c)
+                    for c, holders in self._leases.items()
+                    if c not in self._results
+                    and worker not in holders
+                    and len(holders) < MAX_COPIES
+                ]
+                if candidates:
+                    chunk = min(candidates)[1]
+                    log.info("Worker %s stealing chunk %d", worker, chunk)
+            if chunk is None:
+                return None
+            self._leases.setdefault(chunk, {})[worker] = (now, now + self.lease_seconds)
+            return chunk
+
+    def renew(self, worker: str, chunk: int) -> bool:
+        """Extend *worker*'s lease on *chunk*; False if it is no longer wanted."""
+        with self._lock:
+            holders = self._leases.get(chunk, {})
+            if chunk in self._results or worker not in holders:
+                return False
+            leased_at = holders[worker][0]
+            holders[worker] = (leased_at, time.monotonic() + self.lease_seconds)
+            return True
+
+    def release(self, worker: str, chunk: int) -> None:
+        """Drop *worker*'s lease on *chunk*; it goes back to pending if nobody else holds it."""
+        with self._lock:
+            holders = self._leases.get(chunk)
+            if holders is None or holders.pop(worker, None) is None:
+                return
+            if not holders:
+                del self._leases[chunk]
+                if chunk not in self._results:
+                    self._pending.appendleft(chunk)
+
+    def complete(self, worker: str, chunk: int, result: Dict[str, Any]) -> bool:
+        """Record a chunk result.  Returns False for duplicates (lost the race)."""
+        with self._lock:
+            self._leases.pop(chunk, None)
+            if chunk in self._results or not 0 <= chunk < len(self.chunks):
+                return False
+            try:
+                self._pending.remove(chunk)
+            except ValueError:
+                pass
+            self._results[chunk] = result
+            self._worker_chunks[worker] = self._worker_chunks.get(worker, 0) + 1
+            if self.language is None and result.get("language"):
+                self.language = result["language"]
+            if len(self._results) == len(self.chunks):
+                self.done.set()
+            return True
+
+    def chunk_pcm(self, chunk: int) -> bytes:
+        start, stop = self.chunks[chunk]
+        with open(self.pcm_path, "rb") as fh:
+            fh.seek(start * _PCM_BYTES)
+            return fh.read((stop - start) * _PCM_BYTES)
+
+    def chunk_offset(self, chunk: int) -> float:
+        return self.chunks[chunk][0] / SAMPLE_RATE
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "chunks": len(self.chunks),
+                "completed": len(self._results),
+                "leased": len(self._leases),
+                "pending": len(self._pending),
+                "workers": dict(self._worker_chunks),
+            }
+
+    # -- stitching -----------------------------------------------------
+
+    def stitched(self) -> dict:
+        """
+        Return all segments in absolute time as a Whisper-style result.
+
+        A segment is taken from the chunk whose span holds its midpoint, so
+        text in the overlaps appears once, from the worker that heard it
+        with context on both sides.
+        """
+        segments: List[Dict[str, Any]] = []
+        models = set()
+        with self._lock:
+            results = dict(self._results)
+        for chunk in sorted(results):
+            offset = self.chunk_offset(chunk)
+            span_start, span_stop = (n / SAMPLE_RATE for n in self.spans[chunk])
+            if chunk == len(self.spans) - 1:
+                span_stop = float("inf")  # timestamps may run past the last sample
+            if results[chunk].get("model"):
+                models.add(results[chunk]["model"])
+            for seg in results[chunk]["segments"]:
+                middle = offset + (seg["start"] + seg["end"]) / 2
+                if not span_start <= middle < span_stop:
+                    continue
+                segments.append({
+                    **seg,
+                    "id": len(segments),
+                    "start": seg["start"] + offset,
+                    "end": seg["end"] + offset,
+                })
+        return {
+            "text": "".join(seg["text"] for seg in segments),
+            "segments": segments,
+            "language": self.language,
+            "models": sorted(models),
+        }
+
+
+def _valid_segment(seg: Any) -> bool:
+    """True if *seg* has the numeric times and text :meth:`Coordinator.stitched` relies on."""
+    if not isinstance(seg, dict) or not isinstance(seg.get("text"), str):
+        return False
+    times = [seg.get("start"), seg.get("end")]
+    return all(
+        isinstance(t, (int, float)) and not isinstance(t, bool) and math.isfinite(t) for t in times
+    )
+
+
+def _make_handler(coord: Coordinator) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def _json_body(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _send_json(self, code: int, payload: Dict[str, Any]) -> None:
+            data = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path == "/status":
+                self._send_json(200, coord.status())
+            else:
+                self.send_error(404)
+
+        def do_POST(self) -> None:
+            try:
+                body = self._json_body()
+            except ValueError:
+                self.send_error(400, "Invalid JSON")
+                return
+            if not isinstance(body, dict):
+                self.send_error(400, "Expected a JSON object")
+                return
+            worker = str(body.get("worker", self.client_address[0]))
+
+            if self.path == "/lease":
+                self._lease(worker)
+                return
+            if self.path not in ("/renew", "/result"):
+                self.send_error(404)
+                return
+            try:
+                chunk = int(body["chunk"])
+            except (KeyError, TypeError, ValueError):
+                self.send_error(400, "Missing or invalid 'chunk'")
+                return
+            if self.path == "/renew":
+                ok = coord.renew(worker, chunk)
+                self._send_json(200 if ok else 410, {"ok": ok})
+                return
+            segments = body.get("segments")
+            if not isinstance(segments, list) or not all(map(_valid_segment, segments)):
+                # Give the chunk back now rather than stitching a bad result later
+                coord.release(worker, chunk)
+                self.send_error(400, "Missing or invalid 'segments'")
+                return
+            accepted = coord.complete(worker, chunk, body)
+            self._send_json(200, {"accepted": accepted})
+
+        def _lease(self, worker: str) -> None:
+            if coord.done.is_set():
+                self.send_response(204)
+                self.send_header("X-Done", "1")
+                self.end_headers()
+                return
+            chunk = coord.lease(worker)
+            if chunk is None:
+                self.send_response(204)
+                self.send_header("Retry-After", str(_RETRY_AFTER_SECONDS))
+                self.end_headers()
+                return
+            data = coord.chunk_pcm(chunk)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("X-Chunk", str(chunk))
+            self.send_header("X-Offset", f"{coord.chunk_offset(chunk):.3f}")
+            self.send_header("X-Lease-Seconds", str(coord.lease_seconds))
+            if coord.language:
+                self.send_header("X-Language", coord.language)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt: str, *args: Any) -> None:
+            log.debug("%s - " + fmt, self.client_address[0], *args)
+
+    return Handler
+
+
+def serve_coordinator(
+    coord: Coordinator,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+) -> ThreadingHTTPServer:
+    """Start serving *coord* on a background thread and return the server."""
+    server = ThreadingHTTPServer((host, port), _make_handler(coord))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="coordinator", daemon=True).start()
+    log.info("Coordinator listening on %s:%d (%d chunks)", host, server.server_address[1], len(coord.chunks))
+    return server
+
+
+def _detect_pcm_language(pcm_path: str, model_name: str) -> str:
+    with open(pcm_path, "rb") as fh:
+        head = fh.read(30 * SAMPLE_RATE * _PCM_BYTES)
+    return detect_language(pcm_to_float(head), model_name)
+
+
+def run_coordinator(
+    url: str,
+    output_path: Optional[str] = None,
+    output_format: str = "pdf",
+    language: Optional[str] = None,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    chunk_seconds: float = DEFAULT_CHUNK_SECONDS,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    overlap_seconds: float = DEFAULT_OVERLAP_SECONDS,
+    detect_model: str = DEFAULT_DETECT_MODEL,
+    keep_audio: bool = False,
+    index_path: Optional[str] = DEFAULT_INDEX_PATH,
+    on_status: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    Download *url*, farm its chunks out to workers and write the transcript.
+
+    Blocks until every chunk has been transcribed.  Without *language*,
+    it is detected once here with *detect_model* on the first 30 seconds,
+    so every chunk is transcribed in the same language.
+
+    Returns:
+        The path to the generated transcript file.
+    """
+
+    def _status(msg: str) -> None:
+        log.info(msg)
+        if on_status:
+            on_status(msg)
+
+    audio_path = make_temp_audio_path()
+    pcm_path = make_scratch_file("audio.pcm")
+    output = resolve_output_path(output_path, fmt=output_format)
+    server: Optional[ThreadingHTTPServer] = None
+
+    try:
+        default_scratch().wait_for_space(on_wait=_status)
+        _status("Downloading audio...")
+        download_audio(url, audio_path)
+
+        _status("Decoding audio...")
+        decoder = decode_to_pcm(audio_path, pcm_path)
+        if decoder.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {audio_path}")
+
+        if language is None:
+            _status("Detecting language...")
+            language = _detect_pcm_language(pcm_path, detect_model)
+            _status(f"Detected language: {language}")
+
+        coord = Coordinator(pcm_path, chunk_seconds, lease_seconds, language, overlap_seconds)
+        server = serve_coordinator(coord, host, port)
+        _status(f"Waiting for workers on port {server.server_address[1]}...")
+        while not coord.done.wait(timeout=10):
+            st = coord.status()
+            _status(f"{st['completed']}/{st['chunks']} chunks done, {st['leased']} leased")
+
+        result = coord.stitched()
+        log.info("Chunks per worker: %s", coord.status()["workers"])
+
+        _status(f"Writing {output_format.upper()} transcript...")
+        metadata = {
+            "source_url": url,
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "model": ", ".join(result["models"]) or "unknown",
+            "language": result["language"] or "auto-detected",
+        }
+        write_transcript(output_format, result["segments"], output, metadata=metadata)
+        _status(f"Transcript saved to: {output}")
+        if index_path:
+            index_transcript(index_path, result["segments"], output, metadata)
+        return output
+
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        remove_temp_audio(pcm_path)
+        if keep_audio:
+            keep_temp_audio(audio_path)
+        else:
+            remove_temp_audio(audio_path)
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+def _post(url: str, payload: Dict[str, Any], timeout: float = 30) -> Any:
+    req = urllib.request.Request(
+        url, data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"}, method="POST",
+    )
+    return urllib.request.urlopen(req, timeout=timeout)
+
+
+class _LeaseRenewer(threading.Thread):
+    """Renews a chunk lease in the background while it is being transcribed."""
+
+    def __init__(self, base: str, worker: str, chunk: int, lease_seconds: float) -> None:
+        super().__init__(daemon=True)
+        self._base, self._worker, self._chunk = base, worker, chunk
+        self._interval = max(lease_seconds / 3, 0.1)
+        self.stop = threading.Event()
+
+    def run(self) -> None:
+        while not self.stop.wait(self._interval):
+            try:
+                _post(f"{self._base}/renew", {"worker": self._worker, "chunk": self._chunk}).close()
+            except urllib.error.HTTPError as exc:
+                if exc.code == 410:
+                    log.debug("Chunk %d no longer needed", self._chunk)
+                    return
+                log.warning("Lease renewal for chunk %d refused: %s", self._chunk, exc)
+            except OSError as exc:
+                log.warning("Lease renewal failed: %s", exc)
+
+
+def run_worker(
+    coordinator_url: str,
+    model_name: str = "base",
+    worker_id: Optional[str] = None,
+    max_connect_failures: int = 5,
+    transcribe: Optional[Callable[[np.ndarray, Optional[str]], dict]] = None,
+) -> int:
+    """
+    Pull and transcribe chunks from a coordinator until it reports done.
+
+    Args:
+        coordinator_url: e.g. ``http://host:8765``.
+        model_name: Whisper model to keep warm on this worker.
+        worker_id: Identifier reported to the coordinator (default: host:pid).
+        max_connect_failures: Give up after this many consecutive
+            connection errors.
+        transcribe: ``(samples, language) -> result`` override; defaults
+            to :func:`transcriber.transcribe_samples` with *model_name*.
+
+    Returns:
+        Number of chunks this worker completed.
+    """
+    base = coordinator_url.rstrip("/")
+    worker = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    if transcribe is None:
+        def transcribe(samples: np.ndarray, language: Optional[str]) -> dict:
+            return transcribe_samples(samples, model_name=model_name, language=language)
+
+    completed = 0
+    failures = 0
+    log.info("Worker %s pulling from %s", worker, base)
+
+    while True:
+        try:
+            resp = _post(f"{base}/lease", {"worker": worker})
+        except OSError as exc:
+            failures += 1
+            if failures >= max_connect_failures:
+                log.error("Coordinator unreachable (%s); stopping.", exc)
+                return completed
+            time.sleep(_RETRY_AFTER_SECONDS)
+            continue
+        failures = 0
+
+        with resp:
+            if resp.status == 204:
+                if resp.headers.get("X-Done"):
+                    log.info("Coordinator finished; worker %s did %d chunk(s).", worker, completed)
+                    return completed
+                time.sleep(float(resp.headers.get("Retry-After", _RETRY_AFTER_SECONDS)))
+                continue
+            chunk = int(resp.headers["X-Chunk"])
+            language = resp.headers.get("X-Language")
+            lease_seconds = float(resp.headers.get("X-Lease-Seconds", DEFAULT_LEASE_SECONDS))
+            samples = pcm_to_float(resp.read())
+
+        renewer = _LeaseRenewer(base, worker, chunk, lease_seconds)
+        renewer.start()
+        try:
+            log.info("Transcribing chunk %d (%.1fs)", chunk, len(samples) / SAMPLE_RATE)
+            result = transcribe(samples, language)
+        finally:
+            renewer.stop.set()
+
+        segments = [
+            {k: v for k, v in seg.items() if k != "tokens"}
+            for seg in result["segments"]
+        ]
+        try:
+            _post(f"{base}/result", {
+                "worker": worker,
+                "chunk": chunk,
+                "segments": segments,
+                "language": result.get("language"),
+                "model": model_name,
+            }).close()
+            completed += 1
+        except OSError as exc:
+            log.warning("Could not deliver chunk %d: %s", chunk, exc)
@@ -0,0 +1,615 @@
+"""
+Per-host scheduling for playlist fetches, segment fetches and yt-dlp downloads.
+
+Batch runs hit the same CDN many times: master and media playlists, HEAD
+probes, HLS segments and finally the yt-dlp download itself.  Every one
+of them goes through one :class:`DownloadScheduler`, which
+
+* keeps at most ``max_per_host`` requests/downloads in flight per host,
+* starts at most ``requests_per_second`` of them per host (a token bucket
+  holding ``burst`` tokens),
+* pauses a host for the ``Retry-After`` of a 429/503 answer (exponential
+  backoff without one) and retries,
+* caps total download bandwidth at ``max_bandwidth`` bytes/s -- up to
+  ``max_transfers`` yt-dlp downloads get a share through ``--limit-rate``
+  and the scheduler's own requests get what those shares leave (see
+  :meth:`DownloadScheduler.transfer` for why this is approximate),
+* reuses keep-alive connections per host,
+
+and counts requests, bytes and busy time per host for :meth:`report`.
+yt-dlp fetches its media itself, so its downloads are counted apart, by
+the size of the audio file they write.
+Requests are plain ``http.client`` exchanges; proxies from the usual
+``*_proxy`` environment variables are honoured as with ``urllib``.
+"""
+
+import asyncio
+import contextlib
+import email.utils
+import http.client
+import logging
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_PER_HOST = 6
+DEFAULT_MAX_TRANSFERS = 4
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 1.0
+DEFAULT_TIMEOUT_SECONDS = 15
+# A Retry-After longer than this is treated as a refusal rather than waited out
+MAX_RETRY_AFTER_SECONDS = 300.0
+
+_SLOT_POLL_SECONDS = 0.05
+_READ_CHUNK_BYTES = 64 * 1024
+_MAX_REDIRECTS = 5
+_REDIRECT_CODES = {301, 302, 303, 307, 308}
+_RETRY_CODES = {429, 503}
+
+# (status, reason, headers, body) -- headers support .get() by header name
+Exchange = Tuple[int, str, Any, bytes]
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` value (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _header(headers: Any, name: str) -> Optional[str]:
+    # http.client messages are case-insensitive; the async client lower-cases
+    return headers.get(name) or headers.get(name.lower())
+
+
+class TokenBucket:
+    """
+    *rate* tokens per second, holding at most *burst* (default: one second's worth).
+
+    :meth:`reserve` takes tokens at once and returns how long the caller
+    must wait before using them, so a large read goes into debt instead
+    of starving behind small ones.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """Seconds until *tokens* are available, without taking them."""
+        with self._lock:
+            self._refill()
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take *tokens* now; returns the seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def set_rate(self, rate: float) -> None:
+        """Change the refill rate; tokens accrued so far are kept."""
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+
+class _Host:
+    """Admission state, idle connections and counters for one ``host:port``."""
+
+    def __init__(self, name: str, max_active: int, rate: Optional[float], burst: Optional[float]) -> None:
+        self.name = name
+        self.max_active = max_active
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.lock = threading.Lock()
+        self.active = 0
+        self.blocked_until = 0.0
+        self.idle: List[http.client.HTTPConnection] = []
+        self.requests = 0
+        self.bytes = 0
+        self.transfers = 0
+        self.output_bytes = 0
+        self._requesting = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self.busy = 0.0
+        self._busy_since = 0.0
+
+    def admit(self, request: bool = True) -> float:
+        """
+        Take a slot and return 0, or return the seconds to wait before trying again.
+
+        Busy time only runs while a *request* (not an external transfer) is in flight.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if self.active >= self.max_active:
+                return _SLOT_POLL_SECONDS
+            if self.bucket is not None:
+                wait = self.bucket.delay()
+                if wait:
+                    return wait
+                self.bucket.reserve()
+            if request:
+                if self._requesting == 0:
+                    self._busy_since = now
+                self._requesting += 1
+            self.active += 1
+            return 0.0
+
+    def release(self, nbytes: int) -> None:
+        with self.lock:
+            self.active -= 1
+            self._requesting -= 1
+            self.requests += 1
+            self.bytes += nbytes
+            if self._requesting == 0:
+                self.busy += time.monotonic() - self._busy_since
+
+    def release_transfer(self, output_bytes: int) -> None:
+        with self.lock:
+            self.active -= 1
+            self.transfers += 1
+            self.output_bytes += output_bytes
+
+    def block(self, seconds: float) -> None:
+        with self.lock:
+            self.throttled += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def add_wait(self, seconds: float) -> None:
+        with self.lock:
+            self.waited += seconds
+
+    def checkout(self) -> Optional[http.client.HTTPConnection]:
+        with self.lock:
+            return self.idle.pop() if self.idle else None
+
+    def checkin(self, conn: http.client.HTTPConnection) -> None:
+        with self.lock:
+            if len(self.idle) < self.max_active:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+
+class DownloadScheduler:
+    """
+    Per-host concurrency, request rate and retry policy plus a global bandwidth cap.
+
+    Args:
+        max_per_host: Requests/downloads in flight per host.
+        requests_per_second: Requests started per second per host (None: no limit).
+        burst: Requests a host may start at once after being idle
+            (default: one second's worth).
+        max_bandwidth: Total download rate in bytes/s (None: no limit).
+        max_transfers: With a bandwidth cap, external downloads running at
+            once (see :meth:`transfer`).
+        max_retries: Retries of a request answered with 429 or 503.
+        backoff_seconds: First retry delay when no ``Retry-After`` is given;
+            doubled on each further retry.
+    """
+
+    def __init__(
+        self,
+        max_per_host: int = DEFAULT_MAX_PER_HOST,
+        requests_per_second: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_bandwidth: Optional[float] = None,
+        max_transfers: int = DEFAULT_MAX_TRANSFERS,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+    ) -> None:
+        if max_per_host < 1:
+            raise ValueError(f"max_per_host must be at least 1, got {max_per_host}")
+        if max_transfers < 1:
+            raise ValueError(f"max_transfers must be at least 1, got {max_transfers}")
+        self.max_per_host = max_per_host
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_bandwidth = max_bandwidth
+        self.max_transfers = max_transfers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._bandwidth = TokenBucket(max_bandwidth) if max_bandwidth else None
+        self._hosts: Dict[str, _Host] = {}
+        self._lock = threading.Lock()
+        self._transfers = 0
+        self._shares = 0.0
+
+    def _host(self, url: str) -> _Host:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported URL: {url}")
+        name = parts.netloc.rpartition("@")[2].lower()
+        with self._lock:
+            host = self._hosts.get(name)
+            if host is None:
+                host = self._hosts[name] = _Host(
+                    name, self.max_per_host, self.requests_per_second, self.burst,
+                )
+            return host
+
+    # -- admission and retries ----------------------------------------------
+
+    def _acquire(self, host: _Host, request: bool = True) -> None:
+        started = time.monotonic()
+        while True:
+            wait = host.admit(request)
+            if not wait:
+                break
+            time.sleep(wait)
+        host.add_wait(time.monotonic() - started)
+
+    async def _aacquire(self, host: _Host, request: bool = True) -> None:
+        started = time.monotonic()
+        while True:
+            wait = host.admit(request)
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+        host.add_wait(time.monotonic() - started)
+
+    def _retry_delay(self, host: _Host, status: int, headers: Any, attempt: int) -> Optional[float]:
+        """Pause *host* after a 429/503; returns the delay before retrying, or None to give up."""
+        if status not in _RETRY_CODES:
+            return None
+        delay = parse_retry_after(_header(headers, "Retry-After"))
+        if delay is None:
+            delay = self.backoff_seconds * 2 ** attempt
+        host.block(min(delay, MAX_RETRY_AFTER_SECONDS))
+        if attempt >= self.max_retries or delay > MAX_RETRY_AFTER_SECONDS:
+            return None
+        log.warning("%s answered %d; retrying in %.1fs", host.name, status, delay)
+        return delay
+
+    def _exchange(self, url: str, send: Callable[[_Host], Exchange]) -> Exchange:
+        host = self._host(url)
+        attempt = 0
+        while True:
+            self._acquire(host)
+            nbytes = 0
+            try:
+                status, reason, headers, body = send(host)
+                nbytes = len(body)
+            finally:
+                host.release(nbytes)
+            if self._retry_delay(host, status, headers, attempt) is None:
+                return status, reason, headers, body
+            attempt += 1
+
+    async def aexchange(self, url: str, send: Callable[[], Awaitable[Exchange]]) -> Exchange:
+        """
+        Run one async request under *url*'s host limits, retrying 429/503.
+
+        *send* performs the request and returns ``(status, reason, headers,
+        body)``; it is called again for each retry.  Redirects are left to
+        the caller.
+        """
+        host = self._host(url)
+        attempt = 0
+        while True:
+            await self._aacquire(host)
+            nbytes = 0
+            try:
+                status, reason, headers, body = await send()
+                nbytes = len(body)
+            finally:
+                host.release(nbytes)
+            if self._bandwidth is not None:
+                await asyncio.sleep(self._bandwidth.reserve(nbytes))
+            if self._retry_delay(host, status, headers, attempt) is None:
+                return status, reason, headers, body
+            attempt += 1
+
+    # -- HTTP -----------------------------------------------------------------
+
+    def request(
+        self,
+        url: str,
+        method: str = "GET",
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    ) -> Dict[str, Any]:
+        """
+        Send *method* to *url*, following redirects, and read the whole response.
+
+        Returns:
+            ``{"url", "status", "headers", "body"}`` for any status below
+            400 (including 304 Not Modified); ``url`` is the final URL.
+
+        Raises:
+            urllib.error.HTTPError: For 4xx/5xx answers (after retrying 429/503).
+            urllib.error.URLError: If the host cannot be reached, times out
+                or sends a malformed response, or on too many redirects.
+        """
+        for _ in range(_MAX_REDIRECTS + 1):
+            status, reason, resp_headers, body = self._exchange(
+                url, lambda host: self._send(host, url, method, headers or {}, timeout),
+            )
+            location = resp_headers.get("Location")
+            if status in _REDIRECT_CODES and location:
+                url = urljoin(url, location)
+                if status == 303:
+                    method = "GET"
+                continue
+            if status >= 400:
+                raise urllib.error.HTTPError(url, status, reason, resp_headers, None)
+            return {"url": url, "status": status, "headers": resp_headers, "body": body}
+        raise urllib.error.URLError(f"too many redirects fetching {url}")
+
+    @staticmethod
+    def _proxy(scheme: str, host: str) -> Optional[Any]:
+        proxy = urllib.request.getproxies().get(scheme)
+        if not proxy or urllib.request.proxy_bypass(host):
+            return None
+        return urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+
+    @staticmethod
+    def _connect(parts: Any, proxy: Optional[Any], timeout: float) -> http.client.HTTPConnection:
+        if proxy is not None:
+            if parts.scheme == "https":
+                # CONNECT tunnel through the proxy, TLS to the origin
+                conn = http.client.HTTPSConnection(
+                    proxy.hostname, proxy.port or 80, timeout=timeout, context=ssl.create_default_context(),
+                )
+                conn.set_tunnel(parts.hostname, parts.port)
+                return conn
+            return http.client.HTTPConnection(proxy.hostname, proxy.port or 80, timeout=timeout)
+        if parts.scheme == "https":
+            return http.client.HTTPSConnection(
+                parts.hostname, parts.port, timeout=timeout, context=ssl.create_default_context(),
+            )
+        return http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+
+    def _send(
+        self, host: _Host, url: str, method: str, headers: Dict[str, str], timeout: float,
+    ) -> Exchange:
+        parts = urlsplit(url)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        proxy = self._proxy(parts.scheme, parts.hostname)
+        if proxy is not None and parts.scheme == "http":
+            target = url
+        request_headers = {"Accept-Encoding": "identity", **headers}
+
+        conn = host.checkout()
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = self._connect(parts, proxy, timeout)
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request(method, target, headers=request_headers)
+                resp = conn.getresponse()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as exc:
+                conn.close()
+                conn = None
+                if not reused:
+                    raise urllib.error.URLError(exc) from exc
+                # The server closed an idle keep-alive connection: retry once on a new one
+                reused = False
+            except (OSError, http.client.HTTPException) as exc:
+                conn.close()
+                raise urllib.error.URLError(exc) from exc
+
+        try:
+            body = resp.read() if self._bandwidth is None else self._read_throttled(resp)
+        except (OSError, http.client.HTTPException) as exc:
+            conn.close()
+            raise urllib.error.URLError(exc) from exc
+        if resp.will_close:
+            conn.close()
+        else:
+            host.checkin(conn)
+        return resp.status, resp.reason, resp.headers, body
+
+    def _read_throttled(self, resp: http.client.HTTPResponse) -> bytes:
+        chunks = []
+        while True:
+            chunk = resp.read(_READ_CHUNK_BYTES)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+            time.sleep(self._bandwidth.reserve(len(chunk)))
+
+    # -- external downloads ---------------------------------------------------
+
+    def _start_transfer(self) -> Optional[Dict[str, Any]]:
+        """Register an external download, or return None while ``max_transfers`` are running."""
+        with self._lock:
+            if self._bandwidth is None:
+                self._transfers += 1
+                return {"rate_limit": None, "output_bytes": 0}
+            if self._transfers >= self.max_transfers:
+                return None
+            self._transfers += 1
+            share = self.max_bandwidth / self._transfers
+            self._shares += share
+            self._update_request_rate()
+        return {"rate_limit": share, "output_bytes": 0}
+
+    def _end_transfer(self, host: _Host, ticket: Dict[str, Any]) -> None:
+        with self._lock:
+            self._transfers -= 1
+            if self._bandwidth is not None:
+                self._shares -= ticket["rate_limit"]
+                self._update_request_rate()
+        host.release_transfer(ticket["output_bytes"])
+
+    def _update_request_rate(self) -> None:
+        # What the transfers leave, but never less than one more transfer's share
+        floor = self.max_bandwidth / (self._transfers + 1)
+        self._bandwidth.set_rate(max(self.max_bandwidth - self._shares, floor))
+
+    @contextlib.contextmanager
+    def transfer(self, url: str) -> Iterator[Dict[str, Any]]:
+        """
+        Hold a slot on *url*'s host for a download made by another program (yt-dlp).
+
+        Yields a dict with ``rate_limit`` -- this download's share of the
+        bandwidth cap in bytes/s, or None without a cap -- and
+        ``output_bytes``, for the caller to set to the size of the file it
+        wrote (the bytes fetched are not visible from here).
+
+        With a cap, waits until fewer than ``max_transfers`` downloads are
+        running, then gets the cap divided by the downloads running
+        including itself.  yt-dlp's ``--limit-rate`` is fixed when it
+        starts, so shares are not rebalanced: a lone download uses the
+        whole cap, and while earlier downloads keep their larger shares
+        the total can exceed it.  Requests made here get the cap minus the
+        shares in use, but at least one share.
+        """
+        host = self._host(url)
+        self._acquire(host, request=False)
+        started = time.monotonic()
+        while True:
+            ticket = self._start_transfer()
+            if ticket is not None:
+                break
+            time.sleep(_SLOT_POLL_SECONDS)
+        host.add_wait(time.monotonic() - started)
+        try:
+            yield ticket
+        finally:
+            self._end_transfer(host, ticket)
+
+    @contextlib.asynccontextmanager
+    async def atransfer(self, url: str) -> AsyncIterator[Dict[str, Any]]:
+        """Async :meth:`transfer`: waits for the host slot without blocking the loop."""
+        host = self._host(url)
+        await self._aacquire(host, request=False)
+        started = time.monotonic()
+        while True:
+            ticket = self._start_transfer()
+            if ticket is not None:
+                break
+            await asyncio.sleep(_SLOT_POLL_SECONDS)
+        host.add_wait(time.monotonic() - started)
+        try:
+            yield ticket
+        finally:
+            self._end_transfer(host, ticket)
+
+    # -- reporting ------------------------------------------------------------
+
+    def report(self) -> List[Dict[str, Any]]:
+        """
+        Per-host totals, busiest first.
+
+        ``requests``, ``bytes`` and ``throughput`` cover the scheduler's own
+        requests: ``throughput`` is bytes per second of busy time (time
+        with at least one request in flight to the host).  ``transfers``
+        counts yt-dlp downloads and ``output_bytes`` the size of the audio
+        files they wrote -- not what they fetched.  ``throttled`` counts
+        429/503 answers and ``waited`` the seconds spent waiting for a slot.
+        """
+        with self._lock:
+            hosts = list(self._hosts.values())
+        rows = []
+        for host in hosts:
+            with host.lock:
+                rows.append({
+                    "host": host.name,
+                    "requests": host.requests,
+                    "bytes": host.bytes,
+                    "seconds": host.busy,
+                    "throughput": host.bytes / host.busy if host.busy else 0.0,
+                    "transfers": host.transfers,
+                    "output_bytes": host.output_bytes,
+                    "throttled": host.throttled,
+                    "waited": host.waited,
+                })
+        return sorted(rows, key=lambda r: (r["bytes"], r["output_bytes"]), reverse=True)
+
+    def describe(self) -> List[str]:
+        """Human-readable :meth:`report`, one line per host."""
+        lines = []
+        for r in self.report():
+            if not r["requests"] and not r["transfers"]:
+                continue
+            line = (
+                f"{r['host']}: {r['requests']} request(s), {r['bytes'] / 1_000_000:.1f} MB in "
+                f"{r['seconds']:.1f}s ({r['throughput'] / 1_000_000:.2f} MB/s), "
+                f"{r['throttled']} throttled, {r['waited']:.1f}s waiting"
+            )
+            if r["transfers"]:
+                line += (
+                    f"; {r['transfers']} yt-dlp download(s) wrote "
+                    f"{r['output_bytes'] / 1_000_000:.1f} MB of audio"
+                )
+            lines.append(line)
+        return lines
+
+    def close(self) -> None:
+        """Close idle keep-alive connections."""
+        with self._lock:
+            hosts = list(self._hosts.values())
+        for host in hosts:
+            host.close()
+
+
+# ---------------------------------------------------------------------------
+# Process-wide scheduler
+# ---------------------------------------------------------------------------
+
+_default: Optional[DownloadScheduler] = None
+_default_lock = threading.Lock()
+
+
+def configure(**options: Any) -> DownloadScheduler:
+    """Replace the process-wide scheduler; *options* are :class:`DownloadScheduler` arguments."""
+    global _default
+    with _default_lock:
+        if _default is not None:
+            _default.close()
+        _default = DownloadScheduler(**options)
+        return _default
+
+
+def default_scheduler() -> DownloadScheduler:
+    """The process-wide scheduler, created with defaults on first use."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = DownloadScheduler()
+        return _default
@@ -0,0 +1,304 @@
+"""
+Accuracy and speed evaluation for the ``eval`` command.
+
+A fixture directory holds audio files with a reference transcript of the
+same name (``talk.wav`` + ``talk.txt``).  Every fixture is decoded once
+and transcribed with each configuration; hypotheses and references are
+normalised with Whisper's :class:`~whisper.normalizers.BasicTextNormalizer`
+before scoring:
+
+* WER -- word edit distance / reference words;
+* CER -- character edit distance / reference characters;
+* RTF -- transcription wall time / audio duration (model loading is
+  done before timing starts).
+
+Totals per configuration are corpus-level (summed errors over summed
+reference lengths), so long fixtures weigh more than short ones.
+
+A configuration is a comma-separated ``key=value`` list, optionally
+prefixed with a label: ``tiny``, ``small-beam:model=small,beam_size=5``,
+``tiered:model=tiny,refine_model=medium``.  ``model``, ``language``,
+``bounded_memory``, ``window_seconds`` and ``refine_model`` (plus the
+tiering thresholds) select the pipeline; any other key is passed to
+Whisper's ``transcribe``.
+"""
+
+import ast
+import contextlib
+import logging
+import os
+import time
+import wave
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from whisper.normalizers import BasicTextNormalizer
+
+from shared_audio import SharedAudio
+from tiering import transcribe_tiered
+from transcriber import (
+    DEFAULT_WINDOW_SECONDS,
+    SAMPLE_RATE,
+    VALID_MODELS,
+    decode_to_shared,
+    get_model,
+    pcm_to_float,
+    transcribe_audio,
+)
+
+log = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".flac", ".m4a", ".ogg", ".opus", ".webm", ".mp4"}
+_PIPELINE_KEYS = {"model", "language", "bounded_memory", "window_seconds"}
+_TIERED_KEYS = {"refine_model", "min_avg_logprob", "max_compression_ratio", "max_no_speech_prob"}
+
+_normalizer = BasicTextNormalizer()
+
+
+# ---------------------------------------------------------------------------
+# Scoring
+# ---------------------------------------------------------------------------
+
+def normalize_text(text: str) -> str:
+    """Lower-case, drop punctuation and bracketed asides, collapse whitespace."""
+    return " ".join(_normalizer(text).split())
+
+
+def edit_distance(ref: Sequence[Any], hyp: Sequence[Any]) -> int:
+    """Levenshtein distance between two token sequences."""
+    if not ref or not hyp:
+        return len(ref) + len(hyp)
+    vocab: Dict[Any, int] = {}
+    hyp_ids = np.array([vocab.setdefault(t, len(vocab)) for t in hyp])
+    offsets = np.arange(len(hyp) + 1)
+    prev = offsets.copy()
+    for token in ref:
+        cur = np.empty_like(prev)
+        cur[0] = prev[0] + 1
+        # Match/substitution from the diagonal, deletion from above
+        cur[1:] = np.minimum(prev[:-1] + (hyp_ids != vocab.get(token, -1)), prev[1:] + 1)
+        # Insertions chain along the row: cur[j] = min(cur[j], cur[j-1] + 1)
+        prev = np.minimum.accumulate(cur - offsets) + offsets
+    return int(prev[-1])
+
+
+def score(reference: str, hypothesis: str) -> Dict[str, int]:
+    """Word and character errors of *hypothesis* against *reference*."""
+    ref, hyp = normalize_text(reference), normalize_text(hypothesis)
+    ref_words = ref.split()
+    return {
+        "word_errors": edit_distance(ref_words, hyp.split()),
+        "words": len(ref_words),
+        "char_errors": edit_distance(ref, hyp),
+        "chars": len(ref),
+    }
+
+
+def _rate(errors: int, total: int) -> float:
+    return errors / total if total else float(errors > 0)
+
+
+# ---------------------------------------------------------------------------
+# Fixtures and configurations
+# ---------------------------------------------------------------------------
+
+def find_fixtures(directory: str) -> List[Tuple[str, str]]:
+    """``(audio_path, reference_text)`` for every audio file with a ``.txt`` beside it."""
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in AUDIO_EXTENSIONS:
+            continue
+        reference = os.path.join(directory, stem + ".txt")
+        if not os.path.exists(reference):
+            log.warning("Skipping %s: no reference %s", name, reference)
+            continue
+        with open(reference, encoding="utf-8") as fh:
+            fixtures.append((os.path.join(directory, name), fh.read()))
+    return fixtures
+
+
+def load_fixture(path: str) -> SharedAudio:
+    """Decode *path* once; 16 kHz mono 16-bit WAV files are read without ffmpeg."""
+    if path.lower().endswith(".wav"):
+        with contextlib.closing(wave.open(path, "rb")) as wav:
+            if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) == (SAMPLE_RATE, 1, 2):
+                return SharedAudio.from_samples(pcm_to_float(wav.readframes(wav.getnframes())))
+    return decode_to_shared(path)
+
+
+def _split_items(body: str) -> List[str]:
+    """Split on commas that are not inside brackets: ``temperature=(0.0, 0.4)``."""
+    items, depth, start = [], 0, 0
+    for i, ch in enumerate(body):
+        if ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            items.append(body[start:i])
+            start = i + 1
+    items.append(body[start:])
+    return [item.strip() for item in items if item.strip()]
+
+
+def _parse_value(text: str) -> Any:
+    if text.lower() in ("true", "false"):
+        return text.lower() == "true"
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_config(spec: str) -> Dict[str, Any]:
+    """
+    Parse ``[label:]key=value,...`` (or a bare model name) into a configuration.
+
+    Returns:
+        ``{"label": ..., "options": {...}}`` with ``model`` defaulting to ``base``.
+
+    Raises:
+        ValueError: For malformed items or an unknown model.
+    """
+    label, sep, body = spec.partition(":")
+    if not sep:
+        label, body = "", spec
+    if body in VALID_MODELS:
+        body = f"model={body}"
+    options: Dict[str, Any] = {}
+    for item in _split_items(body):
+        key, eq, value = item.partition("=")
+        if not eq or not key:
+            raise ValueError(f"Bad configuration item '{item}' in '{spec}' (expected key=value)")
+        options[key.strip()] = _parse_value(value.strip())
+    options.setdefault("model", "base")
+    for key in ("model", "refine_model"):
+        if key in options and options[key] not in VALID_MODELS:
+            raise ValueError(f"Unknown model '{options[key]}' in '{spec}'")
+    return {"label": label or spec, "options": options}
+
+
+def run_config(audio: SharedAudio, options: Dict[str, Any]) -> dict:
+    """Transcribe *audio* with one configuration's *options*."""
+    opts = dict(options)
+    pipeline = {k: opts.pop(k) for k in _PIPELINE_KEYS & set(opts)}
+    tiered = {k: opts.pop(k) for k in _TIERED_KEYS & set(opts)}
+    if tiered:
+        if opts or "window_seconds" in pipeline:
+            raise ValueError("Tiered configurations accept no Whisper options")
+        return transcribe_tiered(
+            audio, draft_model=pipeline["model"], final_model=tiered.pop("refine_model", "medium"),
+            language=pipeline.get("language"), bounded_memory=pipeline.get("bounded_memory", False),
+            **tiered,
+        )
+    return transcribe_audio(
+        audio,
+        model_name=pipeline["model"],
+        language=pipeline.get("language"),
+        bounded_memory=pipeline.get("bounded_memory", False),
+        window_seconds=pipeline.get("window_seconds", DEFAULT_WINDOW_SECONDS),
+        transcribe_options=opts,
+    )
+
+
+def _preload(options: Dict[str, Any]) -> None:
+    for key in ("model", "refine_model"):
+        if key in options:
+            get_model(options[key])
+
+
+# ---------------------------------------------------------------------------
+# Evaluation
+# ---------------------------------------------------------------------------
+
+def evaluate(
+    fixtures: List[Tuple[str, str]],
+    configs: List[Dict[str, Any]],
+    transcribe: Optional[Callable[[SharedAudio, Dict[str, Any]], dict]] = None,
+    preload: Optional[Callable[[Dict[str, Any]], None]] = None,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Transcribe every fixture with every configuration and score it.
+
+    Args:
+        fixtures: From :func:`find_fixtures`.
+        configs: From :func:`parse_config`.
+        transcribe: ``(audio, options) -> result`` (default :func:`run_config`).
+        preload: Called with each configuration's options before any timing,
+            so model loading is not counted (default: load the Whisper models).
+        on_result: Called with each per-fixture result as it is produced.
+
+    Returns:
+        One dict per (configuration, fixture): ``config``, ``fixture``,
+        ``audio_seconds``, ``seconds``, ``rtf``, ``wer``, ``cer``, the raw
+        error counts and the ``hypothesis`` text.
+    """
+    transcribe = transcribe or run_config
+    preload = preload or _preload
+    for config in configs:
+        preload(config["options"])
+
+    results = []
+    for path, reference in fixtures:
+        audio = load_fixture(path)
+        try:
+            duration = audio.duration
+            for config in configs:
+                start = time.perf_counter()
+                result = transcribe(audio, config["options"])
+                elapsed = time.perf_counter() - start
+                counts = score(reference, result["text"])
+                row = {
+                    "config": config["label"],
+                    "fixture": os.path.basename(path),
+                    "audio_seconds": duration,
+                    "seconds": elapsed,
+                    "rtf": elapsed / duration if duration else 0.0,
+                    "wer": _rate(counts["word_errors"], counts["words"]),
+                    "cer": _rate(counts["char_errors"], counts["chars"]),
+                    **counts,
+                    "hypothesis": result["text"].strip(),
+                }
+                results.append(row)
+                if on_result:
+                    on_result(row)
+        finally:
+            audio.close()
+    return results
+
+
+def summarize(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Corpus-level totals per configuration, in first-seen order."""
+    totals: Dict[str, Dict[str, Any]] = {}
+    for row in results:
+        t = totals.setdefault(row["config"], {
+            "config": row["config"], "fixtures": 0, "audio_seconds": 0.0, "seconds": 0.0,
+            "word_errors": 0, "words": 0, "char_errors": 0, "chars": 0,
+        })
+        t["fixtures"] += 1
+        for key in ("audio_seconds", "seconds", "word_errors", "words", "char_errors", "chars"):
+            t[key] += row[key]
+    for t in totals.values():
+        t["wer"] = _rate(t["word_errors"], t["words"])
+        t["cer"] = _rate(t["char_errors"], t["chars"])
+        t["rtf"] = t["seconds"] / t["audio_seconds"] if t["audio_seconds"] else 0.0
+    return list(totals.values())
+
+
+def format_table(summary: List[Dict[str, Any]]) -> str:
+    """Comparison table; ``dWER`` and ``speedup`` are relative to the first configuration."""
+    width = max([len("config")] + [len(t["config"]) for t in summary])
+    lines = [
+        f"{'config':<{width}} {'files':>5} {'WER':>7} {'CER':>7} {'RTF':>6} {'dWER':>7} {'speedup':>7}",
+    ]
+    base = summary[0] if summary else None
+    for t in summary:
+        delta = (t["wer"] - base["wer"]) * 100
+        speedup = base["rtf"] / t["rtf"] if t["rtf"] else float("inf")
+        lines.append(
+            f"{t['config']:<{width}} {t['fixtures']:>5} {t['wer'] * 100:>6.1f}% {t['cer'] * 100:>6.1f}% "
+            f"{t['rtf']:>6.3f} {delta:>+6.1f}% {speedup:>6.2f}x"
+        )
+    return "\n".join(lines)
@@ -2,12 +2,14 @@
 
 import logging
 import os
-import threading
+import queue
+from typing import Any, Dict, List
 
 import customtkinter as ctk
 
+from job_queue import CANCELLED, DONE, FAILED, FINAL_STATES, JobQueue, queue_plan
 from logger import setup_logging
-from workflow import generate_transcript
+from resources import apply_plan
 from writers import SUPPORTED_FORMATS
 
 # Initialise logging (GUI might be launched directly)
@@ -24,6 +26,16 @@ _DANGER = "#D9534F"
 _DANGER_HOVER = "#C9302C"
 _MUTED = "#6B7280"
 
+# UI updates from worker threads are queued and applied in batches
+_POLL_MS = 100
+_MAX_EVENTS_PER_POLL = 500
+
+_STATE_COLOURS = {
+    DONE: _SUCCESS,
+    FAILED: "red",
+    CANCELLED: _MUTED,
+}
+
 
 class TranscriptApp(ctk.CTk):
     """Main GUI window."""
@@ -31,12 +43,16 @@ class TranscriptApp(ctk.CTk):
     def __init__(self) -> None:
         super().__init__()
 
-        self._cancel_event = threading.Event()
+        self._events: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        plan = queue_plan()
+        apply_plan(plan)
+        self._jobs = JobQueue(on_event=self._events.put, inference_workers=plan.inference_workers)
+        self._rows: Dict[int, Dict[str, Any]] = {}
 
         # ── Window setup ─────────────────────────────────────────────
         self.title("M3U8 Transcript Generator")
-        self.geometry("660x720")
-        self.minsize(580, 660)
+        self.geometry("700x860")
+        self.minsize(600, 760)
         self.grid_columnconfigure(0, weight=1)
 
         # Use system preference (Dark/Light) by default
@@ -76,14 +92,12 @@ class TranscriptApp(ctk.CTk):
         url_frame.grid_columnconfigure(0, weight=1)
         row += 1
 
-        ctk.CTkLabel(url_frame, text="Stream URL", font=ctk.CTkFont(size=13, weight="bold")).grid(
-            row=0, column=0, sticky="w", pady=(0, 4),
-        )
-        self.url_entry = ctk.CTkEntry(
-            url_frame, placeholder_text="https://example.com/stream/playlist.m3u8",
-            height=38,
-        )
-        self.url_entry.grid(row=1, column=0, sticky="ew")
+        ctk.CTkLabel(
+            url_frame, text="Stream URLs (one per line)",
+            font=ctk.CTkFont(size=13, weight="bold"),
+        ).grid(row=0, column=0, sticky="w", pady=(0, 4))
+        self.url_box = ctk.CTkTextbox(url_frame, height=70, corner_radius=8, wrap="none")
+        self.url_box.grid(row=1, column=0, sticky="ew")
 
         # ── Options Card ─────────────────────────────────────────────
         self.options_card = ctk.CTkFrame(self, corner_radius=12)
@@ -161,14 +175,14 @@ class TranscriptApp(ctk.CTk):
         row += 1
 
         self.generate_btn = ctk.CTkButton(
-            btn_frame, text="Generate Transcript",
+            btn_frame, text="Add to Queue",
             height=42, font=ctk.CTkFont(size=14, weight="bold"),
             command=self._start_generation,
         )
         self.generate_btn.grid(row=0, column=0, sticky="ew")
 
         self.cancel_btn = ctk.CTkButton(
-            btn_frame, text="Cancel", width=90, height=42,
+            btn_frame, text="Cancel Pending", width=120, height=42,
             fg_color=_MUTED, hover_color=_DANGER_HOVER,
             state="disabled",
             command=self._request_cancel,
@@ -181,6 +195,19 @@ class TranscriptApp(ctk.CTk):
         self.progress_bar.set(0)
         row += 1
 
+        # ── Job queue ───────────────────────────────────────────────
+        ctk.CTkLabel(
+            self, text="Queue",
+            font=ctk.CTkFont(size=12, weight="bold"), text_color=_MUTED,
+        ).grid(row=row, column=0, padx=20, pady=(10, 0), sticky="w")
+        row += 1
+
+        self.queue_frame = ctk.CTkScrollableFrame(self, height=170, corner_radius=10)
+        self.queue_frame.grid(row=row, column=0, padx=20, pady=(4, 0), sticky="nsew")
+        self.queue_frame.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(row, weight=1)
+        row += 1
+
         # ── Log / status box ────────────────────────────────────────
         log_label_frame = ctk.CTkFrame(self, fg_color="transparent")
         log_label_frame.grid(row=row, column=0, padx=20, pady=(10, 0), sticky="ew")
@@ -216,6 +243,8 @@ class TranscriptApp(ctk.CTk):
             font=ctk.CTkFont(size=11, slant="italic"), text_color=_MUTED,
         ).grid(row=0, column=1, sticky="e")
 
+        self.after(_POLL_MS, self._poll_events)
+
     # ------------------------------------------------------------------
     # Theme toggle
     # ------------------------------------------------------------------
@@ -244,114 +273,134 @@ class TranscriptApp(ctk.CTk):
             self.output_entry.delete(0, "end")
             self.output_entry.insert(0, filename)
 
-    # ── Thread-safe UI updates ───────────────────────────────────────
+    # ── UI updates (main thread only) ───────────────────────────
 
     def _update_status(self, message: str, color: str) -> None:
-        self.after(0, lambda: self.status_label.configure(text=message, text_color=color))
+        self.status_label.configure(text=message, text_color=color)
 
-    def _append_log(self, text: str) -> None:
-        """Thread-safe log box append."""
-        def _write() -> None:
-            self.log_box.configure(state="normal")
-            self.log_box.insert("end", text + "\n")
-            self.log_box.see("end")
-            self.log_box.configure(state="disabled")
-        self.after(0, _write)
-
-    def _set_progress(self, value: float) -> None:
-        self.after(0, lambda: self.progress_bar.set(value))
+    def _append_log(self, lines: List[str]) -> None:
+        self.log_box.configure(state="normal")
+        self.log_box.insert("end", "\n".join(lines) + "\n")
+        self.log_box.see("end")
+        self.log_box.configure(state="disabled")
 
     def _request_cancel(self) -> None:
-        self._cancel_event.set()
-        self._update_status("Cancelling...", "orange")
-        self._append_log("[!] Cancel requested -- waiting for current step...")
-
-    def _set_running(self, running: bool) -> None:
-        def _apply() -> None:
-            if running:
-                self.generate_btn.configure(state="disabled")
-                self.cancel_btn.configure(state="normal", fg_color=_DANGER, hover_color=_DANGER_HOVER)
-            else:
-                self.generate_btn.configure(state="normal")
-                self.cancel_btn.configure(state="disabled", fg_color=_MUTED)
-        self.after(0, _apply)
+        cancelled = self._jobs.cancel_pending()
+        self._append_log([f"[!] Cancelled {cancelled} pending job(s)."])
+
+    def _add_row(self, job_id: int, url: str) -> None:
+        index = len(self._rows)
+        frame = ctk.CTkFrame(self.queue_frame, fg_color="transparent")
+        frame.grid(row=index, column=0, sticky="ew", pady=2)
+        frame.grid_columnconfigure(0, weight=1)
+
+        label = url if len(url) <= 60 else url[:28] + "..." + url[-29:]
+        ctk.CTkLabel(
+            frame, text=f"{job_id}. {label}", anchor="w", font=ctk.CTkFont(size=12),
+        ).grid(row=0, column=0, sticky="ew")
+        state = ctk.CTkLabel(
+            frame, text="queued", width=90, anchor="e",
+            text_color=_MUTED, font=ctk.CTkFont(size=12),
+        )
+        state.grid(row=0, column=1, sticky="e")
+        bar = ctk.CTkProgressBar(frame, height=4, corner_radius=2)
+        bar.set(0)
+        bar.grid(row=1, column=0, columnspan=2, sticky="ew")
+
+        self._rows[job_id] = {"state": state, "bar": bar, "last": "queued"}
+
+    # ------------------------------------------------------------------
+    # Event pump
+    # ------------------------------------------------------------------
+
+    def _poll_events(self) -> None:
+        """Drain worker events and apply them in one batch."""
+        latest: Dict[int, Dict[str, Any]] = {}
+        lines: List[str] = []
+        for _ in range(_MAX_EVENTS_PER_POLL):
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            latest[event["job"]] = event
+            lines.append(f"[{event['job']}] {event['message']}")
+
+        for job_id, event in latest.items():
+            row = self._rows.get(job_id)
+            if row is None:
+                continue
+            row["last"] = event["state"]
+            row["state"].configure(
+                text=event["state"],
+                text_color=_STATE_COLOURS.get(event["state"], "orange"),
+            )
+            row["bar"].set(event["progress"])
+
+        if lines:
+            self._append_log(lines)
+        if latest:
+            self._refresh_summary()
+
+        self.after(_POLL_MS, self._poll_events)
+
+    def _refresh_summary(self) -> None:
+        states = [row["last"] for row in self._rows.values()]
+        total = len(states)
+        finished = sum(1 for st in states if st in FINAL_STATES)
+        failed = states.count(FAILED)
+        self.progress_bar.set(finished / total if total else 0)
+
+        active = finished < total
+        self.cancel_btn.configure(
+            state="normal" if active else "disabled",
+            fg_color=_DANGER if active else _MUTED,
+        )
+        text = f"{finished}/{total} finished"
+        if failed:
+            text += f", {failed} failed"
+        self._update_status(text, _ACCENT if active else (_DANGER if failed else _SUCCESS))
 
     # ------------------------------------------------------------------
     # Generation
     # ------------------------------------------------------------------
 
     def _start_generation(self) -> None:
-        url = self.url_entry.get().strip()
-        if not url:
-            self._update_status("Please enter a URL.", "red")
+        urls = [u.strip() for u in self.url_box.get("1.0", "end").splitlines() if u.strip()]
+        if not urls:
+            self._update_status("Please enter at least one URL.", "red")
             return
-        if not url.startswith(("http://", "https://")):
-            self._update_status("Invalid URL -- must start with http:// or https://", "red")
+        invalid = [u for u in urls if not u.startswith(("http://", "https://"))]
+        if invalid:
+            self._update_status(
+                f"Invalid URL -- must start with http:// or https://: {invalid[0]}", "red",
+            )
             return
 
-        # Clear log
-        self.after(0, lambda: (
-            self.log_box.configure(state="normal"),
-            self.log_box.delete("1.0", "end"),
-            self.log_box.configure(state="disabled"),
-        ))
-
-        self._cancel_event.clear()
-        self._set_running(True)
-        self._update_status("Starting...", _ACCENT)
-        self._set_progress(0)
-
-        threading.Thread(target=self._run, args=(url,), daemon=True).start()
-
-    def _run(self, url: str) -> None:
-        model = self.model_menu.get()
-        keep = bool(self.keep_audio_switch.get())
+        options = {
+            "model_name": self.model_menu.get(),
+            "keep_audio": bool(self.keep_audio_switch.get()),
+            "output_format": self.format_menu.get(),
+            "language": self.language_entry.get().strip() or None,
+        }
         output = self.output_entry.get().strip() or None
-        fmt = self.format_menu.get()
-        lang = self.language_entry.get().strip() or None
-
-        step = 0
-        total = 3
-
-        def on_status(msg: str) -> None:
-            nonlocal step
-            step += 1
-            self._set_progress(min(step / total, 0.95))
-            self._update_status(msg, "orange")
-            self._append_log(f"[{step}/{total}] {msg}")
-
-        try:
-            if self._cancel_event.is_set():
-                self._update_status("Cancelled.", _MUTED)
-                self._append_log("[x] Cancelled before start.")
-                return
-
-            result_path = generate_transcript(
-                url=url,
-                model_name=model,
-                output_path=output,
-                keep_audio=keep,
-                output_format=fmt,
-                language=lang,
-                on_status=on_status,
-            )
-
-            if self._cancel_event.is_set():
-                self._update_status("Cancelled.", _MUTED)
-                self._append_log("[x] Cancelled.")
-                return
-
-            self._set_progress(1.0)
-            self._update_status(f"Done -- saved to {os.path.basename(result_path)}", _SUCCESS)
-            self._append_log(f"[OK] Transcript saved to {result_path}")
-
-        except Exception as exc:
-            log.exception("Generation failed")
-            self._update_status(f"Error: {exc}", "red")
-            self._append_log(f"[ERROR] {exc}")
 
-        finally:
-            self._set_running(False)
+        for n, url in enumerate(urls, start=1):
+            job_output = output
+            if output and len(urls) > 1:
+                stem, ext = os.path.splitext(output)
+                job_output = f"{stem}_{n}{ext}"
+            job_id = self._jobs.submit(url, output_path=job_output, **options)
+            self._add_row(job_id, url)
+
+        self.url_box.delete("1.0", "end")
+        # A chosen path belongs to this batch; left in place, the next batch
+        # would write the same files over these jobs' transcripts
+        self.output_entry.delete(0, "end")
+        self._refresh_summary()
+
+    def destroy(self) -> None:
+        self._jobs.shutdown(wait=False)
+        super().destroy()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,302 @@
+"""
+HLS master-playlist parsing and audio rendition selection.
+
+Left to itself, yt-dlp downloads the best (usually video+audio) variant and
+then throws the video away.  For transcription only the audio matters, so
+before handing a URL to yt-dlp we look at the master playlist and pick, in
+order of preference:
+
+1. an audio-only ``#EXT-X-MEDIA`` rendition,
+2. an audio-only variant (``CODECS`` without a video codec),
+3. the lowest-bandwidth variant.
+
+Master playlists do not advertise audio sample rates, so the "good enough
+audio" floor is expressed as a minimum declared ``BANDWIDTH``.
+"""
+
+import logging
+import re
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin
+
+from download_scheduler import default_scheduler
+
+log = logging.getLogger(__name__)
+
+FETCH_TIMEOUT_SECONDS = 15
+USER_AGENT = "m3u8-transcript"
+
+# Variants declaring less than this many bits/s are skipped unless nothing
+# else is available -- below it, audio is often 8 kHz telephone quality.
+DEFAULT_MIN_BANDWIDTH = 32_000
+
+_VIDEO_CODECS = ("avc", "hvc", "hev", "vp0", "vp8", "vp9", "av01", "dvh", "dva", "mp4v")
+_ATTR = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+# ---------------------------------------------------------------------------
+# Fetching
+# ---------------------------------------------------------------------------
+
+def fetch_text(url: str, timeout: float = FETCH_TIMEOUT_SECONDS) -> str:
+    """GET *url* through the download scheduler and return the body decoded as UTF-8."""
+    resp = default_scheduler().request(url, headers={"User-Agent": USER_AGENT}, timeout=timeout)
+    return resp["body"].decode("utf-8", errors="replace")
+
+
+def _content_length(url: str, timeout: float = FETCH_TIMEOUT_SECONDS) -> Optional[int]:
+    try:
+        resp = default_scheduler().request(
+            url, method="HEAD", headers={"User-Agent": USER_AGENT}, timeout=timeout,
+        )
+        length = resp["headers"].get("Content-Length")
+        return int(length) if length else None
+    except (OSError, ValueError):
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+
+def parse_attributes(attr_list: str) -> Dict[str, str]:
+    """Parse an HLS attribute list (``KEY=value,KEY="quoted, value"``)."""
+    return {key: value.strip('"') for key, value in _ATTR.findall(attr_list)}
+
+
+def is_master_playlist(text: str) -> bool:
+    """True if *text* lists variants or renditions rather than media segments."""
+    return "#EXT-X-STREAM-INF" in text or "#EXT-X-MEDIA:" in text
+
+
+def parse_master_playlist(text: str, base_url: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Parse a master playlist.
+
+    Returns:
+        ``{"variants": [...], "audio": [...]}``.  Variants carry ``uri``,
+        ``bandwidth``, ``codecs``, ``audio_group`` and ``audio_only``; audio
+        renditions carry ``uri``, ``group``, ``name``, ``language`` and
+        ``default``.  URIs are resolved against *base_url*.
+    """
+    variants: List[Dict[str, Any]] = []
+    audio: List[Dict[str, Any]] = []
+    pending: Optional[Dict[str, str]] = None
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            pending = parse_attributes(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-MEDIA:"):
+            attrs = parse_attributes(line.split(":", 1)[1])
+            if attrs.get("TYPE") == "AUDIO" and attrs.get("URI"):
+                audio.append({
+                    "uri": urljoin(base_url, attrs["URI"]),
+                    "group": attrs.get("GROUP-ID", ""),
+                    "name": attrs.get("NAME", ""),
+                    "language": attrs.get("LANGUAGE"),
+                    "default": attrs.get("DEFAULT") == "YES",
+                })
+        elif not line.startswith("#") and pending is not None:
+            codecs = pending.get("CODECS", "")
+            bandwidth = pending.get("AVERAGE-BANDWIDTH") or pending.get("BANDWIDTH") or "0"
+            variants.append({
+                "uri": urljoin(base_url, line),
+                "bandwidth": int(bandwidth),
+                "codecs": codecs,
+                "audio_group": pending.get("AUDIO"),
+                "audio_only": bool(codecs) and "RESOLUTION" not in pending and not any(
+                    c.strip().lower().startswith(_VIDEO_CODECS) for c in codecs.split(",")
+                ),
+            })
+            pending = None
+
+    return {"variants": variants, "audio": audio}
+
+
+def parse_media_playlist(text: str, base_url: str) -> Dict[str, Any]:
+    """Return ``duration``, ``segment_count`` and ``first_segment`` of a media playlist."""
+    duration = 0.0
+    count = 0
+    first_segment: Optional[str] = None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if line.startswith("#EXTINF:"):
+            duration += float(line[len("#EXTINF:"):].split(",", 1)[0] or 0)
+            count += 1
+        elif line and not line.startswith("#") and first_segment is None:
+            first_segment = urljoin(base_url, line)
+    return {"duration": duration, "segment_count": count, "first_segment": first_segment}
+
+
+def parse_segments(text: str, base_url: str) -> Dict[str, Any]:
+    """
+    List the media segments of a media playlist.
+
+    Returns:
+        ``{"segments": [...], "init": uri or None, "encrypted": bool,
+        "drm": bool, "ended": bool}``.  ``drm`` marks sample-level or
+        key-system encryption that ffmpeg cannot decrypt (plain AES-128
+        only sets ``encrypted``).  Each segment carries ``uri``, ``sequence`` (its
+        media sequence number), ``duration`` and ``start`` (seconds from
+        the first listed segment).
+    """
+    segments: List[Dict[str, Any]] = []
+    sequence = 0
+    start = 0.0
+    duration: Optional[float] = None
+    init: Optional[str] = None
+    encrypted = False
+    drm = False
+    ended = False
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            sequence = int(line.split(":", 1)[1])
+        elif line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",", 1)[0] or 0)
+        elif line.startswith("#EXT-X-MAP:"):
+            uri = parse_attributes(line.split(":", 1)[1]).get("URI")
+            init = urljoin(base_url, uri) if uri else None
+        elif line.startswith("#EXT-X-KEY:"):
+            attrs = parse_attributes(line.split(":", 1)[1])
+            method = attrs.get("METHOD", "NONE")
+            encrypted = encrypted or method != "NONE"
+            drm = drm or method.startswith("SAMPLE-AES") or attrs.get("KEYFORMAT", "identity") != "identity"
+        elif line.startswith("#EXT-X-ENDLIST"):
+            ended = True
+        elif not line.startswith("#") and duration is not None:
+            segments.append({
+                "uri": urljoin(base_url, line),
+                "sequence": sequence,
+                "duration": duration,
+                "start": start,
+            })
+            sequence += 1
+            start += duration
+            duration = None
+
+    return {"segments": segments, "init": init, "encrypted": encrypted, "drm": drm, "ended": ended}
+
+
+# ---------------------------------------------------------------------------
+# Selection
+# ---------------------------------------------------------------------------
+
+def choose_rendition(
+    master: Dict[str, List[Dict[str, Any]]],
+    min_bandwidth: int = DEFAULT_MIN_BANDWIDTH,
+    language: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Pick the cheapest rendition that still carries usable audio.
+
+    *min_bandwidth* applies to audio renditions through their group: the
+    cheapest group whose lowest referencing variant declares at least that
+    much is used.  Groups no variant references cannot be judged and are
+    used only when no judged group clears the floor; when neither exists,
+    the cheapest group is used, as variants fall back to the cheapest one.
+
+    Returns:
+        A dict with ``uri``, ``kind`` and ``bandwidth`` (None when the
+        playlist does not declare one), or None if there is nothing to pick.
+    """
+    variants = master["variants"]
+    by_bandwidth = sorted(variants, key=lambda v: v["bandwidth"])
+    eligible = [v for v in by_bandwidth if v["bandwidth"] >= min_bandwidth] or by_bandwidth
+
+    if master["audio"]:
+        # Renditions declare no bitrate, but a group's audio is carried within
+        # the BANDWIDTH of every variant referencing it, so the cheapest such
+        # variant bounds it and is what the floor is checked against.
+        group_bandwidth: Dict[str, int] = {}
+        for v in variants:
+            group = v["audio_group"]
+            if group:
+                group_bandwidth[group] = min(v["bandwidth"], group_bandwidth.get(group, v["bandwidth"]))
+        judged = sorted(
+            (bandwidth, group) for group, bandwidth in group_bandwidth.items()
+            if any(a["group"] == group for a in master["audio"])
+        )
+        usable = [group for bandwidth, group in judged if bandwidth >= min_bandwidth]
+        unjudged = [a for a in master["audio"] if a["group"] not in group_bandwidth]
+        if usable:
+            candidates = [a for a in master["audio"] if a["group"] == usable[0]]
+        elif unjudged:
+            candidates = unjudged
+        else:
+            candidates = [a for a in master["audio"] if a["group"] == judged[0][1]]
+        if language:
+            candidates = [a for a in candidates if a["language"] == language] or candidates
+        best = next((a for a in candidates if a["default"]), candidates[0])
+        return {"uri": best["uri"], "kind": "audio rendition", "bandwidth": None}
+
+    audio_only = [v for v in eligible if v["audio_only"]]
+    if audio_only:
+        return {"uri": audio_only[0]["uri"], "kind": "audio-only variant",
+                "bandwidth": audio_only[0]["bandwidth"]}
+
+    if eligible:
+        return {"uri": eligible[0]["uri"], "kind": "lowest-bandwidth variant",
+                "bandwidth": eligible[0]["bandwidth"]}
+    return None
+
+
+def estimate_bytes(choice: Dict[str, Any], media: Dict[str, Any]) -> Optional[int]:
+    """Estimate download size from the declared bandwidth or the first segment."""
+    duration = media["duration"]
+    if not duration:
+        return None
+    if choice.get("bandwidth"):
+        return int(choice["bandwidth"] * duration / 8)
+    if media["first_segment"]:
+        size = _content_length(media["first_segment"])
+        if size:
+            return size * max(1, media["segment_count"])
+    return None
+
+
+def select_rendition(
+    url: str,
+    min_bandwidth: int = DEFAULT_MIN_BANDWIDTH,
+    language: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetch *url* and, if it is a master playlist, choose an audio rendition.
+
+    Returns:
+        None if *url* is not a master playlist (nothing to choose), else the
+        choice from :func:`choose_rendition` extended with ``duration``,
+        ``estimated_bytes`` and ``default_estimated_bytes`` (the highest-
+        bandwidth variant yt-dlp would pick by default).
+    """
+    text = fetch_text(url)
+    if not is_master_playlist(text):
+        return None
+
+    master = parse_master_playlist(text, url)
+    choice = choose_rendition(master, min_bandwidth=min_bandwidth, language=language)
+    if choice is None:
+        return None
+
+    media = parse_media_playlist(fetch_text(choice["uri"]), choice["uri"])
+
+    default_bw = max((v["bandwidth"] for v in master["variants"]), default=0)
+    choice["duration"] = media["duration"]
+    choice["estimated_bytes"] = estimate_bytes(choice, media)
+    choice["default_estimated_bytes"] = (
+        int(default_bw * media["duration"] / 8) if default_bw and media["duration"] else None
+    )
+    return choice
+
+
+def format_bytes(n: Optional[int]) -> str:
+    """Human-readable size for log messages."""
+    if n is None:
+        return "unknown"
+    return f"{n / 1_000_000:.1f} MB"
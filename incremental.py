@@ -0,0 +1,373 @@
+"""
+Incremental re-transcription of growing HLS playlists.
+
+Some sources publish a VOD playlist that keeps being extended (or has a few
+segments re-encoded) and is transcribed again on a schedule.  Instead of
+downloading and transcribing the whole stream each time,
+:func:`update_transcript` keeps a small JSON state file per URL recording,
+for every media segment, its URI, sequence number, SHA-256 of its bytes,
+the HTTP validators the server sent and the Whisper segments it produced
+(with times relative to the media segment).
+
+On the next run only segments that are new, or whose bytes changed, are
+transcribed; each contiguous run of them is concatenated into one file so
+Whisper sees as much context as possible.  Known segments are re-checked
+with conditional GETs (``If-None-Match`` / ``If-Modified-Since``), so with a
+well-behaved server unchanged content is not even downloaded again.  The
+merged result is written to the same output file as before.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from download_scheduler import default_scheduler
+from hls import (
+    DEFAULT_MIN_BANDWIDTH,
+    FETCH_TIMEOUT_SECONDS,
+    USER_AGENT,
+    choose_rendition,
+    fetch_text,
+    is_master_playlist,
+    parse_master_playlist,
+    parse_segments,
+)
+from scratch import make_scratch_file
+from search_index import DEFAULT_INDEX_PATH
+from transcriber import transcribe_audio
+from workflow import TRANSCRIPTS_DIR, index_transcript, remove_temp_audio, resolve_output_path
+from writers import STDOUT, write_transcript
+
+log = logging.getLogger(__name__)
+
+DEFAULT_STATE_DIR = os.path.join(TRANSCRIPTS_DIR, ".incremental")
+STATE_VERSION = 1
+
+# Text from the segments just before a re-transcribed run, passed to Whisper
+# as ``initial_prompt`` so the run continues the existing transcript.
+_PROMPT_CHARS = 200
+
+
+# ---------------------------------------------------------------------------
+# State
+# ---------------------------------------------------------------------------
+
+def state_path(url: str, state_dir: str = DEFAULT_STATE_DIR) -> str:
+    """Path of the state file for *url*."""
+    digest = hashlib.sha256(url.encode("utf-8")).hexdigest()[:20]
+    return os.path.join(state_dir, f"{digest}.json")
+
+
+def load_state(path: str) -> Optional[Dict[str, Any]]:
+    """Read a state file; None if missing, unreadable or from another version."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            state = json.load(fh)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        log.warning("Ignoring unreadable state file %s: %s", path, exc)
+        return None
+    if state.get("version") != STATE_VERSION:
+        return None
+    return state
+
+
+def save_state(path: str, state: Dict[str, Any]) -> None:
+    """Write *state* atomically so an interrupted run never leaves half a file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------------------------
+# Fetching
+# ---------------------------------------------------------------------------
+
+def resolve_media_playlist(
+    url: str,
+    select_audio: bool = True,
+    min_bandwidth: int = DEFAULT_MIN_BANDWIDTH,
+    language: Optional[str] = None,
+) -> Tuple[str, str]:
+    """
+    Return ``(media_playlist_url, text)`` for *url*.
+
+    Master playlists are resolved to the cheapest audio rendition (or, with
+    *select_audio* off, the highest-bandwidth variant).
+    """
+    text = fetch_text(url)
+    if not is_master_playlist(text):
+        return url, text
+
+    master = parse_master_playlist(text, url)
+    if select_audio:
+        choice = choose_rendition(master, min_bandwidth=min_bandwidth, language=language)
+        media_url = choice["uri"] if choice else None
+    else:
+        best = max(master["variants"], key=lambda v: v["bandwidth"], default=None)
+        media_url = best["uri"] if best else None
+    if media_url is None:
+        raise ValueError(f"Master playlist {url} lists no usable media playlist")
+    return media_url, fetch_text(media_url)
+
+
+def fetch_segment(
+    uri: str,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> Optional[Tuple[bytes, Dict[str, Optional[str]]]]:
+    """
+    GET a media segment, conditionally if validators are known.
+
+    Returns:
+        None if the server answered 304 Not Modified, else ``(body,
+        {"etag": ..., "last_modified": ...})``.
+    """
+    headers = {"User-Agent": USER_AGENT}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    resp = default_scheduler().request(uri, headers=headers, timeout=FETCH_TIMEOUT_SECONDS)
+    if resp["status"] == 304:
+        return None
+    validators = {
+        "etag": resp["headers"].get("ETag"),
+        "last_modified": resp["headers"].get("Last-Modified"),
+    }
+    return resp["body"], validators
+
+
+# ---------------------------------------------------------------------------
+# Merging
+# ---------------------------------------------------------------------------
+
+def split_by_segment(
+    whisper_segments: List[Dict[str, Any]],
+    starts: List[float],
+) -> List[List[Dict[str, Any]]]:
+    """
+    Assign Whisper segments from a run to the media segments they start in.
+
+    Args:
+        whisper_segments: Whisper output for a run of media segments.
+        starts: Start time of each media segment in the run, relative to
+            the run.
+
+    Returns:
+        One list per media segment, with ``start``/``end`` relative to
+        that media segment.
+    """
+    out: List[List[Dict[str, Any]]] = [[] for _ in starts]
+    for seg in whisper_segments:
+        i = max(0, bisect_right(starts, seg["start"]) - 1)
+        out[i].append({
+            "start": round(seg["start"] - starts[i], 3),
+            "end": round(seg["end"] - starts[i], 3),
+            "text": seg["text"],
+        })
+    return out
+
+
+def merged_segments(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Whisper-style segments for the whole playlist from the per-segment state."""
+    merged = []
+    for entry in entries:
+        for seg in entry["transcript"]:
+            merged.append({
+                "start": entry["start"] + seg["start"],
+                "end": entry["start"] + seg["end"],
+                "text": seg["text"],
+            })
+    return merged
+
+
+def _prompt_before(entries: List[Dict[str, Any]]) -> Optional[str]:
+    text = ""
+    for entry in reversed(entries):
+        text = "".join(seg["text"] for seg in entry["transcript"]) + text
+        if len(text) >= _PROMPT_CHARS:
+            break
+    return text[-_PROMPT_CHARS:].strip() or None
+
+
+# ---------------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------------
+
+def update_transcript(
+    url: str,
+    output_path: Optional[str] = None,
+    model_name: str = "base",
+    output_format: str = "pdf",
+    language: Optional[str] = None,
+    on_status: Optional[Callable[[str], None]] = None,
+    index_path: Optional[str] = DEFAULT_INDEX_PATH,
+    select_audio: bool = True,
+    min_bandwidth: int = DEFAULT_MIN_BANDWIDTH,
+    state_dir: str = DEFAULT_STATE_DIR,
+) -> str:
+    """
+    Bring the transcript of HLS playlist *url* up to date.
+
+    The first run transcribes everything; later runs transcribe only media
+    segments that are new or whose content changed and rewrite the merged
+    transcript.  Arguments match :func:`workflow.generate_transcript`; the
+    output path and detected language are remembered between runs.
+
+    Returns:
+        The path to the transcript file.
+
+    Raises:
+        ValueError: If the playlist is encrypted or lists no segments.
+    """
+
+    def _status(msg: str) -> None:
+        log.info(msg)
+        if on_status:
+            on_status(msg)
+
+    spath = state_path(url, state_dir)
+    state = load_state(spath) or {}
+    if state and (state.get("model") != model_name or state.get("format") != output_format):
+        _status("Model or format changed since the last run; transcribing everything again.")
+        state = {"output": state.get("output") if state.get("format") == output_format else None}
+    output = output_path or state.get("output") or resolve_output_path(None, fmt=output_format)
+    language = language or state.get("language")
+
+    _status("Fetching playlist...")
+    media_url, text = resolve_media_playlist(url, select_audio, min_bandwidth, language)
+    playlist = parse_segments(text, media_url)
+    if playlist["encrypted"]:
+        raise ValueError("Encrypted HLS playlists cannot be transcribed incrementally")
+    if not playlist["segments"]:
+        raise ValueError(f"No media segments in {media_url}")
+
+    init = b""
+    if playlist["init"]:
+        fetched_init = fetch_segment(playlist["init"])
+        init = fetched_init[0] if fetched_init else b""
+    init_hash = hashlib.sha256(init).hexdigest() if init else None
+
+    known: Dict[str, Dict[str, Any]] = {}
+    by_hash: Dict[str, Dict[str, Any]] = {}
+    if state.get("init_hash") == init_hash:
+        for entry in state.get("segments", []):
+            known[entry["uri"]] = entry
+            by_hash[entry["sha256"]] = entry
+
+    # Check every segment; collect runs of consecutive dirty ones on disk
+    entries: List[Dict[str, Any]] = []
+    runs: List[Dict[str, Any]] = []
+    suffix = os.path.splitext(urlparse(playlist["segments"][0]["uri"]).path)[1] or ".ts"
+    try:
+        for seg in playlist["segments"]:
+            prev = known.get(seg["uri"])
+            fetched = fetch_segment(
+                seg["uri"],
+                prev.get("etag") if prev else None,
+                prev.get("last_modified") if prev else None,
+            )
+            entry = {
+                "uri": seg["uri"],
+                "sequence": seg["sequence"],
+                "start": seg["start"],
+                "duration": seg["duration"],
+            }
+            if fetched is None and prev is not None:
+                entry.update(sha256=prev["sha256"], etag=prev.get("etag"),
+                             last_modified=prev.get("last_modified"), transcript=prev["transcript"])
+                entries.append(entry)
+                continue
+            if fetched is None:
+                raise ValueError(f"Server answered 304 for unconditional GET of {seg['uri']}")
+
+            body, validators = fetched
+            digest = hashlib.sha256(body).hexdigest()
+            entry.update(sha256=digest, **validators)
+            reused = by_hash.get(digest)
+            if reused is not None:
+                entry["transcript"] = reused["transcript"]
+                entries.append(entry)
+                continue
+
+            entry["transcript"] = None
+            if not runs or runs[-1]["end"] != len(entries):
+                path = make_scratch_file(f"run{suffix}")
+                with open(path, "wb") as fh:
+                    fh.write(init)
+                runs.append({"path": path, "begin": len(entries), "end": len(entries)})
+            with open(runs[-1]["path"], "ab") as fh:
+                fh.write(body)
+            runs[-1]["end"] = len(entries) + 1
+            entries.append(entry)
+
+        dirty = sum(run["end"] - run["begin"] for run in runs)
+        dirty_seconds = sum(e["duration"] for e in entries if e["transcript"] is None)
+        removed = len(set(known) - {e["uri"] for e in entries})
+        _status(
+            f"{dirty} of {len(entries)} segment(s) new or changed "
+            f"({dirty_seconds:.0f}s to transcribe), {removed} removed"
+        )
+
+        for n, run in enumerate(runs, 1):
+            members = entries[run["begin"]:run["end"]]
+            _status(f"Transcribing run {n}/{len(runs)} ({len(members)} segment(s)) with '{model_name}' model...")
+            prompt = _prompt_before(entries[:run["begin"]])
+            result = transcribe_audio(
+                run["path"],
+                model_name=model_name,
+                language=language,
+                transcribe_options={"initial_prompt": prompt} if prompt else None,
+            )
+            language = language or result.get("language")
+            base = members[0]["start"]
+            parts = split_by_segment(result["segments"], [m["start"] - base for m in members])
+            for member, part in zip(members, parts):
+                member["transcript"] = part
+    finally:
+        for run in runs:
+            remove_temp_audio(run["path"])
+
+    new_state = {
+        "version": STATE_VERSION,
+        "url": url,
+        "media_url": media_url,
+        "model": model_name,
+        "format": output_format,
+        "language": language,
+        "output": output,
+        "init_hash": init_hash,
+        "segments": entries,
+    }
+
+    if not runs and not removed and os.path.exists(output):
+        _status(f"Transcript already up to date: {output}")
+        save_state(spath, new_state)
+        return output
+
+    segments = merged_segments(entries)
+    metadata = {
+        "source_url": url,
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "model": model_name,
+        "language": language or "auto-detected",
+    }
+    _status(f"Writing {output_format.upper()} transcript...")
+    write_transcript(output_format, segments, output, metadata=metadata)
+    _status(f"Transcript saved to: {output}")
+    if index_path and output != STDOUT:
+        index_transcript(index_path, segments, output, metadata)
+
+    # Only remember the new segments once the output reflects them
+    save_state(spath, new_state)
+    return output
+
@@ -0,0 +1,401 @@
+"""
+Job queue with concurrent downloads and a small set of inference workers.
+
+Downloads are network-bound and run in a small thread pool; transcription
+is CPU/GPU-bound and runs on ``inference_workers`` threads (one by default,
+more when :mod:`resources` finds spare cores and memory) that take jobs in
+submission order.  With ``shortest_first`` every job is probed as soon as
+it is submitted, and both downloads and transcriptions go to the job with
+the smallest estimated compute time from its :mod:`probe` result.  Each
+worker keeps its own copy of the Whisper model loaded (see
+``transcriber.set_model_slot``), so a model is never used from two threads
+at once.
+
+Progress is reported as plain event dicts through a single callback, which
+must be thread-safe (e.g. ``queue.Queue.put``); no UI code runs here.
+"""
+
+import heapq
+import itertools
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from hls import DEFAULT_MIN_BANDWIDTH
+from logger import job_context
+from probe import check_limits, probe_stream, sort_key
+from resources import ResourcePlan, plan_resources
+from scratch import InsufficientSpaceError, default_scratch
+from transcriber import download_audio, make_temp_audio_path, set_model_slot
+from workflow import keep_temp_audio, remove_temp_audio, resolve_output_path, transcribe_to_output
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DOWNLOAD_WORKERS = 3
+# Probes are a few small requests each, so more of them run side by side
+PROBE_WORKERS = 8
+
+# Job states
+QUEUED = "queued"
+PROBING = "probing"
+DOWNLOADING = "downloading"
+DOWNLOADED = "waiting"
+TRANSCRIBING = "transcribing"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINAL_STATES = {DONE, FAILED, CANCELLED}
+
+# Rough per-row progress for each state
+STATE_PROGRESS = {
+    QUEUED: 0.0,
+    PROBING: 0.05,
+    DOWNLOADING: 0.1,
+    DOWNLOADED: 0.4,
+    TRANSCRIBING: 0.5,
+    DONE: 1.0,
+    FAILED: 1.0,
+    CANCELLED: 1.0,
+}
+
+# Options consumed by the download stage; everything else (apart from
+# keep_audio/output_path) goes to workflow.transcribe_to_output.
+_DOWNLOAD_OPTIONS = {"select_audio", "min_bandwidth"}
+
+
+def queue_plan(download_workers: int = DEFAULT_DOWNLOAD_WORKERS) -> ResourcePlan:
+    """
+    Resource plan for a :class:`JobQueue`.
+
+    Plans for the largest model that fits, since each job picks its own,
+    and for at most *download_workers* concurrent jobs -- the downloads
+    cannot keep more inference workers busy than that.
+    """
+    return plan_resources(jobs=download_workers)
+
+
+class Job:
+    """One URL moving through the queue."""
+
+    def __init__(self, job_id: int, url: str, options: Dict[str, Any]) -> None:
+        self.id = job_id
+        self.url = url
+        self.options = options
+        self.state = QUEUED
+        self.audio_path: Optional[str] = None
+        self.output: Optional[str] = None
+        self.error: Optional[str] = None
+        self.probe: Optional[Dict[str, Any]] = None
+        self.downloaded = threading.Event()
+
+
+class JobQueue:
+    """
+    Accepts URLs and processes them with pooled downloads and inference workers.
+
+    Args:
+        on_event: Thread-safe callable receiving event dicts with keys
+            ``job``, ``url``, ``state``, ``progress`` and ``message``.
+        download_workers: Maximum concurrent downloads.
+        inference_workers: Jobs transcribed side by side, each worker with
+            its own model copy (see :func:`resources.plan_resources`).
+        shortest_first: Probe each job when it is submitted, then download
+            and transcribe jobs in order of estimated compute time instead
+            of submission order.  A download starts once no probe is in
+            flight, so a batch submitted together is ordered as a whole.
+        max_duration: Reject jobs whose probed duration exceeds this many
+            seconds before downloading anything.
+        max_bytes: Reject jobs whose estimated download exceeds this size.
+    """
+
+    def __init__(
+        self,
+        on_event: Callable[[Dict[str, Any]], None],
+        download_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+        inference_workers: int = 1,
+        shortest_first: bool = False,
+        max_duration: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        self._on_event = on_event
+        self._pool = ThreadPoolExecutor(
+            max_workers=download_workers, thread_name_prefix="download",
+        )
+        self._shortest_first = shortest_first
+        self._limits = {"max_duration": max_duration, "max_bytes": max_bytes}
+        self._probe_jobs = shortest_first or max_duration is not None or max_bytes is not None
+        # FIFO: jobs in submission order.  Shortest-first: (estimate, id, job)
+        # tuples, pushed once a job is downloaded.
+        self._order: "queue.Queue[Any]" = queue.PriorityQueue() if shortest_first else queue.Queue()
+        self._jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Shortest-first: probed jobs waiting for a download slot, as a heap
+        # of (estimate, id, job), and the number of probes still running.
+        self._probe_pool: Optional[ThreadPoolExecutor] = None
+        if shortest_first:
+            self._probe_pool = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="probe")
+        self._probed: List[Tuple[float, int, Job]] = []
+        self._probing = 0
+        self._probes_done = threading.Condition(self._lock)
+        self._workers = [
+            threading.Thread(
+                target=self._inference_loop, args=(slot,), name=f"inference-{slot}", daemon=True,
+            )
+            for slot in range(max(1, inference_workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(self, url: str, **options: Any) -> int:
+        """
+        Queue *url* for processing.
+
+        Options are the keyword arguments of
+        :func:`workflow.generate_transcript` (minus ``url``/``on_status``).
+
+        Returns:
+            The job id.
+        """
+        job = Job(next(self._ids), url, options)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._emit(job, "Queued")
+        if self._probe_pool is not None:
+            with self._lock:
+                self._probing += 1
+            self._probe_pool.submit(self._probe_and_schedule, job)
+            return job.id
+        self._order.put(job)
+        self._pool.submit(self._download, job)
+        return job.id
+
+    def jobs(self) -> List[Job]:
+        """Snapshot of all submitted jobs in submission order."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel_pending(self) -> int:
+        """
+        Cancel every job that has not started transcribing.
+
+        Jobs mid-download are marked cancelled at once; their audio is
+        discarded when the download returns.
+
+        Returns:
+            Number of jobs cancelled.
+        """
+        with self._lock:
+            pending = [
+                j for j in self._jobs.values()
+                if j.state in (QUEUED, PROBING, DOWNLOADING, DOWNLOADED)
+            ]
+
+        cancelled = 0
+        for job in pending:
+            if self._set_state(job, CANCELLED, "Cancelled"):
+                cancelled += 1
+                self._discard_audio(job)
+                job.downloaded.set()
+        return cancelled
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work; with *wait*, block until queued jobs finish."""
+        if self._probe_pool is not None:
+            # Probes queue the downloads, and jobs only reach the priority
+            # queue once downloaded, so let both finish before the
+            # end-of-work markers go in.
+            self._probe_pool.shutdown(wait=wait)
+            self._pool.shutdown(wait=wait)
+            for _worker in self._workers:
+                self._order.put((float("inf"), float("inf"), None))
+        else:
+            for _worker in self._workers:
+                self._order.put(None)
+            self._pool.shutdown(wait=wait)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _emit(self, job: Job, message: str) -> None:
+        self._on_event({
+            "job": job.id,
+            "url": job.url,
+            "state": job.state,
+            "progress": STATE_PROGRESS[job.state],
+            "message": message,
+        })
+
+    def _set_state(self, job: Job, state: str, message: str) -> bool:
+        """Move *job* to *state* unless it already finished; emit on success."""
+        with self._lock:
+            if job.state in FINAL_STATES:
+                return False
+            job.state = state
+        self._emit(job, message)
+        return True
+
+    def _discard_audio(self, job: Job) -> None:
+        if not job.audio_path:
+            return
+        if job.options.get("keep_audio"):
+            keep_temp_audio(job.audio_path)
+        else:
+            remove_temp_audio(job.audio_path)
+
+    def _download(self, job: Job) -> None:
+        with job_context(job.id):
+            try:
+                if self._probe_jobs and not self._probe_or_fail(job):
+                    return
+                self._download_job(job)
+            finally:
+                # An inference worker may be waiting on this job
+                job.downloaded.set()
+
+    def _probe_or_fail(self, job: Job) -> bool:
+        """:meth:`_probe`, failing *job* instead of raising if the probe errors."""
+        try:
+            return self._probe(job)
+        except Exception as exc:
+            log.exception("Probe failed for %s", job.url)
+            job.error = str(exc)
+            self._set_state(job, FAILED, f"Probe failed: {exc}")
+            job.downloaded.set()
+            return False
+
+    def _probe_and_schedule(self, job: Job) -> None:
+        """Shortest-first: probe *job* right away and queue it for a download slot."""
+        with job_context(job.id):
+            probed = self._probe_or_fail(job)
+        with self._lock:
+            self._probing -= 1
+            if probed:
+                heapq.heappush(self._probed, (sort_key(job.probe), job.id, job))
+            self._probes_done.notify_all()
+        if not probed:
+            return
+        try:
+            self._pool.submit(self._download_next)
+        except RuntimeError:
+            # shutdown(wait=False) stopped the download pool meanwhile
+            with self._lock:
+                self._probed.remove((sort_key(job.probe), job.id, job))
+                heapq.heapify(self._probed)
+            self._set_state(job, CANCELLED, "Cancelled")
+            job.downloaded.set()
+
+    def _download_next(self) -> None:
+        """Shortest-first: download the shortest probed job once no probe is running."""
+        with self._lock:
+            self._probes_done.wait_for(lambda: self._probing == 0)
+            job = heapq.heappop(self._probed)[2]
+        with job_context(job.id):
+            try:
+                self._download_job(job)
+            finally:
+                job.downloaded.set()
+
+    def _probe(self, job: Job) -> bool:
+        """Probe *job*'s stream; fail it and return False if it must be rejected."""
+        if not self._set_state(job, PROBING, "Probing stream..."):
+            return False
+        job.probe = probe_stream(
+            job.url,
+            model_name=job.options.get("model_name", "base"),
+            select_audio=job.options.get("select_audio", True),
+            min_bandwidth=job.options.get("min_bandwidth", DEFAULT_MIN_BANDWIDTH),
+            language=job.options.get("language"),
+        )
+        problems = check_limits(job.probe, **self._limits)
+        if problems:
+            job.error = "; ".join(problems)
+            self._set_state(job, FAILED, f"Rejected: {job.error}")
+            job.downloaded.set()
+            return False
+        return True
+
+    def _download_job(self, job: Job) -> None:
+        # Hold new downloads while the scratch disk is nearly full
+        needed = (job.probe or {}).get("estimated_bytes") or 0
+        try:
+            default_scratch().wait_for_space(needed, on_wait=lambda msg: self._emit(job, msg))
+        except InsufficientSpaceError as exc:
+            job.error = str(exc)
+            self._set_state(job, FAILED, f"Download failed: {exc}")
+            job.downloaded.set()
+            return
+        if not self._set_state(job, DOWNLOADING, "Downloading audio..."):
+            return
+
+        download_opts = {k: v for k, v in job.options.items() if k in _DOWNLOAD_OPTIONS}
+        try:
+            job.audio_path = make_temp_audio_path()
+            download_audio(job.url, job.audio_path, **download_opts)
+        except Exception as exc:
+            log.exception("Download failed for %s", job.url)
+            job.error = str(exc)
+            if job.audio_path:
+                remove_temp_audio(job.audio_path)
+            self._set_state(job, FAILED, f"Download failed: {exc}")
+            job.downloaded.set()
+            return
+
+        if not self._set_state(job, DOWNLOADED, "Downloaded -- waiting for inference worker"):
+            # Cancelled while downloading
+            self._discard_audio(job)
+        elif self._shortest_first:
+            self._order.put((sort_key(job.probe), job.id, job))
+        job.downloaded.set()
+
+    def _inference_loop(self, slot: int) -> None:
+        set_model_slot(slot)
+        while True:
+            item = self._order.get()
+            job = item[2] if self._shortest_first else item
+            if job is None:
+                return
+            job.downloaded.wait()
+            with self._lock:
+                if job.state != DOWNLOADED:
+                    continue
+                job.state = TRANSCRIBING
+            self._emit(job, "Transcribing...")
+            with job_context(job.id):
+                self._transcribe(job)
+
+    def _transcribe(self, job: Job) -> None:
+        opts = {
+            k: v for k, v in job.options.items()
+            if k not in _DOWNLOAD_OPTIONS and k not in ("keep_audio", "output_path")
+        }
+        try:
+            output = resolve_output_path(
+                job.options.get("output_path"), fmt=opts.get("output_format", "pdf"),
+            )
+            transcribe_to_output(
+                job.audio_path,
+                job.url,
+                output,
+                on_status=lambda msg: self._emit(job, msg),
+                **opts,
+            )
+            job.output = output
+            self._set_state(job, DONE, f"Transcript saved to {output}")
+        except Exception as exc:
+            log.exception("Transcription failed for %s", job.url)
+            job.error = str(exc)
+            self._set_state(job, FAILED, f"Error: {exc}")
+        finally:
+            self._discard_audio(job)
@@ -1,15 +1,201 @@
-"""Centralized logging configuration for the M3U8 Transcript Generator."""
+"""
+Centralized logging configuration for the M3U8 Transcript Generator.
 
+Besides the plain console/file setup, :func:`setup_logging` supports:
+
+* ``async_mode`` -- callers only enqueue records (``QueueHandler``); a
+  single ``QueueListener`` thread does the formatting and I/O, so worker
+  threads never block on stdout or disk;
+* ``json_format`` -- one JSON object per line with ``job``, ``stage`` and
+  ``stage_elapsed`` fields taken from :func:`job_context` /
+  :func:`log_stage`;
+* ``max_bytes`` -- size-based rotation of ``log_file``;
+* ``job_log_dir`` -- an extra ``<job>.log`` file per job id.
+"""
+
+import atexit
+import contextlib
+import contextvars
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import re
 import sys
-from typing import Optional
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Iterator, List, Optional, TextIO, Tuple
 
 
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+DEFAULT_BACKUP_COUNT = 3
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_CONTEXT_FIELDS = ("job", "stage", "stage_elapsed")
+
+_job: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("log_job", default=None)
+_stage: contextvars.ContextVar[Optional[Tuple[str, float]]] = contextvars.ContextVar(
+    "log_stage", default=None,
+)
+
+# Handlers/listener installed by setup_logging, so shutdown_logging can undo them
+_installed: List[logging.Handler] = []
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+# ---------------------------------------------------------------------------
+# Job / stage context
+# ---------------------------------------------------------------------------
+
+@contextlib.contextmanager
+def job_context(job_id: Any) -> Iterator[None]:
+    """Tag every record logged by this thread inside the block with *job_id*."""
+    token = _job.set(str(job_id))
+    try:
+        yield
+    finally:
+        _job.reset(token)
+
+
+@contextlib.contextmanager
+def log_stage(name: str, logger: Optional[logging.Logger] = None) -> Iterator[None]:
+    """
+    Tag records with stage *name* and log its start and duration.
 
-def setup_logging(level: int = logging.INFO, log_file: Optional[str] = None) -> None:
+    The closing record carries a ``duration`` field (seconds); it is
+    logged at ERROR level if the block raised.
+    """
+    logger = logger or logging.getLogger(__name__)
+    start = time.perf_counter()
+    token = _stage.set((name, start))
+    logger.debug("Stage %s started", name)
+    try:
+        yield
+    except BaseException:
+        duration = time.perf_counter() - start
+        logger.error(
+            "Stage %s failed after %.3fs", name, duration,
+            extra={"duration": round(duration, 6)},
+        )
+        raise
+    else:
+        duration = time.perf_counter() - start
+        logger.info(
+            "Stage %s finished in %.3fs", name, duration,
+            extra={"duration": round(duration, 6)},
+        )
+    finally:
+        _stage.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copy the current job/stage onto each record.
+
+    Attached to the first handler a record reaches, so the context is
+    captured in the logging thread even when the I/O happens elsewhere.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "job"):
+            record.job = _job.get()
+        if not hasattr(record, "stage"):
+            stage = _stage.get()
+            record.stage = stage[0] if stage else None
+            record.stage_elapsed = round(time.perf_counter() - stage[1], 6) if stage else None
+        return True
+
+
+# ---------------------------------------------------------------------------
+# Formatting / handlers
+# ---------------------------------------------------------------------------
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including context and ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key in _CONTEXT_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in _CONTEXT_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class JobFileHandler(logging.Handler):
+    """
+    Route records that carry a job id to ``<directory>/<job>.log``.
+
+    At most *max_open* files are kept open; the least recently used one
+    is closed when another job starts logging.
+    """
+
+    def __init__(self, directory: str, max_open: int = 16) -> None:
+        super().__init__()
+        self.directory = directory
+        self.max_open = max_open
+        self._files: "OrderedDict[str, logging.FileHandler]" = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, job_id: str) -> str:
+        safe = re.sub(r"[^\w.-]", "_", job_id)
+        return os.path.join(self.directory, f"{safe}.log")
+
+    def emit(self, record: logging.LogRecord) -> None:
+        job_id = getattr(record, "job", None)
+        if job_id is None:
+            return
+        handler = self._files.get(job_id)
+        if handler is None:
+            if len(self._files) >= self.max_open:
+                _old, oldest = self._files.popitem(last=False)
+                oldest.close()
+            handler = logging.FileHandler(self.path_for(job_id), encoding="utf-8")
+            self._files[job_id] = handler
+        else:
+            self._files.move_to_end(job_id)
+        handler.setFormatter(self.formatter)
+        handler.emit(record)
+
+    def close(self) -> None:
+        self.acquire()
+        try:
+            for handler in self._files.values():
+                handler.close()
+            self._files.clear()
+        finally:
+            self.release()
+        super().close()
+
+
+def setup_logging(
+    level: int = logging.INFO,
+    log_file: Optional[str] = None,
+    json_format: bool = False,
+    async_mode: bool = False,
+    max_bytes: int = 0,
+    backup_count: int = DEFAULT_BACKUP_COUNT,
+    job_log_dir: Optional[str] = None,
+    stream: Optional[TextIO] = None,
+) -> None:
     """
     Configure the root logger for the application.
 
@@ -17,25 +203,77 @@ def setup_logging(level: int = logging.INFO, log_file: Optional[str] = None) ->
         level: Logging level (e.g. logging.DEBUG, logging.INFO).
         log_file: Optional path to a log file. If provided, logs are also
                   written to this file.
+        json_format: Write JSON lines instead of the plain text format.
+        async_mode: Hand records to a background ``QueueListener`` so
+                    logging calls never block on I/O.
+        max_bytes: Rotate *log_file* once it reaches this size (0 = never).
+        backup_count: Rotated files to keep when *max_bytes* is set.
+        job_log_dir: Also write each job's records to ``<job>.log`` here.
+        stream: Console stream (default stdout; stderr when stdout carries
+                transcript output).
     """
+    global _listener
+
     root = logging.getLogger()
     root.setLevel(level)
 
     # Avoid adding duplicate handlers on repeated calls
-    if root.handlers:
+    if _installed:
         return
 
-    formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+    formatter: logging.Formatter
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
 
     # Console handler
-    console = logging.StreamHandler(sys.stdout)
-    console.setLevel(level)
-    console.setFormatter(formatter)
-    root.addHandler(console)
+    handlers: List[logging.Handler] = [logging.StreamHandler(stream or sys.stdout)]
 
     # Optional file handler
     if log_file:
-        file_handler = logging.FileHandler(log_file, encoding="utf-8")
-        file_handler.setLevel(level)
-        file_handler.setFormatter(formatter)
-        root.addHandler(file_handler)
+        if max_bytes > 0:
+            handlers.append(logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8",
+            ))
+        else:
+            handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+
+    if job_log_dir:
+        handlers.append(JobFileHandler(job_log_dir))
+
+    for handler in handlers:
+        handler.setLevel(level)
+        handler.setFormatter(formatter)
+
+    context = ContextFilter()
+    if async_mode:
+        records: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+        front = logging.handlers.QueueHandler(records)
+        front.addFilter(context)
+        _listener = logging.handlers.QueueListener(
+            records, *handlers, respect_handler_level=True,
+        )
+        _listener.start()
+        atexit.register(shutdown_logging)
+        root.addHandler(front)
+        _installed[:] = [front, *handlers]
+    else:
+        for handler in handlers:
+            handler.addFilter(context)
+            root.addHandler(handler)
+        _installed[:] = handlers
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and remove the handlers installed by :func:`setup_logging`."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    root = logging.getLogger()
+    for handler in _installed:
+        root.removeHandler(handler)
+        handler.close()
+    _installed.clear()
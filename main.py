@@ -3,23 +3,510 @@
 import argparse
 import logging
 import sys
+from typing import List, Optional, TextIO
 
-from logger import setup_logging
+from download_scheduler import (
+    DEFAULT_MAX_PER_HOST,
+    DEFAULT_MAX_TRANSFERS,
+    configure as configure_downloads,
+    default_scheduler,
+)
+from job_queue import queue_plan
+from logger import DEFAULT_BACKUP_COUNT, setup_logging
+from probe import check_limits, format_duration, parse_duration, probe_stream, sort_key
+from resources import apply_plan, plan_resources
+from scratch import (
+    DEFAULT_MIN_FREE_BYTES,
+    DEFAULT_SPACE_TIMEOUT_SECONDS,
+    configure as configure_scratch,
+    default_root,
+)
+from hls import DEFAULT_MIN_BANDWIDTH
+from search_index import DEFAULT_INDEX_PATH, TranscriptIndex
+from tiering import (
+    DEFAULT_MAX_COMPRESSION_RATIO,
+    DEFAULT_MAX_NO_SPEECH_PROB,
+    DEFAULT_MIN_AVG_LOGPROB,
+)
 from transcriber import VALID_MODELS
-from workflow import generate_transcript
-from writers import SUPPORTED_FORMATS
+from workflow import TRANSCRIPTS_DIR, generate_transcript
+from writers import STDOUT, SUPPORTED_FORMATS
 
 log = logging.getLogger(__name__)
 
 
-def main() -> None:
+# ---------------------------------------------------------------------------
+# Logging options (shared by every command)
+# ---------------------------------------------------------------------------
+
+def _logging_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(add_help=False)
+    group = parser.add_argument_group("logging")
+    group.add_argument(
+        "--verbose", "-v",
+        action="store_true",
+        help="Enable verbose (DEBUG) logging.",
+    )
+    group.add_argument("--log-file", default=None, help="Also write logs to this file.")
+    group.add_argument(
+        "--log-json", action="store_true",
+        help="Write JSON lines with job id, stage and timing fields.",
+    )
+    group.add_argument(
+        "--log-async", action="store_true",
+        help="Log through a background thread so workers never block on log I/O.",
+    )
+    group.add_argument(
+        "--log-max-bytes", type=int, default=0,
+        help="Rotate --log-file at this size (default: never).",
+    )
+    group.add_argument(
+        "--log-backups", type=int, default=DEFAULT_BACKUP_COUNT,
+        help=f"Rotated log files to keep (default: {DEFAULT_BACKUP_COUNT}).",
+    )
+    group.add_argument(
+        "--job-log-dir", default=None,
+        help="Also write each job's log records to <dir>/<job>.log.",
+    )
+    return parser
+
+
+def _configure_logging(args: argparse.Namespace, stream: Optional[TextIO] = None) -> None:
+    setup_logging(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        log_file=args.log_file,
+        json_format=args.log_json,
+        async_mode=args.log_async,
+        max_bytes=args.log_max_bytes,
+        backup_count=args.log_backups,
+        job_log_dir=args.job_log_dir,
+        stream=stream,
+    )
+
+
+def _scratch_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(add_help=False)
+    group = parser.add_argument_group("scratch space")
+    group.add_argument(
+        "--scratch-dir", default=None,
+        help=f"Directory for downloaded/decoded audio, e.g. a tmpfs (default: {default_root()}).",
+    )
+    group.add_argument(
+        "--min-free-space", type=float, default=DEFAULT_MIN_FREE_BYTES / 1_000_000, metavar="MB",
+        help="Hold new downloads while less than this is free in the scratch directory "
+             f"(default: {DEFAULT_MIN_FREE_BYTES // 1_000_000}; 0 disables).",
+    )
+    group.add_argument(
+        "--space-timeout", type=float, default=DEFAULT_SPACE_TIMEOUT_SECONDS, metavar="SECONDS",
+        help="Fail a download that has waited this long for --min-free-space "
+             f"(default: {DEFAULT_SPACE_TIMEOUT_SECONDS:g}).",
+    )
+    return parser
+
+
+def _configure_scratch(args: argparse.Namespace) -> None:
+    scratch = configure_scratch(
+        args.scratch_dir,
+        min_free_bytes=int(args.min_free_space * 1_000_000),
+        space_timeout=args.space_timeout,
+    )
+    scratch.install_signal_handlers()
+
+
+def _download_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(add_help=False)
+    group = parser.add_argument_group("downloads")
+    group.add_argument(
+        "--max-per-host", type=int, default=DEFAULT_MAX_PER_HOST, metavar="N",
+        help=f"Requests/downloads in flight per host (default: {DEFAULT_MAX_PER_HOST}).",
+    )
+    group.add_argument(
+        "--host-rate", type=float, default=None, metavar="PER_SECOND",
+        help="Requests started per second per host (default: no limit).",
+    )
+    group.add_argument(
+        "--max-bandwidth", type=float, default=None, metavar="MB_PER_SECOND",
+        help="Total download rate in MB/s, shared by all downloads (default: no limit).",
+    )
+    group.add_argument(
+        "--max-transfers", type=int, default=DEFAULT_MAX_TRANSFERS, metavar="N",
+        help="With --max-bandwidth, yt-dlp downloads running at once "
+             f"(default: {DEFAULT_MAX_TRANSFERS}).",
+    )
+    return parser
+
+
+def _configure_downloads(args: argparse.Namespace) -> None:
+    configure_downloads(
+        max_per_host=args.max_per_host,
+        requests_per_second=args.host_rate,
+        max_bandwidth=None if args.max_bandwidth is None else args.max_bandwidth * 1_000_000,
+        max_transfers=args.max_transfers,
+    )
+
+
+def _log_download_report() -> None:
+    for line in default_scheduler().describe():
+        log.info("Downloads from %s", line)
+
+
+def _add_preflight_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--max-duration", type=parse_duration, default=None,
+        help="Reject streams longer than this (seconds, or e.g. 45m, 4h) before downloading.",
+    )
+    parser.add_argument(
+        "--max-size", type=float, default=None, metavar="MB",
+        help="Reject streams whose estimated download exceeds this many MB.",
+    )
+
+
+def _add_diarization_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--diarize", action="store_true",
+        help="Label segments with speakers (Speaker 1, Speaker 2, ...).",
+    )
+    parser.add_argument(
+        "--speakers", type=int, default=None, metavar="N",
+        help="Exact number of speakers for --diarize (default: estimated).",
+    )
+
+
+def _max_bytes(args: argparse.Namespace) -> Optional[int]:
+    return None if args.max_size is None else int(args.max_size * 1_000_000)
+
+
+# ---------------------------------------------------------------------------
+# Subcommands
+# ---------------------------------------------------------------------------
+
+def _cmd_index(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="main.py index",
+        description="Build or update the transcript search index.",
+    )
+    parser.add_argument(
+        "directory", nargs="?", default=TRANSCRIPTS_DIR,
+        help=f"Directory of TXT/SRT transcripts to scan (default: {TRANSCRIPTS_DIR}).",
+    )
+    parser.add_argument(
+        "--index", default=DEFAULT_INDEX_PATH, dest="index_path",
+        help=f"Index database path (default: {DEFAULT_INDEX_PATH}).",
+    )
+    parser.add_argument(
+        "--prune", action="store_true",
+        help="Remove entries whose transcript file no longer exists.",
+    )
+    args = parser.parse_args(argv)
+
+    with TranscriptIndex(args.index_path) as index:
+        index.index_directory(args.directory)
+        if args.prune:
+            log.info("Pruned %d stale job(s)", index.prune())
+        stats = index.stats()
+    log.info("Index now holds %d job(s), %d segment(s)", stats["jobs"], stats["segments"])
+    return 0
+
+
+def _cmd_search(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="main.py search",
+        description="Search indexed transcripts. Timestamps are in milliseconds.",
+    )
+    parser.add_argument("query", nargs="+", help="Search terms (all must match).")
+    parser.add_argument(
+        "--index", default=DEFAULT_INDEX_PATH, dest="index_path",
+        help=f"Index database path (default: {DEFAULT_INDEX_PATH}).",
+    )
+    parser.add_argument("--limit", "-n", type=int, default=20, help="Maximum hits (default: 20).")
+    parser.add_argument("--raw", action="store_true", help="Pass the query through as FTS5 syntax.")
+    args = parser.parse_args(argv)
+
+    with TranscriptIndex(args.index_path) as index:
+        try:
+            hits = index.search(" ".join(args.query), limit=args.limit, raw=args.raw)
+        except ValueError as exc:
+            parser.error(str(exc))
+
+    for hit in hits:
+        source = hit["source_url"] or hit["output_path"]
+        print(f"{hit['start_ms']}-{hit['end_ms']} ms  {source}  [{hit['model'] or '?'}]")
+        print(f"    {hit['text']}")
+    if not hits:
+        log.info("No matches.")
+    return 0
+
+
+def _cmd_coordinator(argv: List[str]) -> int:
+    from distributed import (
+        DEFAULT_CHUNK_SECONDS, DEFAULT_DETECT_MODEL, DEFAULT_HOST, DEFAULT_LEASE_SECONDS,
+        DEFAULT_OVERLAP_SECONDS, DEFAULT_PORT, run_coordinator,
+    )
+
+    parser = argparse.ArgumentParser(
+        prog="main.py coordinator",
+        description="Download a stream and farm its chunks out to 'worker' processes.",
+    )
+    parser.add_argument("url", help="The m3u8 URL to transcribe.")
+    parser.add_argument("--output", "-o", default=None, help="Output filename.")
+    parser.add_argument(
+        "--format", "-f", default="pdf", choices=sorted(SUPPORTED_FORMATS), dest="fmt",
+        help="Output format (default: pdf).",
+    )
+    parser.add_argument("--language", "-l", default=None, help="ISO-639-1 language code.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Bind address (default: {DEFAULT_HOST}).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT}).")
+    parser.add_argument(
+        "--chunk-seconds", type=float, default=DEFAULT_CHUNK_SECONDS,
+        help=f"Audio per chunk (default: {DEFAULT_CHUNK_SECONDS:g}).",
+    )
+    parser.add_argument(
+        "--overlap-seconds", type=float, default=DEFAULT_OVERLAP_SECONDS,
+        help="Audio from each neighbouring chunk sent along with a chunk "
+             f"(default: {DEFAULT_OVERLAP_SECONDS:g}).",
+    )
+    parser.add_argument(
+        "--detect-model", default=DEFAULT_DETECT_MODEL, choices=sorted(VALID_MODELS),
+        help="Model detecting the language when --language is not given "
+             f"(default: {DEFAULT_DETECT_MODEL}).",
+    )
+    parser.add_argument(
+        "--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+        help="Reassign a chunk if its worker is silent this long "
+             f"(default: {DEFAULT_LEASE_SECONDS:g}).",
+    )
+    parser.add_argument("--keep-audio", action="store_true", help="Keep the downloaded audio file.")
+    args = parser.parse_args(argv)
+
+    output = run_coordinator(
+        args.url,
+        output_path=args.output,
+        output_format=args.fmt,
+        language=args.language,
+        host=args.host,
+        port=args.port,
+        chunk_seconds=args.chunk_seconds,
+        lease_seconds=args.lease_seconds,
+        overlap_seconds=args.overlap_seconds,
+        detect_model=args.detect_model,
+        keep_audio=args.keep_audio,
+    )
+    log.info("Done! Transcript saved to: %s", output)
+    return 0
+
+
+def _cmd_worker(argv: List[str]) -> int:
+    from distributed import run_worker
+
     parser = argparse.ArgumentParser(
+        prog="main.py worker",
+        description="Transcribe chunks served by a 'coordinator'.",
+    )
+    parser.add_argument("coordinator", help="Coordinator URL, e.g. http://host:8765")
+    parser.add_argument(
+        "--model", "-m", default="base", choices=sorted(VALID_MODELS),
+        help="Whisper model to keep loaded (default: base).",
+    )
+    parser.add_argument("--id", dest="worker_id", default=None, help="Worker name (default: host:pid).")
+    args = parser.parse_args(argv)
+
+    apply_plan(plan_resources(args.model))
+    run_worker(args.coordinator, model_name=args.model, worker_id=args.worker_id)
+    return 0
+
+
+def _cmd_probe(argv: List[str]) -> int:
+    import json
+
+    parser = argparse.ArgumentParser(
+        prog="main.py probe",
+        description="Inspect streams without downloading them: duration, rendition, "
+                    "estimated size and compute time.",
+    )
+    parser.add_argument("urls", nargs="+", help="m3u8 URLs to probe.")
+    _add_preflight_arguments(parser)
+    parser.add_argument(
+        "--model", "-m", default="base", choices=sorted(VALID_MODELS),
+        help="Model to estimate compute time for (default: base).",
+    )
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per URL.")
+    parser.add_argument("--sort", action="store_true", help="List shortest jobs first.")
+    args = parser.parse_args(argv)
+
+    plan = plan_resources(args.model)
+    results = [probe_stream(url, model_name=args.model, plan=plan) for url in args.urls]
+    if args.sort:
+        results.sort(key=sort_key)
+
+    rejected = 0
+    for info in results:
+        problems = check_limits(info, args.max_duration, _max_bytes(args))
+        rejected += bool(problems)
+        if args.json:
+            print(json.dumps(dict(info, rejected=problems), default=str))
+            continue
+        size = "?" if info["estimated_bytes"] is None else f"{info['estimated_bytes'] / 1_000_000:.1f} MB"
+        print(info["url"])
+        print(f"    {format_duration(info['duration'])}, {info['segment_count'] or '?'} segments, "
+              f"{info['kind']}, ~{size}, ~{format_duration(info['estimated_compute_seconds'])} "
+              f"with '{args.model}'")
+        for note in info["notes"]:
+            print(f"    note: {note}")
+        for problem in problems:
+            print(f"    REJECT: {problem}")
+    return 1 if rejected else 0
+
+
+def _cmd_eval(argv: List[str]) -> int:
+    import json
+
+    from evaluation import evaluate, find_fixtures, format_table, parse_config, summarize
+
+    parser = argparse.ArgumentParser(
+        prog="main.py eval",
+        description="Measure WER/CER and real-time factor over audio fixtures with "
+                    "reference transcripts (<name>.wav + <name>.txt), per configuration.",
+    )
+    parser.add_argument("fixtures", help="Directory of audio files and reference .txt files.")
+    parser.add_argument(
+        "--config", "-c", action="append", dest="configs", metavar="SPEC",
+        help="Configuration to compare, e.g. 'tiny', 'beam:model=small,beam_size=5' or "
+             "'tiered:model=tiny,refine_model=medium' (repeatable; default: base).",
+    )
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write per-file results here.")
+    parser.add_argument(
+        "--max-wer", type=float, default=None, metavar="PCT",
+        help="Exit with status 1 if any configuration's WER exceeds this percentage.",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        configs = [parse_config(spec) for spec in args.configs or ["base"]]
+    except ValueError as exc:
+        parser.error(str(exc))
+    fixtures = find_fixtures(args.fixtures)
+    if not fixtures:
+        log.error("No fixtures with reference transcripts in %s", args.fixtures)
+        return 1
+
+    results = evaluate(
+        fixtures, configs,
+        on_result=lambda r: log.info(
+            "%s %s: WER %.1f%%, RTF %.3f", r["config"], r["fixture"], r["wer"] * 100, r["rtf"],
+        ),
+    )
+    summary = summarize(results)
+    print(format_table(summary))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump({"results": results, "summary": summary}, fh, indent=2)
+
+    if args.max_wer is not None:
+        over = [t["config"] for t in summary if t["wer"] * 100 > args.max_wer]
+        if over:
+            log.error("WER above %.1f%%: %s", args.max_wer, ", ".join(over))
+            return 1
+    return 0
+
+
+def _cmd_batch(argv: List[str]) -> int:
+    from job_queue import DONE, JobQueue
+
+    parser = argparse.ArgumentParser(
+        prog="main.py batch",
+        description="Transcribe many URLs with pooled downloads and planned inference workers.",
+    )
+    parser.add_argument(
+        "sources", nargs="+",
+        help="URLs, or files listing one URL per line ('-' for stdin).",
+    )
+    parser.add_argument(
+        "--format", "-f", default="pdf", choices=sorted(SUPPORTED_FORMATS), dest="fmt",
+        help="Output format (default: pdf).",
+    )
+    parser.add_argument(
+        "--model", "-m", default="base", choices=sorted(VALID_MODELS),
+        help="Whisper model (default: base).",
+    )
+    parser.add_argument("--language", "-l", default=None, help="ISO-639-1 language code.")
+    parser.add_argument(
+        "--shortest-first", action="store_true",
+        help="Probe every URL first, then download and transcribe the shortest jobs first.",
+    )
+    _add_preflight_arguments(parser)
+    _add_diarization_arguments(parser)
+    args = parser.parse_args(argv)
+
+    urls: List[str] = []
+    for source in args.sources:
+        if source.startswith(("http://", "https://")):
+            urls.append(source)
+            continue
+        fh = sys.stdin if source == "-" else open(source, encoding="utf-8")
+        with fh:
+            urls.extend(line.strip() for line in fh if line.strip() and not line.startswith("#"))
+
+    plan = queue_plan()
+    apply_plan(plan)
+    jobs = JobQueue(
+        on_event=lambda e: log.info("[job %d] %s: %s", e["job"], e["state"], e["message"]),
+        inference_workers=plan.inference_workers,
+        shortest_first=args.shortest_first,
+        max_duration=args.max_duration,
+        max_bytes=_max_bytes(args),
+    )
+    for url in urls:
+        jobs.submit(
+            url, model_name=args.model, output_format=args.fmt, language=args.language,
+            diarize=args.diarize, num_speakers=args.speakers,
+        )
+    jobs.shutdown(wait=True)
+
+    failed = [job for job in jobs.jobs() if job.state != DONE]
+    for job in failed:
+        log.error("%s: %s (%s)", job.url, job.state, job.error or "no detail")
+    log.info("%d/%d job(s) done", len(urls) - len(failed), len(urls))
+    return 1 if failed else 0
+
+
+_COMMANDS = {
+    "index": _cmd_index,
+    "search": _cmd_search,
+    "probe": _cmd_probe,
+    "batch": _cmd_batch,
+    "eval": _cmd_eval,
+    "coordinator": _cmd_coordinator,
+    "worker": _cmd_worker,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+
+    if argv and argv[0] in _COMMANDS:
+        # No abbreviations: a subcommand's --host must not be taken for --host-rate
+        common = argparse.ArgumentParser(
+            add_help=False, allow_abbrev=False,
+            parents=[_logging_parser(), _scratch_parser(), _download_parser()],
+        )
+        common_args, rest = common.parse_known_args(argv[1:])
+        _configure_logging(common_args)
+        _configure_scratch(common_args)
+        _configure_downloads(common_args)
+        status = _COMMANDS[argv[0]](rest)
+        _log_download_report()
+        sys.exit(status)
+
+    parser = argparse.ArgumentParser(
+        parents=[_logging_parser(), _scratch_parser(), _download_parser()],
         description="Convert m3u8 audio stream to a transcript (PDF, SRT, or TXT).",
+        epilog="Other commands: " + ", ".join(_COMMANDS) + " (run 'main.py <command> -h').",
     )
     parser.add_argument("url", nargs="?", help="The m3u8 URL to transcribe.")
     parser.add_argument(
         "--output", "-o",
-        help="Output filename. If not specified, saves to 'transcripts/' with a timestamp.",
+        help="Output filename, or '-' for stdout. If not specified, saves to "
+             "'transcripts/' with a timestamp.",
         default=None,
     )
     parser.add_argument(
@@ -46,32 +533,135 @@ def main() -> None:
         help="Keep the downloaded audio file.",
     )
     parser.add_argument(
-        "--gui",
+        "--no-rendition-select",
+        action="store_false",
+        dest="select_audio",
+        help="Let yt-dlp pick the HLS variant instead of choosing the cheapest audio rendition.",
+    )
+    parser.add_argument(
+        "--min-bandwidth",
+        type=int,
+        default=DEFAULT_MIN_BANDWIDTH,
+        help="Skip HLS variants and audio groups declaring less than this many bits/s; "
+             f"a group is judged by its cheapest variant (default: {DEFAULT_MIN_BANDWIDTH}).",
+    )
+    parser.add_argument(
+        "--incremental",
         action="store_true",
-        help="Launch the GUI interface.",
+        help="For growing HLS playlists: remember which segments were already "
+             "transcribed and only transcribe new or changed ones on re-runs.",
     )
+    _add_preflight_arguments(parser)
     parser.add_argument(
-        "--verbose", "-v",
+        "--bounded-memory",
         action="store_true",
-        help="Enable verbose (DEBUG) logging.",
+        help="Transcribe window by window from a memory-mapped PCM file "
+             "so memory use stays flat for very long inputs.",
+    )
+    parser.add_argument(
+        "--refine-model",
+        choices=sorted(VALID_MODELS),
+        default=None,
+        help="Tiered mode: write a draft with --model first, then re-transcribe "
+             "only low-confidence segments with this larger model.",
+    )
+    parser.add_argument(
+        "--refine-min-logprob", type=float, default=DEFAULT_MIN_AVG_LOGPROB,
+        help=f"Refine segments with avg_logprob below this (default: {DEFAULT_MIN_AVG_LOGPROB}).",
+    )
+    parser.add_argument(
+        "--refine-max-compression", type=float, default=DEFAULT_MAX_COMPRESSION_RATIO,
+        help="Refine segments with compression_ratio above this "
+             f"(default: {DEFAULT_MAX_COMPRESSION_RATIO}).",
+    )
+    parser.add_argument(
+        "--refine-max-no-speech", type=float, default=DEFAULT_MAX_NO_SPEECH_PROB,
+        help="Refine segments with no_speech_prob above this "
+             f"(default: {DEFAULT_MAX_NO_SPEECH_PROB}).",
+    )
+    _add_diarization_arguments(parser)
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile each stage and write .prof / .collapsed / .profile.txt "
+             "files next to the transcript.",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Print the detected hardware and the chosen thread/worker "
+             "configuration, then exit.",
+    )
+    parser.add_argument(
+        "--gui",
+        action="store_true",
+        help="Launch the GUI interface.",
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.incremental:
+        # update_transcript has its own segment pipeline without these stages
+        unsupported = [
+            flag for flag, value in (
+                ("--keep-audio", args.keep_audio),
+                ("--bounded-memory", args.bounded_memory),
+                ("--refine-model", args.refine_model),
+                ("--diarize", args.diarize),
+                ("--speakers", args.speakers),
+                ("--profile", args.profile),
+            ) if value
+        ]
+        if unsupported:
+            parser.error(f"--incremental cannot be combined with {', '.join(unsupported)}")
 
-    # Configure logging
-    level = logging.DEBUG if args.verbose else logging.INFO
-    setup_logging(level=level)
+    # Configure logging; with "-o -" stdout carries the transcript itself
+    _configure_logging(args, stream=sys.stderr if args.output == STDOUT else None)
+    _configure_scratch(args)
+    _configure_downloads(args)
+
+    gui_mode = args.gui or not args.url
+    if args.plan:
+        # The GUI queue plans for its own worker count and model choice
+        plan = queue_plan() if gui_mode else plan_resources(args.refine_model or args.model)
+        print("\n".join(plan.describe()))
+        return
 
     # Launch GUI if no URL provided OR --gui flag is set
-    if args.gui or not args.url:
+    if gui_mode:
         log.info("Launching GUI...")
         from gui import TranscriptApp
         app = TranscriptApp()
         app.mainloop()
         return
 
-    # CLI Mode
+    # CLI Mode: one job gets every usable core
+    plan = plan_resources(args.refine_model or args.model)
+    if args.max_duration is not None or args.max_size is not None:
+        info = probe_stream(
+            args.url, model_name=args.refine_model or args.model, select_audio=args.select_audio,
+            min_bandwidth=args.min_bandwidth, language=args.language, plan=plan,
+        )
+        problems = check_limits(info, args.max_duration, _max_bytes(args))
+        if problems:
+            log.error("Rejected before download: %s", "; ".join(problems))
+            sys.exit(2)
+    apply_plan(plan)
     try:
+        if args.incremental:
+            from incremental import update_transcript
+
+            output = update_transcript(
+                url=args.url,
+                output_path=args.output,
+                model_name=args.model,
+                output_format=args.fmt,
+                language=args.language,
+                select_audio=args.select_audio,
+                min_bandwidth=args.min_bandwidth,
+            )
+            log.info("Done! Transcript saved to: %s", output)
+            return
+
         output = generate_transcript(
             url=args.url,
             model_name=args.model,
@@ -79,12 +669,26 @@ def main() -> None:
             keep_audio=args.keep_audio,
             output_format=args.fmt,
             language=args.language,
+            bounded_memory=args.bounded_memory,
+            select_audio=args.select_audio,
+            min_bandwidth=args.min_bandwidth,
+            profile=args.profile,
+            diarize=args.diarize,
+            num_speakers=args.speakers,
+            refine_model=args.refine_model,
+            refine_options={
+                "min_avg_logprob": args.refine_min_logprob,
+                "max_compression_ratio": args.refine_max_compression,
+                "max_no_speech_prob": args.refine_max_no_speech,
+            },
         )
         log.info("Done! Transcript saved to: %s", output)
 
     except Exception:
         log.exception("Transcript generation failed")
         sys.exit(1)
+    finally:
+        _log_download_report()
 
 
 if __name__ == "__main__":
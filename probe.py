@@ -0,0 +1,229 @@
+"""
+Pre-flight probing of streams before anything is downloaded.
+
+:func:`probe_stream` fetches only the playlists of an HLS URL (a master
+playlist and one media playlist, plus at most one ``HEAD`` request) and
+reports the total duration, the rendition that would be downloaded, an
+estimated download size and an estimated compute time for a model.  It
+also flags inputs that would only fail later: unreachable URLs, streams
+without an audio track and DRM-protected media.
+
+The result feeds three places: the ``probe`` subcommand, the ``--max-*``
+limits of the CLI, and shortest-job-first scheduling in :class:`job_queue.JobQueue`.
+"""
+
+import logging
+import re
+import urllib.error
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from hls import (
+    DEFAULT_MIN_BANDWIDTH,
+    choose_rendition,
+    estimate_bytes,
+    fetch_text,
+    is_master_playlist,
+    parse_attributes,
+    parse_master_playlist,
+    parse_segments,
+)
+from resources import ResourcePlan, plan_resources
+
+log = logging.getLogger(__name__)
+
+# Seconds of compute per second of audio on a CPU with
+# REFERENCE_THREADS torch threads, and on a GPU.  Rough figures for
+# sizing and ordering jobs, not promises.
+REFERENCE_THREADS = 8
+CPU_REALTIME_FACTOR = {"tiny": 0.04, "base": 0.08, "small": 0.25, "medium": 0.7, "large": 1.4}
+GPU_REALTIME_FACTOR = {"tiny": 0.01, "base": 0.015, "small": 0.03, "medium": 0.06, "large": 0.1}
+# Whisper stops scaling with threads beyond roughly this many
+_MAX_USEFUL_THREADS = 16
+
+_AUDIO_CODECS = ("mp4a", "ac-3", "ec-3", "opus", "mp3", "flac", "alac")
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([hms]?)\s*$")
+
+
+def estimate_compute_seconds(
+    duration: Optional[float],
+    model_name: str,
+    plan: Optional[ResourcePlan] = None,
+) -> Optional[float]:
+    """Estimated transcription time for *duration* seconds of audio."""
+    if duration is None:
+        return None
+    plan = plan or plan_resources(model_name)
+    if plan.gpu:
+        return duration * GPU_REALTIME_FACTOR[model_name]
+    threads = min(plan.torch_threads, _MAX_USEFUL_THREADS)
+    return duration * CPU_REALTIME_FACTOR[model_name] * REFERENCE_THREADS / threads
+
+
+def _has_audio(master: Dict[str, List[Dict[str, Any]]]) -> bool:
+    if master["audio"]:
+        return True
+    for variant in master["variants"]:
+        codecs = variant["codecs"].lower()
+        # Undeclared codecs: assume the variant is muxed with audio
+        if not codecs or any(c.strip().startswith(_AUDIO_CODECS) for c in codecs.split(",")):
+            return True
+    return not master["variants"]
+
+
+def _master_drm(text: str) -> bool:
+    for line in text.splitlines():
+        if line.startswith("#EXT-X-SESSION-KEY:"):
+            attrs = parse_attributes(line.split(":", 1)[1])
+            if attrs.get("METHOD", "NONE").startswith("SAMPLE-AES") or \
+                    attrs.get("KEYFORMAT", "identity") != "identity":
+                return True
+    return False
+
+
+def probe_stream(
+    url: str,
+    model_name: str = "base",
+    select_audio: bool = True,
+    min_bandwidth: int = DEFAULT_MIN_BANDWIDTH,
+    language: Optional[str] = None,
+    plan: Optional[ResourcePlan] = None,
+) -> Dict[str, Any]:
+    """
+    Inspect *url* without downloading media.
+
+    Returns:
+        Dict with ``url``, ``media_url``, ``kind`` (rendition kind, or
+        ``"media playlist"`` / ``"unknown"``), ``bandwidth``, ``duration``,
+        ``segment_count``, ``live``, ``estimated_bytes``,
+        ``estimated_compute_seconds``, ``model``, ``problems`` (reasons the
+        job cannot succeed) and ``notes``.  Fields that could not be
+        determined are None.
+    """
+    info: Dict[str, Any] = {
+        "url": url,
+        "media_url": None,
+        "kind": "unknown",
+        "bandwidth": None,
+        "duration": None,
+        "segment_count": None,
+        "live": False,
+        "estimated_bytes": None,
+        "estimated_compute_seconds": None,
+        "model": model_name,
+        "problems": [],
+        "notes": [],
+    }
+
+    if not urlparse(url).path.lower().endswith(".m3u8"):
+        info["notes"].append("not an HLS playlist URL; size and duration unknown until download")
+        return info
+
+    try:
+        text = fetch_text(url)
+        choice: Dict[str, Any] = {"uri": url, "kind": "media playlist", "bandwidth": None}
+        if is_master_playlist(text):
+            master = parse_master_playlist(text, url)
+            if not _has_audio(master):
+                info["problems"].append("no audio track")
+                return info
+            if _master_drm(text):
+                info["problems"].append("DRM-protected (session key)")
+                return info
+            if select_audio:
+                picked = choose_rendition(master, min_bandwidth=min_bandwidth, language=language)
+            else:
+                best = max(master["variants"], key=lambda v: v["bandwidth"], default=None)
+                picked = best and {"uri": best["uri"], "kind": "highest-bandwidth variant",
+                                   "bandwidth": best["bandwidth"]}
+            if not picked:
+                info["problems"].append("master playlist lists no usable rendition")
+                return info
+            choice = picked
+            text = fetch_text(choice["uri"])
+        playlist = parse_segments(text, choice["uri"])
+    except (urllib.error.URLError, OSError) as exc:
+        info["problems"].append(f"unreachable: {exc}")
+        return info
+    except ValueError as exc:
+        info["problems"].append(f"unparseable playlist: {exc}")
+        return info
+
+    segments = playlist["segments"]
+    duration = sum(seg["duration"] for seg in segments)
+    info.update(
+        media_url=choice["uri"],
+        kind=choice["kind"],
+        bandwidth=choice.get("bandwidth"),
+        duration=duration,
+        segment_count=len(segments),
+        live=not playlist["ended"],
+    )
+    if not segments:
+        info["problems"].append("media playlist lists no segments")
+        return info
+    if playlist["drm"]:
+        info["problems"].append("DRM-protected (SAMPLE-AES or key system)")
+        return info
+    if info["live"]:
+        info["notes"].append("live playlist (no ENDLIST); duration is what is available now")
+
+    info["estimated_bytes"] = estimate_bytes(
+        choice,
+        {"duration": duration, "segment_count": len(segments), "first_segment": segments[0]["uri"]},
+    )
+    info["estimated_compute_seconds"] = estimate_compute_seconds(duration, model_name, plan)
+    return info
+
+
+def check_limits(
+    info: Dict[str, Any],
+    max_duration: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+) -> List[str]:
+    """
+    Reasons to reject a probed job: its own problems plus exceeded limits.
+
+    Unknown sizes never exceed a limit.
+    """
+    problems = list(info["problems"])
+    if max_duration is not None and info["duration"] is not None and info["duration"] > max_duration:
+        problems.append(
+            f"duration {format_duration(info['duration'])} exceeds limit {format_duration(max_duration)}"
+        )
+    if max_bytes is not None and info["estimated_bytes"] is not None and info["estimated_bytes"] > max_bytes:
+        problems.append(
+            f"estimated size {info['estimated_bytes'] / 1_000_000:.0f} MB exceeds limit "
+            f"{max_bytes / 1_000_000:.0f} MB"
+        )
+    return problems
+
+
+def parse_duration(text: str) -> float:
+    """Parse ``90``, ``90s``, ``45m`` or ``4h`` to seconds (argparse ``type``)."""
+    match = _DURATION.match(text)
+    if not match:
+        raise ValueError(f"Invalid duration '{text}' (use e.g. 90, 45m or 4h)")
+    value, unit = float(match.group(1)), match.group(2)
+    return value * {"h": 3600, "m": 60}.get(unit, 1)
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """``1h02m03s``-style duration, or ``?``."""
+    if seconds is None:
+        return "?"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m{secs:02d}s"
+    if minutes:
+        return f"{minutes}m{secs:02d}s"
+    return f"{secs}s"
+
+
+def sort_key(info: Optional[Dict[str, Any]]) -> float:
+    """Shortest-job-first key: estimated compute seconds, unknown last."""
+    if not info or info.get("estimated_compute_seconds") is None:
+        return float("inf")
+    return float(info["estimated_compute_seconds"])
@@ -0,0 +1,245 @@
+"""
+Per-stage profiling for the transcript pipeline.
+
+:class:`StageProfiler` wraps each pipeline stage (download, transcribe,
+write) and collects:
+
+* a cProfile run per stage, merged into one ``.prof`` file for pstats /
+  snakeviz;
+* wall-clock stacks sampled from the stage's thread, written in the
+  collapsed format that ``flamegraph.pl`` and speedscope read;
+* for inference, time spent in the Whisper encoder vs. decoder (forward
+  hooks) and a torch operator table from :mod:`torch.profiler`, recorded
+  for the first :data:`TORCH_ACTIVE_STEPS` encoder passes only so long
+  streams do not grow the trace without bound.
+
+yt-dlp and ffmpeg run as subprocesses, so their stages only show up as
+wall time and a wait in ``subprocess``.
+"""
+
+import contextlib
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+# Encoder passes (one per 30 s window) recorded by torch.profiler, after one warm-up pass
+TORCH_ACTIVE_STEPS = 4
+_TOP_FUNCTIONS = 15
+_TORCH_ROWS = 25
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into *counts*, rooted at *stage*."""
+
+    def __init__(self, thread_id: int, interval: float, stage: str, counts: Counter) -> None:
+        super().__init__(name="stack-sampler", daemon=True)
+        self._thread_id = thread_id
+        self._interval = interval
+        self._halt = threading.Event()
+        self.stage = stage
+        self.counts = counts
+
+    def run(self) -> None:
+        while not self._halt.wait(self._interval):
+            stage = self.stage
+            frame = sys._current_frames().get(self._thread_id)
+            names: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(";", ","))
+                frame = frame.f_back
+            names.append(stage)
+            self.counts[";".join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._halt.set()
+        self.join()
+
+
+class _ModuleTimer:
+    """Accumulates forward-pass time for a torch module via hooks."""
+
+    def __init__(self, module: Any) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self._started: List[float] = []
+        self._handles = [
+            module.register_forward_pre_hook(self._pre),
+            module.register_forward_hook(self._post),
+        ]
+
+    def _pre(self, *_args: Any) -> None:
+        self._started.append(time.perf_counter())
+
+    def _post(self, *_args: Any) -> None:
+        self.seconds += time.perf_counter() - self._started.pop()
+        self.calls += 1
+
+    def remove(self) -> None:
+        for handle in self._handles:
+            handle.remove()
+
+
+class StageProfiler:
+    """
+    Collects profiling data for named pipeline stages.
+
+    A disabled profiler is a no-op, so callers can always wrap their
+    stages without checking whether profiling was requested.
+    """
+
+    def __init__(self, enabled: bool = True, interval: float = DEFAULT_SAMPLE_INTERVAL) -> None:
+        self.enabled = enabled
+        self._interval = interval
+        self._profiles: List[Tuple[str, cProfile.Profile]] = []
+        self._wall: Dict[str, float] = {}
+        self._modules: Dict[str, _ModuleTimer] = {}
+        self._torch_table: Optional[str] = None
+        self._stacks: Counter = Counter()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Profile the enclosed block as stage *name*."""
+        if not self.enabled:
+            yield
+            return
+
+        sampler = _StackSampler(threading.get_ident(), self._interval, name, self._stacks)
+        sampler.start()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            # Also when the stage raises: no sampler outlives its stage
+            sampler.stop()
+            self._wall[name] = self._wall.get(name, 0.0) + time.perf_counter() - start
+            self._profiles.append((name, profile))
+
+    @contextlib.contextmanager
+    def inference(self, models: Dict[str, Any]) -> Iterator[None]:
+        """
+        Time Whisper encoder/decoder forwards and record torch operators.
+
+        Each encoder forward is one :mod:`torch.profiler` step; operators are
+        recorded for :data:`TORCH_ACTIVE_STEPS` steps after the first.
+
+        Args:
+            models: ``{label: whisper_model}`` for every model the block uses.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        try:
+            import torch.profiler
+        except ImportError:  # pragma: no cover - torch is a hard dependency
+            torch_prof: Any = contextlib.nullcontext()
+        else:
+            torch_prof = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU],
+                schedule=torch.profiler.schedule(
+                    wait=0, warmup=1, active=TORCH_ACTIVE_STEPS, repeat=1,
+                ),
+            )
+
+        timers: List[Tuple[str, _ModuleTimer]] = []
+        step_hooks = []
+        for label, model in models.items():
+            for part in ("encoder", "decoder"):
+                module = getattr(model, part, None)
+                if module is not None:
+                    timers.append((f"{label}.{part}", _ModuleTimer(module)))
+            encoder = getattr(model, "encoder", None)
+            if encoder is not None and hasattr(torch_prof, "step"):
+                step_hooks.append(encoder.register_forward_hook(lambda *_args: torch_prof.step()))
+
+        prof = None
+        try:
+            with torch_prof as prof:
+                yield
+        finally:
+            for handle in step_hooks:
+                handle.remove()
+            for label, timer in timers:
+                timer.remove()
+                self._modules[label] = timer
+            if prof is not None and hasattr(prof, "key_averages"):
+                try:
+                    self._torch_table = prof.key_averages().table(
+                        sort_by="self_cpu_time_total", row_limit=_TORCH_ROWS,
+                    )
+                except (RuntimeError, AssertionError) as exc:
+                    log.warning("Could not summarise torch profile: %s", exc)
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def collapsed_stacks(self) -> str:
+        """Sampled stacks in ``frame;frame;frame count`` format."""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self._stacks.items()))
+
+    def summary(self) -> str:
+        """Human-readable report of stage times, hot functions and torch ops."""
+        out = io.StringIO()
+        total = sum(self._wall.values()) or 1.0
+        out.write("Stage timings (wall clock)\n")
+        for name, seconds in self._wall.items():
+            out.write(f"  {name:<12} {seconds:10.3f} s  {100 * seconds / total:5.1f}%\n")
+
+        if self._modules:
+            out.write("\nWhisper modules\n")
+            for label, timer in self._modules.items():
+                out.write(f"  {label:<20} {timer.calls:8d} calls  {timer.seconds:10.3f} s\n")
+
+        for name, profile in self._profiles:
+            out.write(f"\nTop functions in '{name}' (cumulative)\n")
+            stats = pstats.Stats(profile, stream=out)
+            stats.sort_stats("cumulative").print_stats(_TOP_FUNCTIONS)
+
+        if self._torch_table:
+            out.write(f"\nTorch operators (inference, up to {TORCH_ACTIVE_STEPS} encoder passes)\n")
+            out.write(self._torch_table)
+            out.write("\n")
+        return out.getvalue()
+
+    def write_report(self, output_path: str) -> List[str]:
+        """
+        Write ``<stem>.prof``, ``<stem>.collapsed`` and ``<stem>.profile.txt``
+        next to *output_path*.
+
+        Returns:
+            The paths written (empty when disabled or nothing was recorded).
+        """
+        if not self.enabled or not self._profiles:
+            return []
+
+        stem = os.path.splitext(output_path)[0]
+        os.makedirs(os.path.dirname(stem) or ".", exist_ok=True)
+        paths = [f"{stem}.prof", f"{stem}.collapsed", f"{stem}.profile.txt"]
+
+        stats = pstats.Stats(self._profiles[0][1])
+        for _name, profile in self._profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(paths[0])
+
+        with open(paths[1], "w", encoding="utf-8") as fh:
+            fh.write(self.collapsed_stacks())
+        with open(paths[2], "w", encoding="utf-8") as fh:
+            fh.write(self.summary())
+
+        log.info("Profile written to %s", ", ".join(paths))
+        return paths
@@ -0,0 +1,248 @@
+"""
+Hardware detection and thread/worker planning.
+
+torch defaults to one intra-op thread per visible core, which ignores
+container CPU quotas and oversubscribes the machine as soon as more than
+one job runs.  :func:`plan_resources` looks at the CPUs this process may
+actually use (affinity mask and cgroup quota) and the memory it may use
+(``MemAvailable`` and the cgroup limit), then picks:
+
+* the largest Whisper model that fits in memory;
+* how many inference workers can run side by side, each holding its own
+  copy of the model;
+* how many torch threads each of them gets.
+
+:func:`apply_plan` sets the torch thread counts for the process.
+"""
+
+import logging
+import math
+import os
+from typing import Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+# Approximate peak resident memory per loaded model while transcribing
+# (weights + activations + decode buffers), in bytes.
+_GIB = 1024 ** 3
+MODEL_MEMORY_BYTES: Dict[str, int] = {
+    "tiny": 1 * _GIB,
+    "base": 1 * _GIB,
+    "small": 2 * _GIB,
+    "medium": 5 * _GIB,
+    "large": 10 * _GIB,
+}
+MODELS_BY_SIZE = ["tiny", "base", "small", "medium", "large"]
+
+# Keep this share of usable memory free for the OS, yt-dlp and ffmpeg
+MEMORY_HEADROOM = 0.2
+# Fewer threads than this per worker makes each job too slow to be worth it
+MIN_THREADS_PER_WORKER = 4
+
+_CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+# ---------------------------------------------------------------------------
+# Detection
+# ---------------------------------------------------------------------------
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return fh.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit(root: str = _CGROUP_ROOT) -> Optional[float]:
+    """CPUs allowed by the cgroup CPU quota (v2 or v1), or None if unlimited."""
+    cpu_max = _read(os.path.join(root, "cpu.max"))
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    quota = _read(os.path.join(root, "cpu", "cpu.cfs_quota_us")) or _read(os.path.join(root, "cpu.cfs_quota_us"))
+    period = _read(os.path.join(root, "cpu", "cpu.cfs_period_us")) or _read(os.path.join(root, "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def cgroup_memory_limit(root: str = _CGROUP_ROOT) -> Optional[int]:
+    """Bytes still available under the cgroup memory limit, or None if unlimited."""
+    for limit_file, usage_file in (
+        ("memory.max", "memory.current"),
+        (os.path.join("memory", "memory.limit_in_bytes"), os.path.join("memory", "memory.usage_in_bytes")),
+    ):
+        limit = _read(os.path.join(root, limit_file))
+        if not limit:
+            continue
+        # v1 reports "no limit" as a huge page-aligned number
+        if limit == "max" or int(limit) >= 1 << 60:
+            return None
+        usage = _read(os.path.join(root, usage_file))
+        return max(0, int(limit) - int(usage or 0))
+    return None
+
+
+def available_memory(meminfo: str = "/proc/meminfo") -> Optional[int]:
+    """``MemAvailable`` from /proc/meminfo in bytes, or None if unknown."""
+    text = _read(meminfo)
+    if not text:
+        return None
+    for line in text.splitlines():
+        if line.startswith("MemAvailable:"):
+            return int(line.split()[1]) * 1024
+    return None
+
+
+def visible_cpus() -> int:
+    """CPUs in this process's affinity mask."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+def detect_resources(cgroup_root: str = _CGROUP_ROOT) -> Dict[str, Optional[float]]:
+    """
+    Inspect the machine.
+
+    Returns:
+        Dict with ``cpus`` (visible cores), ``cpu_quota`` (cgroup CPUs or
+        None), ``memory`` (usable bytes or None) and ``gpu`` (bool).
+    """
+    memory = available_memory()
+    cgroup_memory = cgroup_memory_limit(cgroup_root)
+    if cgroup_memory is not None:
+        memory = cgroup_memory if memory is None else min(memory, cgroup_memory)
+
+    try:
+        import torch
+        gpu = bool(torch.cuda.is_available())
+    except ImportError:  # pragma: no cover - torch is a hard dependency
+        gpu = False
+
+    return {
+        "cpus": visible_cpus(),
+        "cpu_quota": cgroup_cpu_limit(cgroup_root),
+        "memory": memory,
+        "gpu": gpu,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Planning
+# ---------------------------------------------------------------------------
+
+class ResourcePlan:
+    """Chosen thread/worker configuration; see :func:`plan_resources`."""
+
+    def __init__(
+        self,
+        cpus: int,
+        memory: Optional[int],
+        gpu: bool,
+        model_name: str,
+        max_model: Optional[str],
+        inference_workers: int,
+        torch_threads: int,
+    ) -> None:
+        self.cpus = cpus
+        self.memory = memory
+        self.gpu = gpu
+        self.model_name = model_name
+        self.max_model = max_model
+        self.inference_workers = inference_workers
+        self.torch_threads = torch_threads
+
+    @property
+    def model_fits(self) -> bool:
+        if self.max_model is None:
+            return self.memory is None
+        return MODELS_BY_SIZE.index(self.model_name) <= MODELS_BY_SIZE.index(self.max_model)
+
+    def describe(self) -> List[str]:
+        """Human-readable lines for ``--plan``."""
+        memory = "unknown" if self.memory is None else f"{self.memory / _GIB:.1f} GiB"
+        lines = [
+            f"Usable CPUs:        {self.cpus}",
+            f"Usable memory:      {memory}",
+            f"GPU:                {'yes' if self.gpu else 'no'}",
+            f"Largest model:      {self.max_model or 'none fits'}",
+            f"Model:              {self.model_name}",
+            f"Inference workers:  {self.inference_workers}",
+            f"Torch threads each: {self.torch_threads}",
+        ]
+        if not self.model_fits:
+            lines.append(f"Warning: '{self.model_name}' is larger than the usable memory allows.")
+        return lines
+
+
+def plan_resources(
+    model_name: Optional[str] = None,
+    jobs: int = 1,
+    resources: Optional[Dict[str, Optional[float]]] = None,
+) -> ResourcePlan:
+    """
+    Pick thread and worker counts for running *jobs* jobs with *model_name*.
+
+    Args:
+        model_name: Model the jobs will use; defaults to the largest one
+            that fits in memory.
+        jobs: Jobs that could run concurrently (1 for a single CLI run).
+        resources: Output of :func:`detect_resources` (detected if None).
+    """
+    resources = resources if resources is not None else detect_resources()
+    cpus = int(resources["cpus"] or 1)
+    if resources.get("cpu_quota"):
+        cpus = max(1, min(cpus, math.ceil(resources["cpu_quota"])))
+    memory = resources.get("memory")
+    budget = None if memory is None else int(memory * (1 - MEMORY_HEADROOM))
+
+    fitting = [m for m in MODELS_BY_SIZE if budget is None or MODEL_MEMORY_BYTES[m] <= budget]
+    max_model = fitting[-1] if fitting else None
+    model_name = model_name or max_model or MODELS_BY_SIZE[0]
+
+    if resources.get("gpu"):
+        # One model per GPU; CPU threads only feed it
+        workers = 1
+    else:
+        workers = max(1, min(jobs, cpus // MIN_THREADS_PER_WORKER))
+        if budget is not None:
+            workers = max(1, min(workers, budget // MODEL_MEMORY_BYTES[model_name]))
+    threads = max(1, cpus // workers)
+
+    return ResourcePlan(
+        cpus=cpus,
+        memory=memory,
+        gpu=bool(resources.get("gpu")),
+        model_name=model_name,
+        max_model=max_model,
+        inference_workers=workers,
+        torch_threads=threads,
+    )
+
+
+def apply_plan(plan: ResourcePlan) -> None:
+    """Set torch's thread pools to match *plan* and warn about oversized models."""
+    import torch
+
+    torch.set_num_threads(plan.torch_threads)
+    try:
+        torch.set_num_interop_threads(1 if plan.inference_workers > 1 else min(plan.cpus, 4))
+    except RuntimeError:
+        # Only allowed before torch starts any inter-op work
+        log.debug("torch inter-op threads already fixed at %d", torch.get_num_interop_threads())
+
+    log.info(
+        "Resource plan: %d inference worker(s) x %d torch thread(s) on %d CPU(s)",
+        plan.inference_workers, plan.torch_threads, plan.cpus,
+    )
+    if not plan.model_fits:
+        log.warning(
+            "Model '%s' may not fit in memory (largest that fits: %s)",
+            plan.model_name, plan.max_model or "none",
+        )
@@ -0,0 +1,357 @@
+"""
+Scratch space for downloaded and decoded audio.
+
+Every job gets its own directory under one scratch root (by default
+``<tmp>/m3u8-transcript``; point it at tmpfs or a fast local disk with
+:func:`configure` / ``--scratch-dir``).  yt-dlp writes its intermediates
+next to the audio, so removing the directory removes everything the job
+left behind.
+
+* Each job directory holds an ``.owner`` file (``pid host``).  When a
+  scratch space is created it sweeps directories whose owner process on
+  this host no longer exists -- the leftovers of crashed or killed runs.
+* Directories this process created are removed at exit and, once
+  :meth:`ScratchSpace.install_signal_handlers` has been called, on SIGTERM.
+* With a ``min_free_bytes`` floor set, :meth:`ScratchSpace.wait_for_space`
+  holds new downloads while free space on the scratch filesystem is below
+  it, for at most ``space_timeout`` seconds.
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from typing import Callable, Optional, Set
+
+log = logging.getLogger(__name__)
+
+# Opt-in: a floor larger than a small disk would hold every download forever
+DEFAULT_MIN_FREE_BYTES = 0
+DEFAULT_SPACE_TIMEOUT_SECONDS = 1800.0
+SPACE_POLL_SECONDS = 5.0
+# Job directories owned by other hosts (shared scratch) or without an owner
+# file are only swept once they have not been touched for this long
+STALE_SECONDS = 24 * 3600
+
+_JOB_PREFIX = "job-"
+_OWNER_FILE = ".owner"
+_KEPT_FILE = ".kept"
+
+
+class InsufficientSpaceError(OSError):
+    """Raised when free scratch space stays below the threshold for too long, or never can fit."""
+
+
+def default_root() -> str:
+    """``m3u8-transcript`` under the system temp directory."""
+    return os.path.join(tempfile.gettempdir(), "m3u8-transcript")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ScratchSpace:
+    """
+    Per-job scratch directories under *root*, with cleanup and a free-space floor.
+
+    Args:
+        root: Scratch directory (created if missing).
+        min_free_bytes: :meth:`wait_for_space` waits while less than this
+            is free on *root*'s filesystem (0 disables the check).
+        space_timeout: Longest :meth:`wait_for_space` waits by default
+            (None: forever).
+        sweep: Remove stale job directories now.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        min_free_bytes: int = DEFAULT_MIN_FREE_BYTES,
+        space_timeout: Optional[float] = DEFAULT_SPACE_TIMEOUT_SECONDS,
+        sweep: bool = True,
+    ) -> None:
+        self.root = os.path.abspath(root or default_root())
+        self.min_free_bytes = min_free_bytes
+        self.space_timeout = space_timeout
+        self._host = socket.gethostname()
+        self._lock = threading.Lock()
+        self._jobs: Set[str] = set()
+        os.makedirs(self.root, exist_ok=True)
+        atexit.register(self.cleanup)
+        if sweep:
+            self.sweep()
+
+    # -- job directories ----------------------------------------------------
+
+    def new_job(self) -> str:
+        """Create and return a new job directory owned by this process."""
+        path = tempfile.mkdtemp(prefix=_JOB_PREFIX, dir=self.root)
+        with open(os.path.join(path, _OWNER_FILE), "w", encoding="utf-8") as fh:
+            fh.write(f"{os.getpid()} {self._host}\n")
+        with self._lock:
+            self._jobs.add(path)
+        log.debug("Created scratch directory %s", path)
+        return path
+
+    def job_of(self, path: str) -> Optional[str]:
+        """The job directory containing *path*, or None if it is not in one."""
+        parent = os.path.dirname(os.path.abspath(path))
+        if os.path.dirname(parent) != self.root or not os.path.basename(parent).startswith(_JOB_PREFIX):
+            return None
+        return parent
+
+    def release(self, job_dir: str) -> None:
+        """Remove *job_dir* and everything in it, logging (not raising) on failure."""
+        with self._lock:
+            self._jobs.discard(job_dir)
+        if os.path.exists(os.path.join(job_dir, _KEPT_FILE)):
+            return
+        try:
+            shutil.rmtree(job_dir)
+            log.debug("Removed scratch directory %s", job_dir)
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            log.warning("Failed to remove scratch directory %s: %s", job_dir, exc)
+
+    def keep(self, job_dir: str) -> None:
+        """Leave *job_dir* on disk for the user: skipped by cleanup and sweeps."""
+        open(os.path.join(job_dir, _KEPT_FILE), "w").close()
+        with self._lock:
+            self._jobs.discard(job_dir)
+
+    def cleanup(self) -> None:
+        """Remove every job directory this process still holds."""
+        with self._lock:
+            jobs = list(self._jobs)
+        for job_dir in jobs:
+            self.release(job_dir)
+
+    def sweep(self) -> int:
+        """
+        Remove job directories left behind by processes that no longer run.
+
+        Returns:
+            The number of directories removed.
+        """
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not name.startswith(_JOB_PREFIX) or path in self._jobs or not os.path.isdir(path):
+                continue
+            if os.path.exists(os.path.join(path, _KEPT_FILE)):
+                continue
+            try:
+                with open(os.path.join(path, _OWNER_FILE), encoding="utf-8") as fh:
+                    pid_text, _, host = fh.read().strip().partition(" ")
+                pid = int(pid_text)
+            except (OSError, ValueError):
+                pid, host = 0, ""
+            try:
+                age = now - os.path.getmtime(path)
+            except OSError:
+                continue
+            if host == self._host and pid:
+                stale = not _pid_alive(pid)
+            else:
+                stale = age > STALE_SECONDS
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        if removed:
+            log.info("Removed %d stale scratch director%s from %s",
+                     removed, "y" if removed == 1 else "ies", self.root)
+        return removed
+
+    # -- free space ---------------------------------------------------------
+
+    def free_bytes(self) -> int:
+        return shutil.disk_usage(self.root).free
+
+    def total_bytes(self) -> int:
+        return shutil.disk_usage(self.root).total
+
+    def has_space(self, needed_bytes: int = 0) -> bool:
+        """True if *needed_bytes* fit while keeping ``min_free_bytes`` free."""
+        if not self.min_free_bytes and not needed_bytes:
+            return True
+        return self.free_bytes() - needed_bytes >= self.min_free_bytes
+
+    def _space_delay(self, needed_bytes: int, deadline: Optional[float], poll_seconds: float) -> float:
+        """0 if *needed_bytes* fit now, else the seconds to sleep before checking again."""
+        if self.has_space(needed_bytes):
+            return 0.0
+        if needed_bytes + self.min_free_bytes > self.total_bytes():
+            raise InsufficientSpaceError(
+                f"{needed_bytes} bytes plus the {self.min_free_bytes}-byte floor "
+                f"exceed the size of the filesystem holding {self.root}"
+            )
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise InsufficientSpaceError(f"Less than {self.min_free_bytes} bytes free in {self.root}")
+        return poll_seconds if remaining is None else min(poll_seconds, remaining)
+
+    def _waiting(self, on_wait: Optional[Callable[[str], None]]) -> None:
+        msg = (
+            f"Waiting for scratch space: {self.free_bytes() / 1_000_000:.0f} MB free "
+            f"in {self.root}, keeping {self.min_free_bytes / 1_000_000:.0f} MB free"
+        )
+        log.warning(msg)
+        if on_wait:
+            on_wait(msg)
+
+    def _deadline(self, timeout: Optional[float]) -> Optional[float]:
+        timeout = self.space_timeout if timeout is None else timeout
+        return None if timeout is None else time.monotonic() + timeout
+
+    def wait_for_space(
+        self,
+        needed_bytes: int = 0,
+        timeout: Optional[float] = None,
+        on_wait: Optional[Callable[[str], None]] = None,
+        poll_seconds: float = SPACE_POLL_SECONDS,
+    ) -> None:
+        """
+        Block until *needed_bytes* fit above the ``min_free_bytes`` floor.
+
+        Checks are not reservations: downloads started together share the
+        floor as headroom.
+
+        Args:
+            needed_bytes: Expected size of the download, if known.
+            timeout: Give up after this many seconds (default: ``space_timeout``).
+            on_wait: Called with a status message when waiting starts.
+
+        Raises:
+            InsufficientSpaceError: If *timeout* expires first, or at once if
+                *needed_bytes* and the floor exceed the whole filesystem.
+        """
+        deadline = self._deadline(timeout)
+        waiting = False
+        while True:
+            delay = self._space_delay(needed_bytes, deadline, poll_seconds)
+            if not delay:
+                return
+            if not waiting:
+                waiting = True
+                self._waiting(on_wait)
+            time.sleep(delay)
+
+    async def await_for_space(
+        self,
+        needed_bytes: int = 0,
+        timeout: Optional[float] = None,
+        on_wait: Optional[Callable[[str], None]] = None,
+        poll_seconds: float = SPACE_POLL_SECONDS,
+    ) -> None:
+        """Async :meth:`wait_for_space`: polls without blocking the event loop."""
+        deadline = self._deadline(timeout)
+        waiting = False
+        while True:
+            delay = self._space_delay(needed_bytes, deadline, poll_seconds)
+            if not delay:
+                return
+            if not waiting:
+                waiting = True
+                self._waiting(on_wait)
+            await asyncio.sleep(delay)
+
+    # -- signals --------------------------------------------------------------
+
+    def install_signal_handlers(self) -> None:
+        """
+        Remove this process's job directories on SIGTERM, then exit.
+
+        Must be called from the main thread.  A previously installed Python
+        handler is called afterwards; otherwise the process exits with
+        status 143 (128 + SIGTERM) via :class:`SystemExit`.
+        """
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def _on_sigterm(signum: int, frame: object) -> None:
+            log.warning("Received SIGTERM; removing scratch directories")
+            self.cleanup()
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                raise SystemExit(128 + signum)
+
+        signal.signal(signal.SIGTERM, _on_sigterm)
+
+
+# ---------------------------------------------------------------------------
+# Process-wide scratch space
+# ---------------------------------------------------------------------------
+
+_default: Optional[ScratchSpace] = None
+_default_lock = threading.Lock()
+
+
+def configure(
+    root: Optional[str] = None,
+    min_free_bytes: int = DEFAULT_MIN_FREE_BYTES,
+    space_timeout: Optional[float] = DEFAULT_SPACE_TIMEOUT_SECONDS,
+) -> ScratchSpace:
+    """Set up the process-wide scratch space (sweeping stale job directories)."""
+    global _default
+    with _default_lock:
+        _default = ScratchSpace(root, min_free_bytes=min_free_bytes, space_timeout=space_timeout)
+        return _default
+
+
+def default_scratch() -> ScratchSpace:
+    """The process-wide scratch space, created with defaults on first use."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ScratchSpace()
+        return _default
+
+
+def make_scratch_file(name: str) -> str:
+    """Create empty file *name* in a new job directory of the default scratch space."""
+    path = os.path.join(default_scratch().new_job(), name)
+    open(path, "wb").close()
+    return path
+
+
+def remove_scratch_file(path: str) -> None:
+    """
+    Remove *path*; if it is in a scratch job directory, remove the directory.
+
+    Files outside the scratch space are just deleted.
+    """
+    scratch = default_scratch()
+    job_dir = scratch.job_of(path)
+    if job_dir is not None:
+        scratch.release(job_dir)
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as exc:
+        log.warning("Failed to remove temp file %s: %s", path, exc)
+
+
+def keep_scratch_file(path: str) -> None:
+    """Keep *path* (and its job directory) after the run finishes."""
+    scratch = default_scratch()
+    job_dir = scratch.job_of(path)
+    if job_dir is not None:
+        scratch.keep(job_dir)
+
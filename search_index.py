@@ -0,0 +1,312 @@
+"""
+Full-text search index over the transcript archive.
+
+Segments from every job are stored in a SQLite database together with the
+source URL, model and segment timings.  An FTS5 table mirrors the segment
+text so that searches stay fast across tens of thousands of transcripts.
+
+The index is updated incrementally: :func:`workflow.generate_transcript`
+adds each new job as it is written, and :meth:`TranscriptIndex.index_directory`
+picks up existing TXT/SRT files whose modification time has changed.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join("transcripts", "index.db")
+
+# File types that can be parsed back into segments.  PDFs are skipped --
+# their text layout is not reliably recoverable without extra dependencies.
+INDEXABLE_EXTENSIONS = {".txt", ".srt"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY,
+    output_path TEXT NOT NULL UNIQUE,
+    source_url  TEXT,
+    model       TEXT,
+    language    TEXT,
+    date        TEXT,
+    mtime       REAL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id       INTEGER PRIMARY KEY,
+    job_id   INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    start_ms INTEGER NOT NULL,
+    end_ms   INTEGER NOT NULL,
+    text     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_job ON segments(job_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text, content='segments', content_rowid='id', tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+_TXT_LINE = re.compile(r"^\[(\d+):(\d{2}):(\d{2}) - (\d+):(\d{2}):(\d{2})\]\s+(.*)$")
+_TXT_META = re.compile(r"^(Source|Date|Model):\s+(.*)$")
+# Diarized transcripts prefix each line with its speaker (writers.segment_text)
+_SPEAKER_PREFIX = re.compile(r"^Speaker \d+:\s*")
+_SRT_TIMES = re.compile(
+    r"^(\d+):(\d{2}):(\d{2}),(\d{3})\s+-->\s+(\d+):(\d{2}):(\d{2}),(\d{3})$"
+)
+
+
+# ---------------------------------------------------------------------------
+# Parsers for transcripts already on disk
+# ---------------------------------------------------------------------------
+
+def _hms_to_ms(h: str, m: str, s: str, ms: str = "0") -> int:
+    return ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int(ms)
+
+
+def parse_txt_transcript(path: str) -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
+    """Parse a TXT transcript written by :func:`writers.write_txt`."""
+    metadata: Dict[str, str] = {}
+    segments: List[Dict[str, Any]] = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.rstrip("\n")
+            match = _TXT_LINE.match(line)
+            if match:
+                g = match.groups()
+                segments.append({
+                    "start_ms": _hms_to_ms(*g[0:3]),
+                    "end_ms": _hms_to_ms(*g[3:6]),
+                    "text": g[6].strip(),
+                })
+                continue
+            if not segments:
+                meta = _TXT_META.match(line)
+                if meta:
+                    key = {"Source": "source_url", "Date": "date", "Model": "model"}[meta.group(1)]
+                    metadata[key] = meta.group(2).strip()
+    return metadata, segments
+
+
+def parse_srt_transcript(path: str) -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
+    """Parse an SRT file written by :func:`writers.write_srt`."""
+    segments: List[Dict[str, Any]] = []
+    with open(path, encoding="utf-8") as fh:
+        blocks = fh.read().split("\n\n")
+    for block in blocks:
+        lines = block.strip("\n").split("\n")
+        if len(lines) < 2:
+            continue
+        match = _SRT_TIMES.match(lines[1].strip())
+        if not match:
+            continue
+        g = match.groups()
+        segments.append({
+            "start_ms": _hms_to_ms(*g[0:4]),
+            "end_ms": _hms_to_ms(*g[4:8]),
+            "text": " ".join(line.strip() for line in lines[2:]),
+        })
+    return {}, segments
+
+
+_PARSERS = {
+    ".txt": parse_txt_transcript,
+    ".srt": parse_srt_transcript,
+}
+
+
+def _fts_query(query: str) -> str:
+    """Turn free text into an FTS5 query that ANDs each term as a literal."""
+    terms = query.split()
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+class TranscriptIndex:
+    """SQLite/FTS5-backed inverted index of transcript segments."""
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH) -> None:
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "TranscriptIndex":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # -- writing --------------------------------------------------------
+
+    def add_job(
+        self,
+        segments: List[Dict[str, Any]],
+        output_path: str,
+        metadata: Optional[Dict[str, str]] = None,
+        mtime: Optional[float] = None,
+    ) -> int:
+        """
+        Add (or replace) one job's segments.
+
+        *segments* may be Whisper segment dicts (``start``/``end`` in
+        seconds) or parsed dicts carrying ``start_ms``/``end_ms``.
+
+        Returns:
+            The job id.
+        """
+        meta = metadata or {}
+        output_path = os.path.abspath(output_path)
+        if mtime is None and os.path.exists(output_path):
+            mtime = os.path.getmtime(output_path)
+
+        rows = []
+        for seg in segments:
+            if "start_ms" in seg:
+                start_ms, end_ms = int(seg["start_ms"]), int(seg["end_ms"])
+            else:
+                start_ms = int(round(seg["start"] * 1000))
+                end_ms = int(round(seg["end"] * 1000))
+            # Speaker labels are not transcript text: "speaker" must not match them
+            text = _SPEAKER_PREFIX.sub("", seg["text"].strip())
+            if text:
+                rows.append((start_ms, end_ms, text))
+
+        with self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE output_path = ?", (output_path,))
+            cur = self._conn.execute(
+                "INSERT INTO jobs (output_path, source_url, model, language, date, mtime) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    output_path, meta.get("source_url"), meta.get("model"),
+                    meta.get("language"), meta.get("date"), mtime,
+                ),
+            )
+            job_id = cur.lastrowid
+            self._conn.executemany(
+                "INSERT INTO segments (job_id, start_ms, end_ms, text) VALUES (?, ?, ?, ?)",
+                [(job_id, *row) for row in rows],
+            )
+        log.debug("Indexed %d segments from %s", len(rows), output_path)
+        return job_id
+
+    def index_file(self, path: str) -> bool:
+        """
+        Index a TXT/SRT transcript if it is new or has changed on disk.
+
+        Returns:
+            True if the file was (re)indexed, False if it was skipped.
+        """
+        ext = os.path.splitext(path)[1].lower()
+        parser = _PARSERS.get(ext)
+        if parser is None:
+            return False
+
+        abs_path = os.path.abspath(path)
+        mtime = os.path.getmtime(abs_path)
+        row = self._conn.execute(
+            "SELECT mtime FROM jobs WHERE output_path = ?", (abs_path,),
+        ).fetchone()
+        if row is not None and row["mtime"] == mtime:
+            return False
+
+        metadata, segments = parser(abs_path)
+        self.add_job(segments, abs_path, metadata=metadata, mtime=mtime)
+        return True
+
+    def index_directory(self, directory: str) -> Tuple[int, int]:
+        """
+        Walk *directory* and index every new or modified transcript.
+
+        Returns:
+            ``(indexed, skipped)`` file counts.
+        """
+        indexed = skipped = 0
+        for root, _dirs, files in os.walk(directory):
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() not in INDEXABLE_EXTENSIONS:
+                    continue
+                try:
+                    if self.index_file(os.path.join(root, name)):
+                        indexed += 1
+                    else:
+                        skipped += 1
+                except (OSError, UnicodeDecodeError) as exc:
+                    log.warning("Could not index %s: %s", name, exc)
+                    skipped += 1
+        log.info("Indexed %d transcript(s), %d unchanged/skipped", indexed, skipped)
+        return indexed, skipped
+
+    def prune(self) -> int:
+        """Drop jobs whose transcript file no longer exists. Returns the count."""
+        stale = [
+            (row["id"],)
+            for row in self._conn.execute("SELECT id, output_path FROM jobs")
+            if not os.path.exists(row["output_path"])
+        ]
+        with self._conn:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", stale)
+        return len(stale)
+
+    # -- reading --------------------------------------------------------
+
+    def search(self, query: str, limit: int = 20, raw: bool = False) -> List[Dict[str, Any]]:
+        """
+        Search segment text.
+
+        Args:
+            query: Free-text terms (all must match).  With ``raw=True`` the
+                   string is passed straight through as FTS5 syntax.
+            limit: Maximum number of hits.
+            raw: Treat *query* as an FTS5 expression.
+
+        Returns:
+            Hit dicts with ``start_ms``, ``end_ms``, ``text``, ``source_url``,
+            ``model``, ``language``, ``date`` and ``output_path``, best first.
+
+        Raises:
+            ValueError: If a *raw* query is not valid FTS5 syntax.
+        """
+        match = query if raw else _fts_query(query)
+        if not match:
+            return []
+        try:
+            rows = self._conn.execute(
+                "SELECT s.start_ms, s.end_ms, s.text, j.source_url, j.model, "
+                "       j.language, j.date, j.output_path "
+                "FROM segments_fts f "
+                "JOIN segments s ON s.id = f.rowid "
+                "JOIN jobs j ON j.id = s.job_id "
+                "WHERE segments_fts MATCH ? "
+                "ORDER BY f.rank LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        except sqlite3.OperationalError as exc:
+            if not raw:
+                raise
+            raise ValueError(f"Invalid FTS5 query '{query}': {exc}") from exc
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """Return job and segment counts."""
+        jobs = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        segs = self._conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        return {"jobs": jobs, "segments": segs}
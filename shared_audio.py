@@ -0,0 +1,245 @@
+"""
+Decoded audio in shared memory, for handing to other processes without copies.
+
+A :class:`SharedAudio` owns a ``multiprocessing.shared_memory`` block that
+holds 16 kHz mono float32 samples behind a small header.  Pickling one
+(``Pool`` arguments, ``Process`` args, queues) only sends the block's
+name; the receiving process maps the same pages, so every worker can read
+slices of one decoded buffer instead of getting its own pickled copy or
+decoding the file again.
+
+Lifetime is reference counted in the header: :meth:`SharedAudio.create`
+and every attach (including unpickling) take a reference, :meth:`close`
+drops one, and whoever drops the last one unlinks the block.  Each
+reference records the holder's pid, so references held by processes that
+died without closing (pool workers are terminated, not shut down) are
+dropped at the next :meth:`close` instead of keeping the block alive.  The sender
+must therefore keep its own reference until receivers have attached --
+typically by using the buffer as a context manager around the whole pool.
+A handle inherited through ``fork`` (not pickled) is borrowed from the
+parent: closing it in the child only unmaps it.
+
+Handles are meant for the creating process and its ``multiprocessing``
+children, which share one resource tracker; an unrelated process attaching
+by name would have the block unlinked by its own tracker when it exits.
+"""
+
+import contextlib
+import logging
+import os
+import threading
+from multiprocessing import shared_memory
+from typing import Any, Iterator, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows frees the block on last close
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# Same as whisper.audio.SAMPLE_RATE; not imported so readers need not load torch
+SAMPLE_RATE = 16000
+
+# Header: sample count, sample rate, then one slot per reference holding the
+# holder's pid (0 = free), all int64; its size keeps the samples aligned
+_HEADER_BYTES = 512
+_HEADER_FIELDS = _HEADER_BYTES // 8
+_MAX_REFERENCES = _HEADER_FIELDS - 2
+_SAMPLE_DTYPE = np.float32
+# s16le samples converted per step in from_pcm_file
+_CONVERT_BLOCK = 1 << 20
+
+
+class SharedAudio:
+    """
+    Reference-counted float32 audio in a shared-memory block.
+
+    Use :meth:`create`, :meth:`from_samples`, :meth:`from_pcm_file` or
+    :meth:`attach` rather than the constructor.  ``samples`` is a NumPy
+    view onto the shared pages; treat it as read-only once other
+    processes are attached.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory) -> None:
+        self._shm = shm
+        self._lock = threading.Lock()
+        self._closed = False
+        self._pid = os.getpid()
+        self._header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        length = int(self._header[0])
+        self.sample_rate = int(self._header[1])
+        self.samples: np.ndarray = np.ndarray(
+            (length,), dtype=_SAMPLE_DTYPE, buffer=shm.buf, offset=_HEADER_BYTES,
+        )
+
+    # -- construction -----------------------------------------------------
+
+    @classmethod
+    def create(cls, length: int, sample_rate: int = SAMPLE_RATE) -> "SharedAudio":
+        """Allocate a zeroed buffer of *length* samples (reference count 1)."""
+        if length < 0:
+            raise ValueError("length must not be negative.")
+        size = _HEADER_BYTES + max(1, length) * np.dtype(_SAMPLE_DTYPE).itemsize
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:2] = (length, sample_rate)
+        header[2] = os.getpid()
+        del header
+        return cls(shm)
+
+    @classmethod
+    def from_samples(cls, samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> "SharedAudio":
+        """Copy a 1-D waveform into a new shared buffer."""
+        samples = np.asarray(samples)
+        if samples.ndim != 1:
+            raise ValueError("samples must be a 1-D (mono) array.")
+        audio = cls.create(len(samples), sample_rate)
+        audio.samples[:] = samples
+        return audio
+
+    @classmethod
+    def from_pcm_file(cls, pcm_path: str, sample_rate: int = SAMPLE_RATE) -> "SharedAudio":
+        """
+        Load a raw s16le mono file, converting to float32 block by block.
+
+        Only the shared buffer itself is held in memory; the file is
+        memory-mapped and converted in fixed-size steps.
+        """
+        length = os.path.getsize(pcm_path) // np.dtype(np.int16).itemsize
+        audio = cls.create(length, sample_rate)
+        if not length:
+            return audio
+        pcm = np.memmap(pcm_path, dtype=np.int16, mode="r", shape=(length,))
+        try:
+            for start in range(0, length, _CONVERT_BLOCK):
+                stop = min(start + _CONVERT_BLOCK, length)
+                np.multiply(pcm[start:stop], 1 / 32768.0, out=audio.samples[start:stop], casting="unsafe")
+        finally:
+            del pcm
+        return audio
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedAudio":
+        """
+        Map an existing buffer by name and take a reference to it.
+
+        Raises:
+            FileNotFoundError: If the buffer has already been released.
+            RuntimeError: If every reference slot is held by a live process.
+        """
+        audio = cls(shared_memory.SharedMemory(name=name))
+        with audio._locked():
+            holders = audio._holders()
+            if not holders.any():
+                audio._release_mapping()
+                raise FileNotFoundError(f"Shared audio '{name}' has already been released")
+            free = np.flatnonzero(holders == 0)
+            if not len(free):
+                audio._prune(holders)
+                free = np.flatnonzero(holders == 0)
+            if not len(free):
+                audio._release_mapping()
+                raise RuntimeError(f"Shared audio '{name}' already has {_MAX_REFERENCES} references")
+            holders[free[0]] = os.getpid()
+        return audio
+
+    def __reduce__(self) -> Tuple[Any, Tuple[str]]:
+        return SharedAudio.attach, (self.name,)
+
+    # -- access -----------------------------------------------------------
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    @property
+    def refcount(self) -> int:
+        with self._locked():
+            return int(np.count_nonzero(self._holders()))
+
+    def window(self, start: int, stop: int) -> np.ndarray:
+        """Samples ``[start, stop)`` as a view (no copy)."""
+        return self.samples[start:stop]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def __repr__(self) -> str:
+        return f"<SharedAudio {self.name} {self.duration:.1f}s>"
+
+    # -- lifetime ---------------------------------------------------------
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialize header updates across threads and processes."""
+        with self._lock:
+            fd = getattr(self._shm, "_fd", -1)
+            if fcntl is None or fd < 0:
+                yield
+                return
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _holders(self) -> np.ndarray:
+        return self._header[2:]
+
+    @staticmethod
+    def _prune(holders: np.ndarray) -> None:
+        """Free the slots of processes that no longer exist."""
+        for slot in np.flatnonzero(holders):
+            try:
+                os.kill(int(holders[slot]), 0)
+            except ProcessLookupError:
+                holders[slot] = 0
+            except PermissionError:
+                pass
+
+    def _release_mapping(self) -> None:
+        # Views into shm.buf must be gone before the mapping can be closed
+        self.samples = np.empty(0, dtype=_SAMPLE_DTYPE)
+        self._header = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # A caller still holds a window; the mapping goes when that view does
+            log.debug("Shared audio %s still has live views", self.name)
+
+    def close(self) -> None:
+        """Drop this reference; the last one unlinks the block.  Idempotent."""
+        if self._closed:
+            return
+        self._closed = True
+        if os.getpid() != self._pid:
+            self._release_mapping()
+            return
+        with self._locked():
+            holders = self._holders()
+            mine = np.flatnonzero(holders == self._pid)
+            if len(mine):
+                holders[mine[0]] = 0
+            self._prune(holders)
+            if not holders.any():
+                self._shm.unlink()
+        self._release_mapping()
+
+    def __enter__(self) -> "SharedAudio":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        # Best effort for handles that were never closed explicitly
+        with contextlib.suppress(Exception):
+            self.close()
+
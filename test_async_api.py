@@ -0,0 +1,266 @@
+"""Tests for the asyncio API."""
+
+import asyncio
+import http.server
+import os
+import stat
+import sys
+import threading
+import time
+import urllib.error
+
+import pytest
+
+import async_api
+import workflow
+from async_api import AsyncPipeline, adownload_audio, afetch_text, agenerate_transcript
+
+MASTER = (
+    '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=2000000,CODECS="avc1.4d401f,mp4a.40.2"\n'
+    'video.m3u8\n#EXT-X-STREAM-INF:BANDWIDTH=64000,CODECS="mp4a.40.2"\naudio.m3u8\n'
+)
+
+
+@pytest.fixture(scope="module")
+def server():
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path == "/old.m3u8":
+                self.send_response(302)
+                self.send_header("Location", "/master.m3u8")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif self.path == "/master.m3u8":
+                data = MASTER.encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            elif self.path == "/chunked.m3u8":
+                self.send_response(200)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for part in (MASTER[:20], MASTER[20:]):
+                    data = part.encode()
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.write(b"0\r\n\r\n")
+            elif self.path == "/slow.m3u8":
+                time.sleep(1)
+                self.send_error(500)
+            else:
+                self.send_error(404)
+
+        def log_message(self, *args):
+            pass
+
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+FAKE_YTDLP = """#!{python}
+import os, sys, time
+args = sys.argv[1:]
+out = args[args.index("--output") + 1].replace("%(ext)s", "mp3")
+with open(os.environ["FAKE_YTDLP_LOG"], "a") as fh:
+    fh.write(args[-1] + "\\n")
+if "fail" in args[-1]:
+    sys.exit(3)
+if "hang" in args[-1]:
+    open(out + ".part", "w").close()
+    time.sleep(60)
+with open(out, "w") as fh:
+    fh.write("audio")
+"""
+
+
+@pytest.fixture
+def ytdlp(tmp_path, monkeypatch):
+    """A fake ``yt-dlp`` on PATH; returns the file listing the URLs it was given."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "yt-dlp"
+    script.write_text(FAKE_YTDLP.format(python=sys.executable))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    log_path = tmp_path / "ytdlp.log"
+    log_path.write_text("")
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_YTDLP_LOG", str(log_path))
+    return log_path
+
+
+class TestFetch:
+    def test_redirect_and_chunked(self, server):
+        assert asyncio.run(afetch_text(server + "/old.m3u8")) == MASTER
+        assert asyncio.run(afetch_text(server + "/chunked.m3u8")) == MASTER
+
+    def test_errors(self, server):
+        with pytest.raises(urllib.error.HTTPError) as info:
+            asyncio.run(afetch_text(server + "/missing.m3u8"))
+        assert info.value.code == 404
+        with pytest.raises(urllib.error.URLError, match="timed out"):
+            asyncio.run(afetch_text(server + "/slow.m3u8", timeout=0.2))
+
+    def test_concurrent_fetches_share_one_loop(self, server):
+        async def many():
+            return await asyncio.gather(*(afetch_text(server + "/master.m3u8") for _ in range(50)))
+
+        assert asyncio.run(many()) == [MASTER] * 50
+
+
+class TestDownload:
+    def test_selects_audio_rendition(self, server, ytdlp, tmp_path):
+        output = str(tmp_path / "a.mp3")
+        assert asyncio.run(adownload_audio(server + "/master.m3u8", output)) == output
+        assert ytdlp.read_text().split() == [server + "/audio.m3u8"]
+
+    def test_failure(self, ytdlp, tmp_path):
+        with pytest.raises(async_api.subprocess.CalledProcessError):
+            asyncio.run(adownload_audio("https://example.com/fail", str(tmp_path / "a.mp3")))
+        with pytest.raises(ValueError):
+            asyncio.run(adownload_audio("ftp://example.com/a", str(tmp_path / "a.mp3")))
+
+    def test_cancel_terminates_ytdlp(self, ytdlp, tmp_path):
+        output = str(tmp_path / "a.mp3")
+
+        async def cancel_midway():
+            task = asyncio.ensure_future(adownload_audio("https://example.com/hang", output))
+            while not os.path.exists(output + ".part"):
+                await asyncio.sleep(0.02)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        start = time.monotonic()
+        asyncio.run(cancel_midway())
+        assert time.monotonic() - start < 10
+        assert not os.path.exists(output + ".part")
+
+
+@pytest.fixture
+def fake_transcribe(monkeypatch):
+    """Replace inference with a fake that emits three segments; tracks concurrency."""
+    state = {"running": 0, "peak": 0, "lock": threading.Lock()}
+
+    def fake(source, on_segment=None, **kwargs):
+        with state["lock"]:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        try:
+            segments = []
+            for i in range(3):
+                time.sleep(0.02)
+                seg = {"start": i * 1.0, "end": i + 1.0, "text": f" part {i}"}
+                segments.append(seg)
+                if on_segment:
+                    on_segment(seg)
+            return {"text": "", "segments": segments, "language": "en"}
+        finally:
+            with state["lock"]:
+                state["running"] -= 1
+
+    monkeypatch.setattr(workflow, "transcribe_audio", fake)
+    return state
+
+
+class TestPipeline:
+    def test_events(self, ytdlp, fake_transcribe, tmp_path):
+        output = str(tmp_path / "out.txt")
+
+        async def collect():
+            async with AsyncPipeline(inference_workers=1) as pipeline:
+                return [e async for e in pipeline.events(
+                    "https://example.com/a", output_path=output, output_format="txt", index_path=None,
+                )]
+
+        events = asyncio.run(collect())
+        kinds = [e["type"] for e in events]
+        assert kinds[-1] == "done" and events[-1]["output"] == output
+        assert [e["segment"]["text"] for e in events if e["type"] == "segment"] == [" part 0", " part 1", " part 2"]
+        assert kinds.index("segment") > max(i for i, e in enumerate(events) if e.get("stage") == "download")
+        assert "part 2" in open(output, encoding="utf-8").read()
+
+    def test_bounded_inference(self, ytdlp, fake_transcribe, tmp_path):
+        async def run_all():
+            async with AsyncPipeline(inference_workers=2, max_downloads=8) as pipeline:
+                return await asyncio.gather(*(
+                    agenerate_transcript(
+                        f"https://example.com/{i}", pipeline=pipeline,
+                        output_path=str(tmp_path / f"{i}.txt"), output_format="txt", index_path=None,
+                    )
+                    for i in range(12)
+                ))
+
+        outputs = asyncio.run(run_all())
+        assert all(os.path.exists(path) for path in outputs) and len(set(outputs)) == 12
+        assert fake_transcribe["peak"] == 2
+
+    def test_same_segments_as_sync_path(self, ytdlp, monkeypatch, tmp_path):
+        calls = []
+
+        def windowed(source, bounded_memory=False, window_seconds=None, on_segment=None, **kwargs):
+            # Segment boundaries depend on how the audio is windowed
+            calls.append((bounded_memory, window_seconds, on_segment is not None))
+            size = window_seconds if bounded_memory else 30.0
+            segments = [{"start": i * size, "end": (i + 1) * size, "text": f" {size:g}s"} for i in range(2)]
+            return {"text": "", "segments": segments, "language": "en"}
+
+        monkeypatch.setattr(workflow, "transcribe_audio", windowed)
+        sync_out = workflow.generate_transcript(
+            "https://example.com/a", output_path=str(tmp_path / "sync.txt"), output_format="txt",
+            index_path=None,
+        )
+
+        async def run():
+            async with AsyncPipeline(inference_workers=1) as pipeline:
+                return await agenerate_transcript(
+                    "https://example.com/a", pipeline=pipeline, output_path=str(tmp_path / "async.txt"),
+                    output_format="txt", index_path=None,
+                )
+
+        async_out = asyncio.run(run())
+        assert calls[0] == calls[1] == (False, workflow.DEFAULT_WINDOW_SECONDS, False)
+
+        def segment_lines(path):
+            with open(path, encoding="utf-8") as fh:
+                return [line for line in fh if line.startswith("[")]
+
+        assert segment_lines(sync_out) == segment_lines(async_out) != []
+
+    def test_cancel_stops_inference_and_cleans_up(self, ytdlp, monkeypatch, tmp_path):
+        started, seen = threading.Event(), []
+
+        def endless(source, on_segment=None, **kwargs):
+            seen.append(source)
+            started.set()
+            i = 0
+            while True:
+                time.sleep(0.01)
+                on_segment({"start": i, "end": i + 1, "text": " x"})
+                i += 1
+
+        monkeypatch.setattr(workflow, "transcribe_audio", endless)
+        pipeline = AsyncPipeline(inference_workers=1)
+
+        async def cancel_during_inference():
+            async def consume():
+                async for _ in pipeline.events("https://example.com/a", output_format="txt",
+                                               output_path=str(tmp_path / "a.txt"), index_path=None):
+                    pass
+
+            task = asyncio.ensure_future(consume())
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_during_inference())
+        # The worker thread stopped at its next segment and removed the audio
+        pipeline.shutdown(wait=True)
+        assert not os.path.exists(seen[0])
+        assert not (tmp_path / "a.txt").exists()
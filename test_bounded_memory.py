@@ -0,0 +1,117 @@
+"""Tests for bounded-memory (windowed) transcription."""
+
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from transcriber import SAMPLE_RATE, transcribe_pcm_windows
+
+
+class FakeModel:
+    """Stands in for a Whisper model: one segment per 10 s of audio."""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **kwargs):
+        duration = len(audio) / SAMPLE_RATE
+        self.calls.append((duration, language, initial_prompt))
+        segments = []
+        t = 0.0
+        while t < duration:
+            end = min(t + 10.0, duration)
+            segments.append({"id": len(segments), "start": t, "end": end, "text": f" seg{t:.0f}"})
+            t = end
+        return {"text": "", "segments": segments, "language": language or "en"}
+
+
+def _write_pcm(path, seconds, chunk_seconds=60):
+    """Write *seconds* of low-level noise as s16le without holding it all in RAM."""
+    rng = np.random.default_rng(0)
+    with open(path, "wb") as fh:
+        remaining = int(seconds * SAMPLE_RATE)
+        while remaining:
+            n = min(remaining, chunk_seconds * SAMPLE_RATE)
+            fh.write(rng.integers(-500, 500, n, dtype=np.int16).tobytes())
+            remaining -= n
+
+
+class TestWindowing:
+    def test_covers_whole_input_in_order(self, tmp_path):
+        pcm = str(tmp_path / "a.pcm")
+        _write_pcm(pcm, 95)
+        model = FakeModel()
+        result = transcribe_pcm_windows(model, pcm, window_seconds=30)
+
+        starts = [s["start"] for s in result["segments"]]
+        assert starts == sorted(starts)
+        assert result["segments"][0]["start"] == 0.0
+        assert result["segments"][-1]["end"] == pytest.approx(95.0)
+        assert [s["id"] for s in result["segments"]] == list(range(len(starts)))
+        # Each window's last segment is carried over, so no gaps or overlaps
+        for prev, cur in zip(result["segments"], result["segments"][1:]):
+            assert cur["start"] == pytest.approx(prev["end"])
+
+    def test_language_pinned_and_prompt_carried(self, tmp_path):
+        pcm = str(tmp_path / "a.pcm")
+        _write_pcm(pcm, 65)
+        model = FakeModel()
+        result = transcribe_pcm_windows(model, pcm, window_seconds=30)
+        assert result["language"] == "en"
+        assert model.calls[0][1:] == (None, None)
+        assert all(lang == "en" and prompt for _d, lang, prompt in model.calls[1:])
+
+    def test_segments_streamed_per_window(self, tmp_path):
+        pcm = str(tmp_path / "a.pcm")
+        _write_pcm(pcm, 65)
+        model = FakeModel()
+        seen = []
+
+        def on_segment(seg):
+            seen.append((len(model.calls), seg["start"]))
+
+        result = transcribe_pcm_windows(model, pcm, window_seconds=30, on_segment=on_segment)
+        assert [start for _calls, start in seen] == [s["start"] for s in result["segments"]]
+        # The first window's segments were delivered before the second window ran
+        assert seen[0][0] == 1
+
+    def test_empty_input(self, tmp_path):
+        pcm = tmp_path / "empty.pcm"
+        pcm.write_bytes(b"")
+        result = transcribe_pcm_windows(FakeModel(), str(pcm), window_seconds=30)
+        assert result["segments"] == []
+
+    def test_invalid_window(self, tmp_path):
+        pcm = tmp_path / "a.pcm"
+        pcm.write_bytes(b"\0\0")
+        with pytest.raises(ValueError, match="window_seconds"):
+            transcribe_pcm_windows(FakeModel(), str(pcm), window_seconds=0)
+
+
+class TestPeakMemory:
+    """Peak Python-heap allocation must not grow with input duration."""
+
+    WINDOW = 30
+
+    def _peak(self, pcm):
+        tracemalloc.start()
+        try:
+            transcribe_pcm_windows(FakeModel(), pcm, window_seconds=self.WINDOW)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    @pytest.mark.parametrize("seconds", [120, 600, 1800])
+    def test_peak_bounded_by_window(self, tmp_path, seconds):
+        pcm = str(tmp_path / f"{seconds}.pcm")
+        _write_pcm(pcm, seconds)
+        window_bytes = self.WINDOW * SAMPLE_RATE * 4  # one float32 window
+        assert self._peak(pcm) < 3 * window_bytes
+
+    def test_peak_flat_across_durations(self, tmp_path):
+        short, long_ = str(tmp_path / "s.pcm"), str(tmp_path / "l.pcm")
+        _write_pcm(short, 120)
+        _write_pcm(long_, 1800)
+        # 15x the audio, at most 1.5x the peak
+        assert self._peak(long_) < 1.5 * self._peak(short)
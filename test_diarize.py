@@ -0,0 +1,152 @@
+"""Tests for speaker diarization."""
+
+import numpy as np
+import pytest
+
+import diarize as diarize_module
+import transcriber
+import workflow
+from diarize import SAMPLE_RATE, cluster_embeddings, diarize, label_segments, speech_windows
+from shared_audio import SharedAudio
+from writers import write_srt, write_txt
+
+_rng = np.random.default_rng(1)
+
+
+def _voice(f0, formants, seconds):
+    """Harmonic tone shaped by formant resonances -- a crude synthetic speaker."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    phase = 2 * np.pi * np.cumsum(f0 * (1 + 0.03 * np.sin(2 * np.pi * 5 * t))) / SAMPLE_RATE
+    signal = sum(
+        np.sin(h * phase) * sum(1 / (1 + ((h * f0 - f) / bw) ** 2) for f, bw in formants)
+        for h in range(1, 40)
+    )
+    envelope = 0.5 + 0.5 * np.abs(np.sin(2 * np.pi * 3 * t))
+    noise = 0.003 * _rng.standard_normal(len(t))
+    return (0.1 * signal / np.abs(signal).max() * envelope + noise).astype(np.float32)
+
+
+VOICES = [
+    lambda s: _voice(110, [(700, 80), (1200, 100), (2600, 150)], s),
+    lambda s: _voice(210, [(300, 60), (2300, 120), (3000, 150)], s),
+    lambda s: _voice(160, [(500, 70), (1700, 100), (2500, 150)], s),
+]
+
+
+def conversation(turns):
+    """Audio plus one transcript segment per turn, separated by short pauses."""
+    parts, segments, t = [], [], 0.0
+    for i, speaker in enumerate(turns):
+        seconds = _rng.uniform(2, 6)
+        parts.append(VOICES[speaker](seconds))
+        segments.append({"id": i, "start": t, "end": t + seconds, "text": f" turn {i}"})
+        pause = np.zeros(int(0.3 * SAMPLE_RATE), dtype=np.float32)
+        parts.append(pause)
+        t += seconds + len(pause) / SAMPLE_RATE
+    return np.concatenate(parts), segments
+
+
+def _speakers(segments):
+    return [int(seg["speaker"].split()[-1]) - 1 for seg in segments]
+
+
+class TestDiarize:
+    @pytest.mark.parametrize("turns", [
+        [0] * 8,
+        [0, 1, 0, 0, 1, 1, 0, 1, 0, 1],
+        [0, 1, 2, 0, 2, 1, 0, 1, 2, 2, 1, 0],
+    ])
+    def test_speaker_count_estimated(self, turns):
+        audio, segments = conversation(turns)
+        assert _speakers(diarize(audio, segments)) == turns
+
+    def test_known_speaker_count(self):
+        audio, segments = conversation([0, 1, 2, 0, 1, 2])
+        assert _speakers(diarize(audio, segments, num_speakers=2)).count(0) >= 2
+        assert _speakers(diarize(audio, segments, num_speakers=1)) == [0] * 6
+        with pytest.raises(ValueError):
+            diarize(audio, segments, num_speakers=0)
+
+    def test_original_segments_untouched(self):
+        audio, segments = conversation([0, 1])
+        result = diarize(audio, segments)
+        assert "speaker" not in segments[0] and result[0]["text"] == segments[0]["text"]
+
+    def test_cache_reused(self, tmp_path, monkeypatch):
+        audio, segments = conversation([0, 1, 0, 1])
+        first = diarize(audio, segments[:2], cache_dir=str(tmp_path))
+        assert len(list(tmp_path.glob("*.npz"))) == 1
+
+        computed = []
+        real = diarize_module.embed_windows
+        monkeypatch.setattr(diarize_module, "embed_windows",
+                            lambda samples, idx: computed.append(len(idx)) or real(samples, idx))
+        assert diarize(audio, segments[:2], cache_dir=str(tmp_path)) == first
+        assert computed == []
+        # Only the windows of the segments not seen before are computed
+        diarize(audio, segments, cache_dir=str(tmp_path))
+        assert len(computed) == 1 and 0 < computed[0] < len(speech_windows(segments, len(audio)))
+
+    def test_silence_and_short_input(self):
+        segment = {"start": 0.0, "end": 5.0, "text": " x"}
+        assert diarize(np.zeros(SAMPLE_RATE * 5, dtype=np.float32), [segment]) == [segment]
+        assert diarize(np.zeros(100, dtype=np.float32), [segment]) == [segment]
+
+    def test_short_segment_takes_nearest_window(self):
+        indices = np.array([0, 1, 2, 3])
+        labels = np.array([0, 0, 1, 1])
+        (seg,) = label_segments([{"start": 2.9, "end": 3.0, "text": ""}], indices, labels)
+        assert seg["speaker"] == "Speaker 2"
+
+    def test_cluster_labels_in_order_of_appearance(self):
+        a, b = np.eye(4)[0] + 0.01, np.eye(4)[1] + 0.01
+        labels = cluster_embeddings(np.stack([b, b, a, np.zeros(4), a, b]))
+        assert labels.tolist() == [0, 0, 1, -1, 1, 0]
+
+
+class TestRendering:
+    SEGMENTS = [
+        {"start": 0.0, "end": 2.0, "text": " Hello.", "speaker": "Speaker 1"},
+        {"start": 2.0, "end": 4.0, "text": " Hi there."},
+    ]
+
+    def test_srt_and_txt(self, tmp_path):
+        write_srt(self.SEGMENTS, str(tmp_path / "a.srt"))
+        write_txt(self.SEGMENTS, str(tmp_path / "a.txt"))
+        srt = (tmp_path / "a.srt").read_text(encoding="utf-8")
+        txt = (tmp_path / "a.txt").read_text(encoding="utf-8")
+        assert "00:00:02,000\nSpeaker 1: Hello.\n" in srt and "\nHi there.\n" in srt
+        assert "[0:00:00 - 0:00:02]  Speaker 1: Hello.\n" in txt
+
+
+class TestWorkflow:
+    def test_transcribe_to_output_diarizes_shared_audio(self, tmp_path, monkeypatch):
+        turns = [0, 1, 0, 1]
+        audio, segments = conversation(turns)
+        decoded = []
+
+        def fake_decode(path):
+            decoded.append(SharedAudio.from_samples(audio))
+            return decoded[-1]
+
+        class FakeModel:
+            def transcribe(self, samples, **kwargs):
+                assert isinstance(samples, np.ndarray) and len(samples) == len(audio)
+                return {"text": "", "segments": [dict(s) for s in segments], "language": "en"}
+
+        monkeypatch.setattr(workflow, "decode_to_shared", fake_decode)
+        monkeypatch.setattr(workflow, "DIARIZATION_CACHE_DIR", str(tmp_path / "cache"))
+        monkeypatch.setattr(transcriber, "_load_model", lambda name: FakeModel())
+        audio_path = tmp_path / "a.mp3"
+        audio_path.write_bytes(b"")
+
+        output = str(tmp_path / "out.txt")
+        result = workflow.transcribe_to_output(
+            str(audio_path), "https://example.com/a.m3u8", output,
+            output_format="txt", index_path=None, diarize=True,
+        )
+        assert _speakers(result["segments"]) == turns
+        assert "Speaker 2: turn 1" in open(output, encoding="utf-8").read()
+        # The decoded buffer was released
+        with pytest.raises(FileNotFoundError):
+            SharedAudio.attach(decoded[0].name)
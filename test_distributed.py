@@ -0,0 +1,220 @@
+"""Tests for the distributed coordinator/worker mode (local processes)."""
+
+import json
+import multiprocessing
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+import distributed
+from distributed import Coordinator, run_worker, serve_coordinator
+from transcriber import SAMPLE_RATE
+
+CHUNK_SECONDS = 2.0
+OVERLAP_SECONDS = 0.5
+
+
+def _write_tagged_pcm(path, n_chunks):
+    """Each chunk's samples hold its own index, so fakes can report it back."""
+    per_chunk = int(CHUNK_SECONDS * SAMPLE_RATE)
+    data = np.repeat(np.arange(n_chunks, dtype=np.int16) * 100, per_chunk)
+    path.write_bytes(data.tobytes())
+
+
+def fake_transcribe(samples, language):
+    """Half-second segments over the whole chunk, overlap included."""
+    tag = int(round(samples[len(samples) // 2] * 32768 / 100))
+    time.sleep(0.05)
+    return {
+        "language": "en",
+        "segments": [
+            {"start": k / 2, "end": (k + 1) / 2, "text": f" c{tag}", "tokens": [1, 2]}
+            for k in range(int(len(samples) / SAMPLE_RATE * 2))
+        ],
+    }
+
+
+def _worker_main(url, name):
+    run_worker(url, worker_id=name, transcribe=fake_transcribe)
+
+
+@pytest.fixture
+def coordinator(tmp_path):
+    servers = []
+
+    def _start(n_chunks, lease_seconds=30.0):
+        pcm = tmp_path / "audio.pcm"
+        _write_tagged_pcm(pcm, n_chunks)
+        coord = Coordinator(str(pcm), CHUNK_SECONDS, lease_seconds, overlap_seconds=OVERLAP_SECONDS)
+        server = serve_coordinator(coord, "127.0.0.1", 0)
+        servers.append(server)
+        return coord, f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield _start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _lease_raw(url, worker):
+    req = urllib.request.Request(
+        url + "/lease", data=json.dumps({"worker": worker}).encode(), method="POST",
+    )
+    with urllib.request.urlopen(req) as resp:
+        return resp.status, resp.headers.get("X-Chunk")
+
+
+class TestCoordinatorBookkeeping:
+    def test_chunking(self, tmp_path):
+        pcm = tmp_path / "a.pcm"
+        pcm.write_bytes(b"\0\0" * int(5 * SAMPLE_RATE))
+        coord = Coordinator(str(pcm), chunk_seconds=2.0, overlap_seconds=0.5)
+        assert [stop - start for start, stop in coord.spans] == [32000, 32000, 16000]
+        assert coord.chunks == [(0, 40000), (24000, 72000), (56000, 80000)]
+        assert coord.chunk_offset(1) == 1.5
+
+    def test_overlap_trimmed_by_midpoint(self, tmp_path):
+        pcm = tmp_path / "a.pcm"
+        pcm.write_bytes(b"\0\0" * int(4 * SAMPLE_RATE))
+        coord = Coordinator(str(pcm), chunk_seconds=2.0, overlap_seconds=1.0)
+        # The sentence over the chunk edge (1.6-2.6s) and the word cut off at
+        # chunk 0's end come from chunk 1, whose own span holds their midpoints
+        coord.complete("a", 0, {"segments": [
+            {"start": 0.0, "end": 1.6, "text": " one"},
+            {"start": 1.6, "end": 2.6, "text": " two three"},
+            {"start": 2.6, "end": 3.0, "text": " fo"},
+        ]})
+        coord.complete("b", 1, {"segments": [
+            {"start": 0.0, "end": 0.6, "text": " one"},
+            {"start": 0.6, "end": 1.6, "text": " two three"},
+            {"start": 1.6, "end": 3.0, "text": " four"},
+        ]})
+        segments = coord.stitched()["segments"]
+        assert [s["text"] for s in segments] == [" one", " two three", " four"]
+        assert [(s["start"], s["end"]) for s in segments] == [(0.0, 1.6), (1.6, 2.6), (2.6, 4.0)]
+
+    def test_idle_worker_steals_and_first_result_wins(self, tmp_path):
+        pcm = tmp_path / "a.pcm"
+        _write_tagged_pcm(pcm, 2)
+        coord = Coordinator(str(pcm), CHUNK_SECONDS)
+        assert coord.lease("slow") == 0
+        assert coord.lease("slow") == 1
+        # Nothing pending: the idle worker steals the longest-held chunk
+        assert coord.lease("fast") == 0
+        assert coord.complete("fast", 0, {"segments": []})
+        assert not coord.complete("slow", 0, {"segments": []})
+        assert not coord.renew("slow", 0)
+        assert coord.status()["workers"] == {"fast": 1}
+
+    def test_expired_lease_is_reassigned(self, tmp_path):
+        pcm = tmp_path / "a.pcm"
+        _write_tagged_pcm(pcm, 1)
+        coord = Coordinator(str(pcm), CHUNK_SECONDS, lease_seconds=0.05)
+        assert coord.lease("lost") == 0
+        time.sleep(0.1)
+        assert coord.lease("other") == 0
+
+
+def test_language_detected_on_first_30_seconds(tmp_path, monkeypatch):
+    pcm = tmp_path / "a.pcm"
+    pcm.write_bytes(b"\0\0" * int(40 * SAMPLE_RATE))
+    seen = []
+
+    def fake_detect(samples, model):
+        seen.append((len(samples), model))
+        return "de"
+
+    monkeypatch.setattr(distributed, "detect_language", fake_detect)
+    assert distributed._detect_pcm_language(str(pcm), "tiny") == "de"
+    assert seen == [(30 * SAMPLE_RATE, "tiny")]
+
+
+def _post_raw(url, path, data):
+    req = urllib.request.Request(url + path, data=data, method="POST")
+    try:
+        with urllib.request.urlopen(req) as resp:
+            return resp.status
+    except urllib.error.HTTPError as exc:
+        return exc.code
+
+
+def test_malformed_bodies_get_400(coordinator):
+    coord, url = coordinator(2)
+    assert _post_raw(url, "/renew", b"{}") == 400
+    assert _post_raw(url, "/renew", b'{"chunk": "x"}') == 400
+    assert _post_raw(url, "/result", b'{"chunk": 0}') == 400
+    assert _post_raw(url, "/result", b"[1]") == 400
+    assert _post_raw(url, "/result", b"not json") == 400
+    assert _post_raw(url, "/renew", b'{"worker": "w", "chunk": 0}') == 410
+    assert coord.status()["completed"] == 0
+
+
+@pytest.mark.parametrize("segment", [
+    "text", {"start": 0.0, "end": 1.0}, {"start": "0", "end": 1.0, "text": " a"},
+    {"start": 0.0, "end": None, "text": " a"}, {"start": 0.0, "end": 1.0, "text": 5},
+])
+def test_malformed_segments_rejected_and_chunk_released(coordinator, segment):
+    coord, url = coordinator(1)
+    status, chunk = _lease_raw(url, "w")
+    assert (status, chunk) == (200, "0")
+    body = {"worker": "w", "chunk": 0, "segments": [{"start": 0.0, "end": 1.0, "text": " ok"}, segment]}
+    assert _post_raw(url, "/result", json.dumps(body).encode()) == 400
+    assert coord.status()["completed"] == 0
+    # The chunk can be leased again at once, by anyone
+    assert _lease_raw(url, "other") == (200, "0")
+
+
+def test_renewal_errors_are_logged(coordinator, caplog):
+    coord, url = coordinator(1)
+    renewer = distributed._LeaseRenewer(url + "/missing", "w", 0, lease_seconds=0.3)
+    with caplog.at_level("WARNING", logger="distributed"):
+        renewer.start()
+        time.sleep(0.25)
+        renewer.stop.set()
+        renewer.join()
+    assert any("refused" in r.getMessage() for r in caplog.records)
+
+
+def test_default_bind_is_loopback():
+    assert distributed.DEFAULT_HOST == "127.0.0.1"
+
+
+class TestLocalCluster:
+    def test_multiple_workers_stitch_in_order(self, coordinator):
+        coord, url = coordinator(12)
+        ctx = multiprocessing.get_context("fork")
+        procs = [ctx.Process(target=_worker_main, args=(url, f"w{i}")) for i in range(3)]
+        for proc in procs:
+            proc.start()
+        assert coord.done.wait(timeout=30)
+        for proc in procs:
+            proc.join(timeout=10)
+            assert proc.exitcode == 0
+
+        result = coord.stitched()
+        # Each half second once, from the chunk that owns it
+        texts = [seg["text"] for seg in result["segments"]]
+        assert texts == [f" c{i // 4}" for i in range(48)]
+        starts = [seg["start"] for seg in result["segments"]]
+        assert starts == [i * 0.5 for i in range(48)]
+        assert "tokens" not in result["segments"][0]
+        assert result["language"] == "en"
+        assert len(coord.status()["workers"]) >= 2
+
+    def test_lost_worker_chunk_is_reassigned(self, coordinator):
+        coord, url = coordinator(3, lease_seconds=0.5)
+        # A worker leases a chunk and vanishes without renewing
+        status, chunk = _lease_raw(url, "crashed")
+        assert status == 200 and chunk == "0"
+
+        ctx = multiprocessing.get_context("fork")
+        proc = ctx.Process(target=_worker_main, args=(url, "survivor"))
+        proc.start()
+        assert coord.done.wait(timeout=30)
+        proc.join(timeout=10)
+
+        assert coord.status()["workers"] == {"survivor": 3}
+        assert [s["text"] for s in coord.stitched()["segments"]][:4] == [" c0"] * 4
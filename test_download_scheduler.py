@@ -0,0 +1,293 @@
+"""Tests for per-host download scheduling, against a local HTTP server."""
+
+import asyncio
+import email.utils
+import http.server
+import threading
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import async_api
+import download_scheduler
+import distributed
+import hls
+import main
+from download_scheduler import TokenBucket, parse_retry_after
+from transcriber import ytdlp_command
+
+BIG = b"x" * 300_000
+
+
+class LimitedServer:
+    """
+    Counts connections and concurrent requests; answers 429 on ``/limited``
+    until ``allow_after`` requests have been refused.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = self.peak = 0
+        self.refused = 0
+        self.allow_after = 1
+        self.retry_after = "1"
+        self.clients = set()
+        outer = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status, body=b"", headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                with outer.lock:
+                    outer.clients.add(self.client_address)
+                    outer.active += 1
+                    outer.peak = max(outer.peak, outer.active)
+                try:
+                    self._route()
+                finally:
+                    with outer.lock:
+                        outer.active -= 1
+
+            do_HEAD = do_GET
+
+            def _route(self):
+                if self.path == "/slow":
+                    time.sleep(0.2)
+                    self._send(200, b"slow")
+                elif self.path == "/big":
+                    self._send(200, BIG)
+                elif self.path == "/limited":
+                    with outer.lock:
+                        refuse = outer.refused < outer.allow_after
+                        outer.refused += refuse
+                    if refuse:
+                        headers = [("Retry-After", outer.retry_after)] if outer.retry_after else []
+                        self._send(429, b"slow down", headers)
+                    else:
+                        self._send(200, b"ok")
+                elif self.path == "/moved":
+                    self._send(302, headers=[("Location", "/slow")])
+                elif self.path == "/cached":
+                    self._send(304, headers=[("ETag", '"v1"')])
+                else:
+                    self._send(404, b"missing")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def server():
+    srv = LimitedServer()
+    yield srv
+    srv.close()
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    """A fresh process-wide scheduler; returns a factory taking scheduler options."""
+    monkeypatch.setattr(download_scheduler, "_default", None)
+    created = []
+
+    def make(**options):
+        created.append(download_scheduler.configure(**options))
+        return created[-1]
+
+    yield make
+    for sched in created:
+        sched.close()
+
+
+class TestRequests:
+    def test_keep_alive_redirect_and_errors(self, server, scheduler):
+        sched = scheduler()
+        for _ in range(5):
+            assert sched.request(server.url + "/slow")["body"] == b"slow"
+        assert len(server.clients) == 1
+
+        moved = sched.request(server.url + "/moved")
+        assert (moved["url"], moved["body"]) == (server.url + "/slow", b"slow")
+        assert sched.request(server.url + "/cached")["status"] == 304
+        with pytest.raises(urllib.error.HTTPError) as info:
+            sched.request(server.url + "/missing")
+        assert info.value.code == 404
+
+    def test_unreachable_host(self, scheduler):
+        with pytest.raises(urllib.error.URLError):
+            scheduler().request("http://127.0.0.1:9/", timeout=2)
+
+    def test_fetch_paths_use_the_scheduler(self, server, scheduler):
+        sched = scheduler()
+        assert hls.fetch_text(server.url + "/slow") == "slow"
+        assert hls._content_length(server.url + "/big") == len(BIG)
+        assert sched.report()[0]["requests"] == 2
+
+
+class TestLimits:
+    def test_per_host_concurrency(self, server, scheduler):
+        sched = scheduler(max_per_host=2)
+        with ThreadPoolExecutor(8) as pool:
+            bodies = list(pool.map(lambda _: sched.request(server.url + "/slow")["body"], range(8)))
+        assert bodies == [b"slow"] * 8
+        assert server.peak == 2
+        assert sched.report()[0]["waited"] > 0
+
+    def test_request_rate(self, server, scheduler):
+        sched = scheduler(requests_per_second=10, burst=1)
+        started = time.monotonic()
+        for _ in range(5):
+            sched.request(server.url + "/cached")
+        assert time.monotonic() - started >= 0.35
+
+    def test_bandwidth_cap(self, server, scheduler):
+        sched = scheduler(max_bandwidth=200_000)
+        started = time.monotonic()
+        assert sched.request(server.url + "/big")["body"] == BIG
+        # One second's burst, then the remaining 100 kB at 200 kB/s
+        assert time.monotonic() - started >= 0.4
+
+    def test_retry_after_pauses_the_host(self, server, scheduler):
+        sched = scheduler()
+        started = time.monotonic()
+        assert sched.request(server.url + "/limited")["body"] == b"ok"
+        assert time.monotonic() - started >= 0.9
+        row = sched.report()[0]
+        assert (row["requests"], row["throttled"]) == (2, 1)
+
+    def test_backoff_then_give_up(self, server, scheduler):
+        server.retry_after = None
+        server.allow_after = 10
+        sched = scheduler(max_retries=2, backoff_seconds=0.05)
+        with pytest.raises(urllib.error.HTTPError) as info:
+            sched.request(server.url + "/limited")
+        assert info.value.code == 429
+        assert server.refused == 3
+
+    def test_async_fetch_shares_limits(self, server, scheduler):
+        sched = scheduler(max_per_host=2)
+
+        async def run():
+            return await asyncio.gather(*(async_api.afetch_text(server.url + "/slow") for _ in range(6)))
+
+        assert asyncio.run(run()) == ["slow"] * 6
+        assert server.peak == 2
+        assert sched.report()[0]["requests"] == 6
+
+
+class TestTransfers:
+    def test_slots_and_bandwidth_share(self, scheduler):
+        sched = scheduler(max_per_host=1, max_bandwidth=1_000_000, max_transfers=3)
+        entered = threading.Event()
+
+        def hold():
+            with sched.transfer("https://cdn.example.com/a.m3u8") as ticket:
+                # Alone, a download may use the whole cap
+                assert ticket["rate_limit"] == 1_000_000
+                entered.set()
+                time.sleep(0.2)
+                ticket["output_bytes"] = 1000
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        entered.wait()
+        with sched.transfer("https://other.example.com/b.m3u8") as ticket:
+            assert ticket["rate_limit"] == 500_000
+            # Requests keep at least one more download's share
+            assert sched._bandwidth.rate == pytest.approx(1_000_000 / 3)
+        started = time.monotonic()
+        with sched.transfer("https://cdn.example.com/c.m3u8") as ticket:
+            assert time.monotonic() - started >= 0.1
+            assert ticket["rate_limit"] == 1_000_000
+        thread.join()
+        assert sched._bandwidth.rate == 1_000_000
+
+        rows = {r["host"]: r for r in sched.report()}
+        cdn = rows["cdn.example.com"]
+        assert (cdn["requests"], cdn["bytes"], cdn["seconds"]) == (0, 0, 0.0)
+        assert (cdn["transfers"], cdn["output_bytes"]) == (2, 1000)
+        assert any(
+            line.startswith("cdn.example.com: 0 request(s)") and "2 yt-dlp download(s) wrote" in line
+            for line in sched.describe()
+        )
+
+    def test_transfer_count_and_request_rate_floor(self, scheduler):
+        sched = scheduler(max_bandwidth=900_000, max_transfers=2)
+        lock = threading.Lock()
+        active, seen = [], []
+
+        def download(i):
+            with sched.transfer(f"https://cdn{i}.example.com/a.m3u8") as ticket:
+                with lock:
+                    active.append(ticket["rate_limit"])
+                    seen.append((len(active), ticket["rate_limit"], sched._bandwidth.rate))
+                time.sleep(0.05)
+                with lock:
+                    active.remove(ticket["rate_limit"])
+
+        with ThreadPoolExecutor(5) as pool:
+            list(pool.map(download, range(5)))
+        assert max(n for n, _, _ in seen) == 2
+        assert {share for _, share, _ in seen} <= {900_000, 450_000}
+        assert all(rate >= 300_000 for _, _, rate in seen)
+        assert sched._bandwidth.rate == 900_000
+
+    def test_unlimited_transfers(self, scheduler):
+        sched = scheduler()
+        with sched.transfer("https://cdn.example.com/a.m3u8") as ticket:
+            assert ticket["rate_limit"] is None
+
+    def test_ytdlp_rate_limit(self):
+        cmd, _ = ytdlp_command("https://cdn.example.com/a.m3u8", "/tmp/audio.mp3", rate_limit=250_000.5)
+        assert cmd[cmd.index("--limit-rate") + 1] == "250000"
+        assert cmd[-1] == "https://cdn.example.com/a.m3u8"
+        assert "--limit-rate" not in ytdlp_command("https://cdn.example.com/a.m3u8", "/tmp/a.mp3")[0]
+
+
+def test_token_bucket_debt():
+    bucket = TokenBucket(rate=100, burst=10)
+    assert bucket.reserve(10) == 0
+    assert bucket.delay(5) == pytest.approx(0.05, abs=0.01)
+    assert bucket.reserve(20) == pytest.approx(0.2, abs=0.01)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after(None) is None and parse_retry_after("soon") is None
+    later = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= parse_retry_after(later) <= 30
+    assert parse_retry_after(email.utils.formatdate(0, usegmt=True)) == 0
+
+
+def test_subcommand_flags_not_taken_for_shared_prefixes(monkeypatch):
+    configured, calls = [], []
+    monkeypatch.setattr(main, "_configure_logging", lambda args: None)
+    monkeypatch.setattr(main, "_configure_scratch", lambda args: None)
+    monkeypatch.setattr(main, "_configure_downloads", configured.append)
+    monkeypatch.setattr(main, "_log_download_report", lambda: None)
+    monkeypatch.setattr(distributed, "run_coordinator", lambda url, **kw: calls.append(kw) or "out.pdf")
+
+    with pytest.raises(SystemExit) as info:
+        main.main(["coordinator", "https://example.com/a.m3u8", "--host", "0.0.0.0", "--port", "1",
+                   "--host-rate", "5"])
+    assert info.value.code == 0
+    assert (calls[0]["host"], calls[0]["port"]) == ("0.0.0.0", 1)
+    assert configured[0].host_rate == 5
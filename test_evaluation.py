@@ -0,0 +1,145 @@
+"""Tests for WER/CER/RTF evaluation."""
+
+import contextlib
+import itertools
+import json
+import wave
+
+import numpy as np
+import pytest
+
+import evaluation
+import main
+from evaluation import edit_distance, evaluate, find_fixtures, format_table, parse_config, score, summarize
+from transcriber import SAMPLE_RATE
+
+
+def _brute_distance(ref, hyp):
+    table = [[i + j if not i * j else 0 for j in range(len(hyp) + 1)] for i in range(len(ref) + 1)]
+    for i, j in itertools.product(range(1, len(ref) + 1), range(1, len(hyp) + 1)):
+        table[i][j] = min(
+            table[i - 1][j] + 1, table[i][j - 1] + 1, table[i - 1][j - 1] + (ref[i - 1] != hyp[j - 1]),
+        )
+    return table[-1][-1]
+
+
+def _write_wav(path, seconds):
+    with contextlib.closing(wave.open(str(path), "wb")) as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(np.zeros(int(seconds * SAMPLE_RATE), dtype=np.int16).tobytes())
+
+
+@pytest.fixture
+def fixtures_dir(tmp_path):
+    _write_wav(tmp_path / "a.wav", 2)
+    (tmp_path / "a.txt").write_text("Hello, world!")
+    _write_wav(tmp_path / "b.wav", 4)
+    (tmp_path / "b.txt").write_text("the quick brown fox")
+    _write_wav(tmp_path / "orphan.wav", 1)
+    (tmp_path / "notes.md").write_text("ignored")
+    return tmp_path
+
+
+class TestScoring:
+    def test_edit_distance(self):
+        assert edit_distance("kitten", "sitting") == 3
+        assert edit_distance("", "abc") == edit_distance("abc", "") == 3
+        assert edit_distance("same".split(), "same".split()) == 0
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        for _ in range(200):
+            ref = list(rng.integers(0, 4, rng.integers(0, 9)))
+            hyp = list(rng.integers(0, 4, rng.integers(0, 9)))
+            assert edit_distance(ref, hyp) == _brute_distance(ref, hyp)
+
+    def test_score_normalises(self):
+        assert score("Hello, World!", " hello world") == {
+            "word_errors": 0, "words": 2, "char_errors": 0, "chars": 11,
+        }
+        counts = score("the cat sat", "the cat sat down")
+        assert (counts["word_errors"], counts["words"]) == (1, 3)
+
+
+class TestConfigs:
+    def test_parse(self):
+        assert parse_config("tiny") == {"label": "tiny", "options": {"model": "tiny"}}
+        assert parse_config("beam:model=small,beam_size=5,fp16=false,language=en") == {
+            "label": "beam",
+            "options": {"model": "small", "beam_size": 5, "fp16": False, "language": "en"},
+        }
+        assert parse_config("beam_size=5")["options"] == {"model": "base", "beam_size": 5}
+        assert parse_config("t:temperature=(0.0, 0.4)")["options"]["temperature"] == (0.0, 0.4)
+
+    @pytest.mark.parametrize("spec", ["huge", "x:model=huge", "x:refine_model=nope", "x:beam_size"])
+    def test_invalid(self, spec):
+        with pytest.raises(ValueError):
+            parse_config(spec)
+
+    def test_tiered_rejects_whisper_options(self):
+        with pytest.raises(ValueError, match="Tiered"):
+            evaluation.run_config(None, {"model": "tiny", "refine_model": "small", "beam_size": 5})
+
+
+class TestEvaluate:
+    def test_fixtures_need_references(self, fixtures_dir):
+        fixtures = find_fixtures(str(fixtures_dir))
+        assert [(p.rsplit("/", 1)[-1], ref) for p, ref in fixtures] == [
+            ("a.wav", "Hello, world!"), ("b.wav", "the quick brown fox"),
+        ]
+        audio = evaluation.load_fixture(fixtures[1][0])
+        try:
+            assert audio.duration == pytest.approx(4.0)
+        finally:
+            audio.close()
+
+    def test_results_and_summary(self, fixtures_dir):
+        hypotheses = {
+            "good": {2.0: "hello world", 4.0: "The quick brown fox."},
+            "bad": {2.0: "hello", 4.0: "the quick brown box"},
+        }
+        preloaded, seen = [], []
+
+        def fake_transcribe(audio, options):
+            return {"text": hypotheses[options["model"]][audio.duration]}
+
+        configs = [{"label": "good", "options": {"model": "good"}}, {"label": "bad", "options": {"model": "bad"}}]
+        results = evaluate(
+            find_fixtures(str(fixtures_dir)), configs,
+            transcribe=fake_transcribe, preload=preloaded.append, on_result=seen.append,
+        )
+        assert preloaded == [{"model": "good"}, {"model": "bad"}]
+        assert seen == results and len(results) == 4
+        assert all(r["rtf"] >= 0 and r["seconds"] >= 0 for r in results)
+
+        summary = summarize(results)
+        assert [t["config"] for t in summary] == ["good", "bad"]
+        assert summary[0]["wer"] == 0 and summary[0]["audio_seconds"] == pytest.approx(6.0)
+        # One deletion over 2 words + one substitution over 4 words, pooled
+        assert summary[1]["wer"] == pytest.approx(2 / 6)
+        assert 0 < summary[1]["cer"] < summary[1]["wer"]
+
+        table = format_table(summary).splitlines()
+        assert table[0].split() == ["config", "files", "WER", "CER", "RTF", "dWER", "speedup"]
+        assert table[1].split()[:3] == ["good", "2", "0.0%"]
+        assert table[2].split()[5] == "+33.3%"
+
+
+def test_eval_command(fixtures_dir, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(evaluation, "_preload", lambda options: None)
+    monkeypatch.setattr(
+        evaluation, "run_config",
+        lambda audio, options: {"text": "hello world" if options["model"] == "tiny" else ""},
+    )
+    out = tmp_path / "results.json"
+    argv = [str(fixtures_dir), "-c", "tiny", "-c", "empty:model=base", "--json", str(out)]
+
+    assert main._cmd_eval(argv) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[0] for line in lines[1:]] == ["tiny", "empty"]
+    saved = json.loads(out.read_text())
+    assert len(saved["results"]) == 4 and saved["summary"][1]["wer"] == 1.0
+
+    assert main._cmd_eval(argv + ["--max-wer", "50"]) == 1
@@ -0,0 +1,163 @@
+"""Tests for HLS master-playlist parsing and rendition selection."""
+
+import http.server
+import threading
+
+import pytest
+
+from hls import (
+    choose_rendition,
+    parse_attributes,
+    parse_master_playlist,
+    parse_segments,
+    select_rendition,
+)
+
+BASE = "https://cdn.example.com/live/master.m3u8"
+
+MUXED_ONLY = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=5000000,RESOLUTION=1920x1080,CODECS="avc1.640028,mp4a.40.2"
+1080p.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2"
+360p.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=16000,CODECS="mp4a.40.5"
+tiny_audio.m3u8
+"""
+
+WITH_AUDIO_ONLY_VARIANT = MUXED_ONLY + """#EXT-X-STREAM-INF:BANDWIDTH=64000,CODECS="mp4a.40.2"
+audio64.m3u8
+"""
+
+WITH_MEDIA = """#EXTM3U
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aac-hi",NAME="English",LANGUAGE="en",DEFAULT=YES,URI="audio/hi_en.m3u8"
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aac-lo",NAME="English",LANGUAGE="en",DEFAULT=YES,URI="audio/lo_en.m3u8"
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aac-lo",NAME="French",LANGUAGE="fr",URI="audio/lo_fr.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=5000000,RESOLUTION=1920x1080,CODECS="avc1.640028,mp4a.40.2",AUDIO="aac-hi"
+1080p.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=600000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2",AUDIO="aac-lo"
+360p.m3u8
+"""
+
+# The "lo" group rides an audio-only variant, so its audio is at most 16 kb/s
+WITH_LOW_MEDIA = """#EXTM3U
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="lo",NAME="English",LANGUAGE="en",DEFAULT=YES,URI="audio/lo.m3u8"
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="hi",NAME="English",LANGUAGE="en",DEFAULT=YES,URI="audio/hi.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=16000,CODECS="mp4a.40.5",AUDIO="lo"
+lo.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=900000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.5",AUDIO="lo"
+360p.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=5000000,RESOLUTION=1920x1080,CODECS="avc1.640028,mp4a.40.2",AUDIO="hi"
+1080p.m3u8
+"""
+
+MEDIA = "#EXTM3U\n" + "".join(f"#EXTINF:6.0,\nseg{i}.ts\n" for i in range(10)) + "#EXT-X-ENDLIST\n"
+
+
+class TestParsing:
+    def test_quoted_commas(self):
+        attrs = parse_attributes('BANDWIDTH=1,CODECS="avc1.64,mp4a.40.2",AUDIO="a"')
+        assert attrs == {"BANDWIDTH": "1", "CODECS": "avc1.64,mp4a.40.2", "AUDIO": "a"}
+
+    def test_master_variants(self):
+        master = parse_master_playlist(WITH_AUDIO_ONLY_VARIANT, BASE)
+        assert [v["audio_only"] for v in master["variants"]] == [False, False, True, True]
+        assert master["variants"][0]["uri"] == "https://cdn.example.com/live/1080p.m3u8"
+
+
+class TestChooseRendition:
+    def test_prefers_audio_media_of_cheapest_group(self):
+        choice = choose_rendition(parse_master_playlist(WITH_MEDIA, BASE))
+        assert choice["kind"] == "audio rendition"
+        assert choice["uri"].endswith("audio/lo_en.m3u8")
+
+    def test_language_preference(self):
+        choice = choose_rendition(parse_master_playlist(WITH_MEDIA, BASE), language="fr")
+        assert choice["uri"].endswith("audio/lo_fr.m3u8")
+
+    def test_audio_only_variant_above_floor(self):
+        choice = choose_rendition(parse_master_playlist(WITH_AUDIO_ONLY_VARIANT, BASE))
+        assert choice["kind"] == "audio-only variant"
+        assert choice["uri"].endswith("audio64.m3u8")
+
+    def test_floor_excludes_low_quality_audio(self):
+        choice = choose_rendition(parse_master_playlist(MUXED_ONLY, BASE))
+        assert choice["kind"] == "lowest-bandwidth variant"
+        assert choice["uri"].endswith("360p.m3u8")
+
+    def test_floor_configurable(self):
+        choice = choose_rendition(parse_master_playlist(MUXED_ONLY, BASE), min_bandwidth=0)
+        assert choice["uri"].endswith("tiny_audio.m3u8")
+
+
+    @pytest.mark.parametrize("min_bandwidth,expected", [
+        (32_000, "audio/hi.m3u8"),
+        (0, "audio/lo.m3u8"),
+        (10_000_000, "audio/lo.m3u8"),
+    ])
+    def test_floor_applies_to_audio_groups(self, min_bandwidth, expected):
+        master = parse_master_playlist(WITH_LOW_MEDIA, BASE)
+        choice = choose_rendition(master, min_bandwidth=min_bandwidth)
+        assert choice["kind"] == "audio rendition"
+        assert choice["uri"].endswith(expected)
+
+
+@pytest.fixture
+def hls_server():
+    files = {
+        "/master.m3u8": WITH_AUDIO_ONLY_VARIANT,
+        "/media.m3u8": MEDIA,
+        "/audio64.m3u8": MEDIA,
+    }
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = files.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            data = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+class TestSelectRendition:
+    def test_reports_savings(self, hls_server):
+        choice = select_rendition(hls_server + "/master.m3u8")
+        assert choice["uri"] == hls_server + "/audio64.m3u8"
+        assert choice["duration"] == 60.0
+        assert choice["estimated_bytes"] == 64000 * 60 // 8
+        assert choice["default_estimated_bytes"] == 5000000 * 60 // 8
+
+    def test_media_playlist_is_left_alone(self, hls_server):
+        assert select_rendition(hls_server + "/media.m3u8") is None
+
+
+class TestParseSegments:
+    def test_sequence_offsets_and_flags(self):
+        text = (
+            "#EXTM3U\n#EXT-X-MEDIA-SEQUENCE:40\n"
+            '#EXT-X-MAP:URI="init.mp4"\n'
+            "#EXTINF:4.0,\na.m4s\n#EXTINF:6.5,\nb.m4s\n#EXT-X-ENDLIST\n"
+        )
+        parsed = parse_segments(text, BASE)
+        assert [(s["sequence"], s["start"], s["duration"]) for s in parsed["segments"]] == [
+            (40, 0.0, 4.0), (41, 4.0, 6.5),
+        ]
+        assert parsed["segments"][0]["uri"] == "https://cdn.example.com/live/a.m4s"
+        assert parsed["init"] == "https://cdn.example.com/live/init.mp4"
+        assert parsed["ended"] and not parsed["encrypted"]
+
+    def test_encryption_detected(self):
+        text = '#EXTM3U\n#EXT-X-KEY:METHOD=AES-128,URI="k"\n#EXTINF:4,\na.ts\n'
+        assert parse_segments(text, BASE)["encrypted"]
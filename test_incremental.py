@@ -0,0 +1,158 @@
+"""Tests for incremental re-transcription of growing HLS playlists."""
+
+import hashlib
+import http.server
+import threading
+
+import pytest
+
+import incremental
+import main
+from incremental import load_state, state_path, update_transcript
+
+SEGMENT_SECONDS = 10.0
+
+
+class FakeOrigin:
+    """A tiny HLS origin whose playlist and segments tests can edit."""
+
+    def __init__(self):
+        self.files = {}
+        self.segment_downloads = 0
+        origin = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = origin.files.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                if self.path.endswith(".ts"):
+                    origin.segment_downloads += 1
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def publish(self, names):
+        """Serve a media playlist listing segment *names* (bytes = the name)."""
+        lines = ["#EXTM3U", "#EXT-X-MEDIA-SEQUENCE:0"]
+        for name in names:
+            lines += [f"#EXTINF:{SEGMENT_SECONDS},", f"{name}.ts"]
+            self.files.setdefault(f"/{name}.ts", f"{name}|".encode())
+        self.files["/media.m3u8"] = ("\n".join(lines) + "\n").encode()
+
+
+@pytest.fixture
+def origin():
+    srv = FakeOrigin()
+    yield srv
+    srv.server.shutdown()
+    srv.server.server_close()
+
+
+@pytest.fixture
+def fake_whisper(monkeypatch):
+    """Each ``name|`` in the run file becomes one segment of that media segment."""
+    calls = []
+
+    def fake_transcribe(path, model_name="base", language=None, transcribe_options=None):
+        with open(path, "rb") as fh:
+            names = [n.decode() for n in fh.read().split(b"|") if n]
+        calls.append({"names": names, "options": transcribe_options})
+        return {
+            "language": "en",
+            "segments": [
+                {"start": i * SEGMENT_SECONDS + 1, "end": i * SEGMENT_SECONDS + 9, "text": f" {n}"}
+                for i, n in enumerate(names)
+            ],
+        }
+
+    monkeypatch.setattr(incremental, "transcribe_audio", fake_transcribe)
+    return calls
+
+
+def _run(origin, tmp_path):
+    return update_transcript(
+        origin.url + "/media.m3u8",
+        output_path=str(tmp_path / "out.txt"),
+        output_format="txt",
+        index_path=None,
+        state_dir=str(tmp_path / "state"),
+    )
+
+
+def _lines(path):
+    return [line for line in open(path, encoding="utf-8").read().splitlines() if line.startswith("[")]
+
+
+class TestIncremental:
+    def test_extended_playlist_transcribes_only_new_segments(self, origin, fake_whisper, tmp_path):
+        origin.publish(["a", "b", "c"])
+        out = _run(origin, tmp_path)
+        assert [c["names"] for c in fake_whisper] == [["a", "b", "c"]]
+
+        origin.publish(["a", "b", "c", "d", "e"])
+        downloads = origin.segment_downloads
+        assert _run(origin, tmp_path) == out
+        assert [c["names"] for c in fake_whisper][1:] == [["d", "e"]]
+        # Unchanged segments were answered with 304, not downloaded again
+        assert origin.segment_downloads - downloads == 2
+        # The new run is primed with the text before it
+        assert fake_whisper[1]["options"] == {"initial_prompt": "a b c"}
+
+        lines = _lines(out)
+        assert [line.split("]")[1].strip() for line in lines] == ["a", "b", "c", "d", "e"]
+        assert lines[3].startswith("[0:00:31 - 0:00:39]")
+
+    def test_changed_segment_is_retranscribed(self, origin, fake_whisper, tmp_path):
+        origin.publish(["a", "b", "c"])
+        out = _run(origin, tmp_path)
+        origin.files["/b.ts"] = b"B2|"
+        _run(origin, tmp_path)
+
+        assert [c["names"] for c in fake_whisper] == [["a", "b", "c"], ["B2"]]
+        assert [line.split("]")[1].strip() for line in _lines(out)] == ["a", "B2", "c"]
+
+    def test_unchanged_playlist_is_a_no_op(self, origin, fake_whisper, tmp_path):
+        origin.publish(["a", "b"])
+        _run(origin, tmp_path)
+        _run(origin, tmp_path)
+        assert len(fake_whisper) == 1
+
+        state = load_state(state_path(origin.url + "/media.m3u8", str(tmp_path / "state")))
+        assert [s["sequence"] for s in state["segments"]] == [0, 1]
+        assert state["language"] == "en"
+
+    def test_model_change_starts_over(self, origin, fake_whisper, tmp_path):
+        origin.publish(["a", "b"])
+        _run(origin, tmp_path)
+        update_transcript(
+            origin.url + "/media.m3u8", output_format="txt", model_name="tiny",
+            index_path=None, state_dir=str(tmp_path / "state"),
+        )
+        assert [c["names"] for c in fake_whisper] == [["a", "b"], ["a", "b"]]
+
+
+@pytest.mark.parametrize("flags", [
+    ["--keep-audio"], ["--bounded-memory"], ["--refine-model", "small"],
+    ["--diarize"], ["--profile"],
+])
+def test_cli_rejects_options_incremental_ignores(flags, capsys):
+    with pytest.raises(SystemExit) as info:
+        main.main(["https://example.com/live.m3u8", "--incremental", *flags])
+    assert info.value.code == 2
+    assert f"--incremental cannot be combined with {flags[0]}" in capsys.readouterr().err
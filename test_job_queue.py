@@ -0,0 +1,141 @@
+"""Tests for the download-pool / single-inference-worker job queue."""
+
+import queue
+import threading
+import time
+
+import pytest
+
+import job_queue
+from job_queue import CANCELLED, DONE, FAILED, JobQueue
+
+
+@pytest.fixture
+def fake_pipeline(monkeypatch, tmp_path):
+    """Replace network and model calls with instrumented fakes."""
+    state = {
+        "downloading": 0, "max_downloading": 0,
+        "transcribing": 0, "max_transcribing": 0,
+        "transcribed": [], "delays": {}, "fail": set(),
+        "gate": threading.Event(),
+    }
+    state["gate"].set()
+    lock = threading.Lock()
+    counter = iter(range(10_000))
+
+    def fake_temp():
+        path = tmp_path / f"audio_{next(counter)}.mp3"
+        path.write_bytes(b"")
+        return str(path)
+
+    def fake_download(url, path, **kwargs):
+        with lock:
+            state["downloading"] += 1
+            state["max_downloading"] = max(state["max_downloading"], state["downloading"])
+        try:
+            state["gate"].wait(5)
+            time.sleep(state["delays"].get(url, 0.01))
+            if url in state["fail"]:
+                raise RuntimeError("boom")
+            return path
+        finally:
+            with lock:
+                state["downloading"] -= 1
+
+    def fake_transcribe(audio_path, url, output, on_status=None, **kwargs):
+        with lock:
+            state["transcribing"] += 1
+            state["max_transcribing"] = max(state["max_transcribing"], state["transcribing"])
+        time.sleep(0.01)
+        on_status("Transcribing with 'tiny' model...")
+        with lock:
+            state["transcribing"] -= 1
+            state["transcribed"].append(url)
+        return {"segments": []}
+
+    monkeypatch.setattr(job_queue, "make_temp_audio_path", fake_temp)
+    monkeypatch.setattr(job_queue, "download_audio", fake_download)
+    monkeypatch.setattr(job_queue, "transcribe_to_output", fake_transcribe)
+    monkeypatch.setattr(job_queue, "resolve_output_path", lambda out, fmt="pdf": out or "x." + fmt)
+    return state
+
+
+def _drain(events):
+    out = []
+    while True:
+        try:
+            out.append(events.get_nowait())
+        except queue.Empty:
+            return out
+
+
+class TestJobQueue:
+    def test_downloads_concurrent_inference_serial_and_ordered(self, fake_pipeline):
+        urls = [f"https://example.com/{i}.m3u8" for i in range(6)]
+        # Later URLs download faster; transcription must still follow submission order
+        fake_pipeline["delays"] = {u: 0.05 * (6 - i) for i, u in enumerate(urls)}
+        events = queue.Queue()
+        jq = JobQueue(on_event=events.put, download_workers=3)
+        for url in urls:
+            jq.submit(url, model_name="tiny")
+        jq.shutdown(wait=True)
+
+        assert fake_pipeline["transcribed"] == urls
+        assert fake_pipeline["max_transcribing"] == 1
+        assert fake_pipeline["max_downloading"] == 3
+        assert all(job.state == DONE for job in jq.jobs())
+
+    def test_failed_download_does_not_block_queue(self, fake_pipeline):
+        fake_pipeline["fail"] = {"https://example.com/bad.m3u8"}
+        events = queue.Queue()
+        jq = JobQueue(on_event=events.put)
+        bad = jq.submit("https://example.com/bad.m3u8")
+        good = jq.submit("https://example.com/good.m3u8")
+        jq.shutdown(wait=True)
+
+        states = {job.id: job.state for job in jq.jobs()}
+        assert states == {bad: FAILED, good: DONE}
+        assert fake_pipeline["transcribed"] == ["https://example.com/good.m3u8"]
+
+    def test_cancel_pending(self, fake_pipeline):
+        fake_pipeline["gate"].clear()
+        events = queue.Queue()
+        jq = JobQueue(on_event=events.put, download_workers=1)
+        for i in range(4):
+            jq.submit(f"https://example.com/{i}.m3u8")
+        assert jq.cancel_pending() == 4
+        fake_pipeline["gate"].set()
+        jq.shutdown(wait=True)
+
+        assert fake_pipeline["transcribed"] == []
+        assert {job.state for job in jq.jobs()} == {CANCELLED}
+        # No job reports progress after it was cancelled
+        last = {}
+        for event in _drain(events):
+            last[event["job"]] = event["state"]
+        assert set(last.values()) == {CANCELLED}
+
+    def test_events_carry_progress(self, fake_pipeline):
+        events = queue.Queue()
+        jq = JobQueue(on_event=events.put)
+        jq.submit("https://example.com/a.m3u8")
+        jq.shutdown(wait=True)
+
+        seen = _drain(events)
+        assert seen[0]["state"] == "queued" and seen[0]["progress"] == 0.0
+        assert seen[-1]["state"] == DONE and seen[-1]["progress"] == 1.0
+        progress = [e["progress"] for e in seen]
+        assert progress == sorted(progress)
+
+    def test_parallel_inference_workers_use_separate_model_slots(self, fake_pipeline, monkeypatch):
+        slots = []
+        monkeypatch.setattr(job_queue, "set_model_slot", slots.append)
+        events = queue.Queue()
+        jq = JobQueue(on_event=events.put, download_workers=4, inference_workers=2)
+        for i in range(8):
+            jq.submit(f"https://example.com/{i}.m3u8")
+        jq.shutdown(wait=True)
+
+        assert sorted(slots) == [0, 1]
+        assert fake_pipeline["max_transcribing"] <= 2
+        assert sorted(fake_pipeline["transcribed"]) == sorted(f"https://example.com/{i}.m3u8" for i in range(8))
@@ -0,0 +1,103 @@
+"""Tests for the structured / async logging setup."""
+
+import json
+import logging
+import threading
+
+import pytest
+
+from logger import job_context, log_stage, setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def clean_root():
+    """Let each test install its own handlers and remove them afterwards."""
+    root = logging.getLogger()
+    level = root.level
+    shutdown_logging()
+    yield root
+    shutdown_logging()
+    root.setLevel(level)
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestStructuredLogging:
+    def test_json_lines_carry_job_stage_and_timing(self, clean_root, tmp_path):
+        log_file = tmp_path / "run.log"
+        setup_logging(log_file=str(log_file), json_format=True)
+        log = logging.getLogger("test.json")
+
+        with job_context(7), log_stage("download", log):
+            log.info("fetching %s", "a.m3u8", extra={"bytes": 10})
+        log.info("outside")
+        shutdown_logging()
+
+        inside, finished, outside = _records(log_file)
+        assert inside["message"] == "fetching a.m3u8"
+        assert inside["job"] == "7" and inside["stage"] == "download"
+        assert inside["stage_elapsed"] >= 0 and inside["bytes"] == 10
+        assert finished["stage"] == "download" and finished["duration"] >= 0
+        assert "job" not in outside and "stage" not in outside
+
+    def test_failed_stage_logs_error(self, clean_root, tmp_path):
+        log_file = tmp_path / "run.log"
+        setup_logging(log_file=str(log_file), json_format=True)
+        with pytest.raises(ValueError), log_stage("write"):
+            raise ValueError("disk full")
+        shutdown_logging()
+
+        (record,) = _records(log_file)
+        assert record["level"] == "ERROR" and "duration" in record
+
+    def test_async_mode_keeps_context_across_threads(self, clean_root, tmp_path):
+        log_file = tmp_path / "run.log"
+        setup_logging(log_file=str(log_file), json_format=True, async_mode=True)
+        log = logging.getLogger("test.async")
+
+        def work(job_id):
+            with job_context(job_id):
+                for i in range(50):
+                    log.info("line %d", i)
+
+        threads = [threading.Thread(target=work, args=(f"job{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        shutdown_logging()
+
+        records = _records(log_file)
+        assert len(records) == 200
+        assert {r["job"] for r in records} == {f"job{i}" for i in range(4)}
+        # Records are still tagged with the producing thread, not the listener
+        assert all(r["thread"].startswith("Thread-") for r in records)
+
+    def test_rotation(self, clean_root, tmp_path):
+        log_file = tmp_path / "run.log"
+        setup_logging(log_file=str(log_file), max_bytes=500, backup_count=2)
+        log = logging.getLogger("test.rotate")
+        for i in range(100):
+            log.info("message number %d", i)
+        shutdown_logging()
+
+        names = sorted(p.name for p in tmp_path.iterdir())
+        assert names == ["run.log", "run.log.1", "run.log.2"]
+        assert all(p.stat().st_size <= 500 for p in tmp_path.iterdir())
+
+    def test_per_job_files(self, clean_root, tmp_path):
+        jobs = tmp_path / "jobs"
+        setup_logging(job_log_dir=str(jobs), async_mode=True)
+        log = logging.getLogger("test.jobs")
+        with job_context("talk/2024"):
+            log.info("first job")
+        with job_context(2):
+            log.info("second job")
+        log.info("no job")
+        shutdown_logging()
+
+        assert sorted(p.name for p in jobs.iterdir()) == ["2.log", "talk_2024.log"]
+        assert "first job" in (jobs / "talk_2024.log").read_text()
+        assert "no job" not in (jobs / "2.log").read_text()
@@ -1,12 +1,26 @@
 """Tests for the M3U8 Transcript Generator."""
 
+import json
 import os
 
+import numpy as np
 import pytest
 
 from pdf_writer import create_pdf, format_seconds
 from transcriber import VALID_MODELS
-from writers import write_pdf, write_srt, write_txt, write_transcript, SUPPORTED_FORMATS
+from writers import (
+    NdjsonStream,
+    _srt_timestamp,
+    _srt_timestamps,
+    format_seconds_bulk,
+    write_json,
+    write_ndjson,
+    write_pdf,
+    write_srt,
+    write_txt,
+    write_transcript,
+    SUPPORTED_FORMATS,
+)
 
 
 # ---------------------------------------------------------------------------
@@ -119,6 +133,120 @@ class TestWriteTxt:
         assert "Model:  base" in content
 
 
+class TestBulkFormatting:
+    """The bulk formatters must match the scalar ones byte for byte."""
+
+    EDGES = [0, 0.0004, 0.9995, 5.9, 5.9999996, 59.9999999, 3599.9999996, 3600, 36000.5, 172800.4,
+             86399.9999999, 86400, 90061.25, 360000.001, 12, -0.5, 2e9]
+
+    def _values(self):
+        rng = np.random.default_rng(0)
+        return (self.EDGES + rng.uniform(0, 20000, 5000).tolist() + rng.uniform(0, 1e6, 500).tolist()
+                + (rng.integers(0, 20000, 500) / 1000).tolist())
+
+    def test_format_seconds_bulk(self):
+        values = self._values()
+        assert format_seconds_bulk(values) == [format_seconds(v) for v in values]
+
+    def test_srt_timestamps(self):
+        values = self._values()
+        assert _srt_timestamps(values) == [_srt_timestamp(v) for v in values]
+
+    def test_empty(self):
+        assert format_seconds_bulk([]) == [] and _srt_timestamps([]) == []
+
+    def test_writers_unchanged(self, tmp_path):
+        values = sorted(self._values()[:400])
+        segments = [{"start": a, "end": b, "text": f" line {i} \u00e9"} for i, (a, b) in enumerate(zip(values, values[1:]))]
+        expected_srt = "".join(
+            f"{i}\n{_srt_timestamp(s['start'])} --> {_srt_timestamp(s['end'])}\n{s['text'].strip()}\n\n"
+            for i, s in enumerate(segments, start=1)
+        )
+        expected_txt = "".join(
+            f"[{format_seconds(s['start'])} - {format_seconds(s['end'])}]  {s['text'].strip()}\n"
+            for s in segments
+        )
+        write_srt(segments, str(tmp_path / "a.srt"))
+        write_txt(segments, str(tmp_path / "a.txt"))
+        assert (tmp_path / "a.srt").read_bytes() == expected_srt.encode("utf-8")
+        assert (tmp_path / "a.txt").read_bytes() == expected_txt.encode("utf-8")
+
+
+# ---------------------------------------------------------------------------
+# JSON / NDJSON writers
+# ---------------------------------------------------------------------------
+
+class TestWriteJson:
+    def test_document(self, tmp_path):
+        output = str(tmp_path / "test.json")
+        segments = [dict(SAMPLE_SEGMENTS[0], model="tiny", tokens=[1, 2])] + SAMPLE_SEGMENTS[1:]
+        write_json(segments, output, SAMPLE_METADATA)
+        with open(output, encoding="utf-8") as fh:
+            doc = json.load(fh)
+        assert doc["metadata"] == SAMPLE_METADATA
+        assert doc["segments"][0] == {
+            "id": 0, "start": 0.0, "end": 5.0, "text": "This is the first segment.", "model": "tiny",
+        }
+        assert [s["id"] for s in doc["segments"]] == [0, 1, 2]
+
+    def test_stdout(self, capsys):
+        write_json(SAMPLE_SEGMENTS, "-", SAMPLE_METADATA)
+        assert len(json.loads(capsys.readouterr().out)["segments"]) == 3
+
+
+class TestNdjson:
+    def test_lines(self, tmp_path):
+        output = str(tmp_path / "test.ndjson")
+        write_ndjson(SAMPLE_SEGMENTS, output, SAMPLE_METADATA)
+        with open(output, encoding="utf-8") as fh:
+            lines = [json.loads(line) for line in fh]
+        assert [line["type"] for line in lines] == ["metadata", "segment", "segment", "segment", "done"]
+        assert lines[0]["source_url"] == SAMPLE_METADATA["source_url"]
+        assert lines[2]["text"] == SAMPLE_SEGMENTS[1]["text"].strip()
+        assert lines[-1]["segments"] == 3
+
+    def test_stream_flushes_each_segment(self, capsys):
+        stream = NdjsonStream("-", SAMPLE_METADATA)
+        stream.write_segment(SAMPLE_SEGMENTS[0])
+        # Visible before the stream is closed
+        assert capsys.readouterr().out.count("\n") == 2
+        stream.close(complete=False)
+        assert capsys.readouterr().out == ""
+
+    def test_srt_and_txt_to_stdout(self, capsys):
+        write_srt(SAMPLE_SEGMENTS, "-")
+        write_txt(SAMPLE_SEGMENTS, "-")
+        out = capsys.readouterr().out
+        assert "00:00:00,000 --> 00:00:05,000" in out
+        assert "[0:00:15 - 0:00:20]  Final segment." in out
+
+
+class TestStreamingPipeline:
+    def test_ndjson_segments_emitted_during_transcription(self, tmp_path, monkeypatch):
+        import workflow
+        output = str(tmp_path / "live.ndjson")
+        audio = tmp_path / "a.mp3"
+        audio.write_bytes(b"")
+        lines_seen = []
+
+        def fake_transcribe(audio_path, on_segment=None, bounded_memory=False, **kwargs):
+            assert bounded_memory and on_segment
+            for seg in SAMPLE_SEGMENTS:
+                on_segment(seg)
+                with open(output, encoding="utf-8") as fh:
+                    lines_seen.append(len(fh.readlines()))
+            return {"segments": SAMPLE_SEGMENTS}
+
+        monkeypatch.setattr(workflow, "transcribe_audio", fake_transcribe)
+        workflow.transcribe_to_output(
+            str(audio), "https://example.com/a.m3u8", output,
+            output_format="ndjson", index_path=None,
+        )
+        assert lines_seen == [2, 3, 4]
+        with open(output, encoding="utf-8") as fh:
+            assert json.loads(fh.readlines()[-1]) == {"type": "done", "segments": 3}
+
+
 # ---------------------------------------------------------------------------
 # Dispatcher
 # ---------------------------------------------------------------------------
@@ -182,3 +310,28 @@ class TestDownloadValidation:
         from transcriber import download_audio
         with pytest.raises(ValueError, match="http"):
             download_audio("ftp://example.com/stream.m3u8", "/tmp/test.mp3")
+
+
+# ---------------------------------------------------------------------------
+# Output path resolution
+# ---------------------------------------------------------------------------
+
+class TestResolveOutputPath:
+    def test_stdout_passthrough(self):
+        from workflow import resolve_output_path
+        assert resolve_output_path("-", fmt="ndjson") == "-"
+
+    def test_custom_path_creates_parent(self, tmp_path):
+        from workflow import resolve_output_path
+        target = tmp_path / "nested" / "out.txt"
+        assert resolve_output_path(str(target), fmt="txt") == str(target)
+        assert target.parent.is_dir()
+
+    def test_auto_paths_never_collide(self, tmp_path, monkeypatch):
+        import workflow
+        monkeypatch.setattr(workflow, "TRANSCRIPTS_DIR", str(tmp_path))
+        first = workflow.resolve_output_path(None, fmt="srt")
+        open(first, "w").close()
+        second = workflow.resolve_output_path(None, fmt="srt")
+        assert second != first
+        assert second.endswith(".srt")
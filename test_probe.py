@@ -0,0 +1,213 @@
+"""Tests for pre-flight stream probing and shortest-job-first scheduling."""
+
+import http.server
+import queue
+import threading
+import time
+
+import pytest
+
+import job_queue
+from job_queue import DONE, FAILED, JobQueue
+from probe import check_limits, format_duration, parse_duration, probe_stream, sort_key
+from resources import plan_resources
+
+PLAN = plan_resources("base", resources={"cpus": 8, "cpu_quota": None, "memory": None, "gpu": False})
+
+
+def _media(n, seconds=6.0, extra=""):
+    return "#EXTM3U\n" + extra + "".join(f"#EXTINF:{seconds},\ns{i}.ts\n" for i in range(n)) + "#EXT-X-ENDLIST\n"
+
+
+FILES = {
+    "/master.m3u8": (
+        '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=2000000,RESOLUTION=1280x720,CODECS="avc1.4d401f,mp4a.40.2"\n'
+        'video.m3u8\n#EXT-X-STREAM-INF:BANDWIDTH=64000,CODECS="mp4a.40.2"\naudio.m3u8\n'
+    ),
+    "/audio.m3u8": _media(100),
+    "/video.m3u8": _media(100),
+    "/silent.m3u8": '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=2000000,CODECS="avc1.4d401f"\nvideo.m3u8\n',
+    "/drm.m3u8": _media(3, extra='#EXT-X-KEY:METHOD=SAMPLE-AES,URI="skd://key",KEYFORMAT="com.apple.streamingkeydelivery"\n'),
+    "/aes.m3u8": _media(3, extra='#EXT-X-KEY:METHOD=AES-128,URI="key.bin"\n'),
+    "/live.m3u8": "#EXTM3U\n#EXTINF:6.0,\ns0.ts\n",
+}
+
+
+@pytest.fixture(scope="module")
+def server():
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = FILES.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            data = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+class TestProbe:
+    def test_master_playlist(self, server):
+        info = probe_stream(server + "/master.m3u8", plan=PLAN)
+        assert info["problems"] == []
+        assert info["media_url"] == server + "/audio.m3u8"
+        assert info["duration"] == 600.0 and info["segment_count"] == 100
+        assert info["estimated_bytes"] == 64000 * 600 // 8
+        assert info["estimated_compute_seconds"] == pytest.approx(600 * 0.08)
+        assert not info["live"]
+
+    def test_bigger_model_costs_more(self, server):
+        tiny = probe_stream(server + "/master.m3u8", model_name="tiny", plan=PLAN)
+        large = probe_stream(server + "/master.m3u8", model_name="large", plan=PLAN)
+        assert tiny["estimated_compute_seconds"] < large["estimated_compute_seconds"]
+
+    @pytest.mark.parametrize("path, problem", [
+        ("/silent.m3u8", "no audio"),
+        ("/drm.m3u8", "DRM"),
+        ("/missing.m3u8", "unreachable"),
+    ])
+    def test_bad_inputs(self, server, path, problem):
+        info = probe_stream(server + path, plan=PLAN)
+        assert len(info["problems"]) == 1 and problem in info["problems"][0]
+
+    def test_plain_aes_is_not_drm(self, server):
+        assert probe_stream(server + "/aes.m3u8", plan=PLAN)["problems"] == []
+
+    def test_live_playlist_noted(self, server):
+        info = probe_stream(server + "/live.m3u8", plan=PLAN)
+        assert info["live"] and info["notes"]
+
+    def test_limits(self, server):
+        info = probe_stream(server + "/master.m3u8", plan=PLAN)
+        assert check_limits(info) == []
+        assert check_limits(info, max_duration=599) == ["duration 10m00s exceeds limit 9m59s"]
+        assert "estimated size" in check_limits(info, max_bytes=1_000_000)[0]
+        # Unknown sizes never trip a limit
+        assert check_limits(probe_stream("https://example.com/watch?v=1"), max_duration=1) == []
+
+
+class TestHelpers:
+    def test_parse_duration(self):
+        assert parse_duration("90") == 90
+        assert parse_duration("45m") == 2700
+        assert parse_duration("1.5h") == 5400
+        with pytest.raises(ValueError):
+            parse_duration("soon")
+
+    def test_format_duration(self):
+        assert format_duration(3723) == "1h02m03s"
+        assert format_duration(None) == "?"
+
+    def test_sort_key_unknown_last(self):
+        assert sort_key({"estimated_compute_seconds": 5.0}) < sort_key({"estimated_compute_seconds": None})
+        assert sort_key(None) == float("inf")
+
+
+@pytest.fixture
+def scheduled_pipeline(monkeypatch, tmp_path):
+    """Fake probe/download/transcribe where each URL's length is in its name."""
+    transcribed = []
+    gate = threading.Event()
+
+    def fake_probe(url, **kwargs):
+        seconds = float(url.rsplit("/", 1)[1])
+        return {"duration": seconds, "estimated_bytes": None,
+                "estimated_compute_seconds": seconds / 10, "problems": []}
+
+    def fake_download(url, path, **kwargs):
+        return path
+
+    def fake_transcribe(audio_path, url, output, on_status=None, **kwargs):
+        gate.wait(5)
+        transcribed.append(url.rsplit("/", 1)[1])
+        return {"segments": []}
+
+    counter = iter(range(1000))
+    monkeypatch.setattr(job_queue, "probe_stream", fake_probe)
+    monkeypatch.setattr(job_queue, "download_audio", fake_download)
+    monkeypatch.setattr(job_queue, "transcribe_to_output", fake_transcribe)
+    monkeypatch.setattr(job_queue, "make_temp_audio_path", lambda: str(tmp_path / f"{next(counter)}.mp3"))
+    monkeypatch.setattr(job_queue, "resolve_output_path", lambda out, fmt="pdf": "x." + fmt)
+    return transcribed, gate
+
+
+class TestShortestFirst:
+    def test_ready_jobs_run_shortest_first(self, scheduled_pipeline):
+        transcribed, gate = scheduled_pipeline
+        jq = JobQueue(on_event=queue.Queue().put, download_workers=4, shortest_first=True)
+        # The first job occupies the worker while the rest are downloaded
+        jq.submit("https://example.com/500")
+        time.sleep(0.2)
+        for seconds in ("900", "60", "3000", "300"):
+            jq.submit(f"https://example.com/{seconds}")
+        time.sleep(0.2)
+        gate.set()
+        jq.shutdown(wait=True)
+
+        assert transcribed == ["500", "60", "300", "900", "3000"]
+        assert {job.state for job in jq.jobs()} == {DONE}
+
+    def test_short_job_downloaded_first_when_submitted_last(self, scheduled_pipeline, monkeypatch):
+        transcribed, gate = scheduled_pipeline
+        gate.set()
+        probe = job_queue.probe_stream
+        downloaded = []
+
+        def slow_probe(url, **kwargs):
+            time.sleep(0.1)
+            return probe(url, **kwargs)
+
+        monkeypatch.setattr(job_queue, "probe_stream", slow_probe)
+        monkeypatch.setattr(job_queue, "download_audio", lambda url, path, **kw: downloaded.append(url))
+        jq = JobQueue(on_event=queue.Queue().put, download_workers=1, shortest_first=True)
+        jq.submit("https://example.com/3000")
+        jq.submit("https://example.com/60")
+        jq.shutdown(wait=True)
+
+        assert [url.rsplit("/", 1)[1] for url in downloaded] == ["60", "3000"]
+        assert transcribed == ["60", "3000"]
+
+    @pytest.mark.parametrize("shortest_first", [False, True])
+    def test_failing_probe_fails_job_without_blocking(self, scheduled_pipeline, monkeypatch, shortest_first):
+        transcribed, gate = scheduled_pipeline
+        gate.set()
+        probe = job_queue.probe_stream
+
+        def flaky_probe(url, **kwargs):
+            if url.endswith("/0"):
+                raise OSError("playlist unreachable")
+            return probe(url, **kwargs)
+
+        monkeypatch.setattr(job_queue, "probe_stream", flaky_probe)
+        jq = JobQueue(on_event=queue.Queue().put, max_duration=3600, shortest_first=shortest_first)
+        bad = jq.submit("https://example.com/0")
+        ok = jq.submit("https://example.com/60")
+        jq.shutdown(wait=True)
+
+        jobs = {job.id: job for job in jq.jobs()}
+        assert jobs[bad].state == FAILED and "unreachable" in jobs[bad].error
+        assert jobs[ok].state == DONE and transcribed == ["60"]
+
+    def test_oversized_jobs_rejected_before_download(self, scheduled_pipeline):
+        transcribed, gate = scheduled_pipeline
+        gate.set()
+        jq = JobQueue(on_event=queue.Queue().put, max_duration=3600)
+        ok = jq.submit("https://example.com/600")
+        big = jq.submit("https://example.com/72000")
+        jq.shutdown(wait=True)
+
+        states = {job.id: job for job in jq.jobs()}
+        assert states[ok].state == DONE
+        assert states[big].state == FAILED and "exceeds limit" in states[big].error
+        assert transcribed == ["600"]
@@ -0,0 +1,92 @@
+"""Tests for the per-stage profiler."""
+
+import pstats
+import threading
+import time
+
+import pytest
+import torch
+
+from profiling import TORCH_ACTIVE_STEPS, StageProfiler
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+class TinyWhisper(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.encoder = torch.nn.Linear(8, 8)
+        self.decoder = torch.nn.Linear(8, 8)
+
+    def forward(self, x):
+        return self.decoder(self.encoder(x))
+
+
+class TestStageProfiler:
+    def test_report_files(self, tmp_path):
+        prof = StageProfiler(interval=0.001)
+        with prof.stage("download"):
+            _busy(0.05)
+        with prof.stage("transcribe"):
+            _busy(0.05)
+
+        paths = prof.write_report(str(tmp_path / "talk.pdf"))
+        assert [p.rsplit("/", 1)[1] for p in paths] == [
+            "talk.prof", "talk.collapsed", "talk.profile.txt",
+        ]
+
+        stats = pstats.Stats(paths[0])
+        assert any(func[2] == "_busy" for func in stats.stats)
+
+        collapsed = open(paths[1]).read().splitlines()
+        roots = {line.split(";", 1)[0] for line in collapsed}
+        assert roots == {"download", "transcribe"}
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed)
+
+        summary = open(paths[2]).read()
+        assert "download" in summary and "transcribe" in summary
+
+    def test_inference_times_encoder_and_decoder(self):
+        model = TinyWhisper()
+        prof = StageProfiler()
+        with prof.stage("transcribe"), prof.inference({"tiny": model}):
+            for _ in range(3):
+                model(torch.zeros(1, 8))
+
+        summary = prof.summary()
+        assert "tiny.encoder" in summary and "tiny.decoder" in summary
+        assert "Torch operators" in summary
+        # Hooks are removed once the block exits
+        assert not model.encoder._forward_hooks and not model.encoder._forward_pre_hooks
+
+    def test_torch_trace_is_bounded(self):
+        model = TinyWhisper()
+        prof = StageProfiler()
+        with prof.stage("transcribe"), prof.inference({"tiny": model}):
+            for _ in range(50):
+                model(torch.zeros(1, 8))
+
+        rows = [line.split() for line in prof.summary().splitlines() if line.lstrip().startswith("aten::addmm")]
+        # Encoder and decoder run one addmm each per recorded pass
+        assert rows and int(rows[0][-1]) == 2 * TORCH_ACTIVE_STEPS
+
+    def test_sampler_stops_when_stage_raises(self):
+        model = TinyWhisper()
+        prof = StageProfiler(interval=0.001)
+        with pytest.raises(RuntimeError):
+            with prof.stage("transcribe"), prof.inference({"tiny": model}):
+                model(torch.zeros(1, 8))
+                raise RuntimeError("inference failed")
+        assert not [t for t in threading.enumerate() if t.name == "stack-sampler"]
+        assert not model.encoder._forward_hooks
+
+    def test_disabled_is_noop(self, tmp_path):
+        prof = StageProfiler(enabled=False)
+        with prof.stage("download"), prof.inference({"tiny": TinyWhisper()}):
+            pass
+        assert prof.write_report(str(tmp_path / "talk.pdf")) == []
+        assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,88 @@
+"""Tests for hardware detection and thread/worker planning."""
+
+import torch
+
+from resources import (
+    MODEL_MEMORY_BYTES,
+    apply_plan,
+    cgroup_cpu_limit,
+    cgroup_memory_limit,
+    plan_resources,
+)
+
+GIB = 1024 ** 3
+
+
+def _machine(cpus=64, quota=None, memory=256 * GIB, gpu=False):
+    return {"cpus": cpus, "cpu_quota": quota, "memory": memory, "gpu": gpu}
+
+
+class TestCgroupDetection:
+    def test_v2_quota_and_memory(self, tmp_path):
+        (tmp_path / "cpu.max").write_text("250000 100000\n")
+        (tmp_path / "memory.max").write_text(str(8 * GIB))
+        (tmp_path / "memory.current").write_text(str(2 * GIB))
+        assert cgroup_cpu_limit(str(tmp_path)) == 2.5
+        assert cgroup_memory_limit(str(tmp_path)) == 6 * GIB
+
+    def test_v2_unlimited(self, tmp_path):
+        (tmp_path / "cpu.max").write_text("max 100000\n")
+        (tmp_path / "memory.max").write_text("max\n")
+        assert cgroup_cpu_limit(str(tmp_path)) is None
+        assert cgroup_memory_limit(str(tmp_path)) is None
+
+    def test_v1(self, tmp_path):
+        (tmp_path / "cpu").mkdir()
+        (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("400000")
+        (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000")
+        (tmp_path / "memory").mkdir()
+        (tmp_path / "memory" / "memory.limit_in_bytes").write_text(str(9223372036854771712))
+        assert cgroup_cpu_limit(str(tmp_path)) == 4.0
+        assert cgroup_memory_limit(str(tmp_path)) is None
+
+    def test_missing_files(self, tmp_path):
+        assert cgroup_cpu_limit(str(tmp_path)) is None
+        assert cgroup_memory_limit(str(tmp_path)) is None
+
+
+class TestPlan:
+    def test_single_job_uses_every_core(self):
+        plan = plan_resources("base", jobs=1, resources=_machine())
+        assert (plan.inference_workers, plan.torch_threads) == (1, 64)
+        assert plan.max_model == "large"
+
+    def test_batch_splits_cores(self):
+        plan = plan_resources("base", jobs=4, resources=_machine())
+        assert (plan.inference_workers, plan.torch_threads) == (4, 16)
+
+    def test_cpu_quota_caps_cores(self):
+        plan = plan_resources("base", jobs=8, resources=_machine(quota=7.5))
+        assert plan.cpus == 8
+        assert (plan.inference_workers, plan.torch_threads) == (2, 4)
+
+    def test_memory_caps_workers_and_model(self):
+        plan = plan_resources("medium", jobs=8, resources=_machine(memory=16 * GIB))
+        assert plan.max_model == "large"
+        assert plan.inference_workers == 2
+        assert plan.inference_workers * MODEL_MEMORY_BYTES["medium"] <= 16 * GIB * 0.8
+        assert plan.model_fits
+
+        small = plan_resources("large", resources=_machine(memory=4 * GIB))
+        assert small.max_model == "small" and not small.model_fits
+        assert any("Warning" in line for line in small.describe())
+
+    def test_default_model_is_largest_that_fits(self):
+        assert plan_resources(resources=_machine(memory=8 * GIB)).model_name == "medium"
+
+    def test_gpu_runs_one_worker(self):
+        plan = plan_resources("base", jobs=8, resources=_machine(gpu=True))
+        assert plan.inference_workers == 1
+
+
+def test_apply_plan_sets_torch_threads():
+    before = torch.get_num_threads()
+    try:
+        apply_plan(plan_resources("tiny", resources=_machine(cpus=3)))
+        assert torch.get_num_threads() == 3
+    finally:
+        torch.set_num_threads(before)
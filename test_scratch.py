@@ -0,0 +1,203 @@
+"""Tests for the scratch-space manager."""
+
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import scratch
+import workflow
+from scratch import InsufficientSpaceError, ScratchSpace
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def space(tmp_path, monkeypatch):
+    """A fresh process-wide scratch space under *tmp_path*."""
+    monkeypatch.setattr(scratch, "_default", None)
+    return scratch.configure(str(tmp_path / "scratch"), min_free_bytes=0)
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def _job_dir(root, name, owner=None, age=0.0):
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    if owner is not None:
+        with open(os.path.join(path, ".owner"), "w") as fh:
+            fh.write(owner)
+    if age:
+        past = time.time() - age
+        os.utime(path, (past, past))
+    return path
+
+
+class TestJobDirectories:
+    def test_remove_takes_intermediates(self, space):
+        audio = scratch.make_scratch_file("audio.mp3")
+        assert os.path.getsize(audio) == 0
+        job_dir = os.path.dirname(audio)
+        assert os.path.dirname(job_dir) == space.root
+        assert open(os.path.join(job_dir, ".owner")).read().split()[0] == str(os.getpid())
+
+        # yt-dlp leaves fragments next to the output
+        open(os.path.join(job_dir, "audio.webm.part"), "w").close()
+        workflow.remove_temp_audio(audio)
+        assert not os.path.exists(job_dir)
+        workflow.remove_temp_audio(audio)  # already gone: no error
+
+    def test_files_outside_scratch_are_just_deleted(self, space, tmp_path):
+        other = tmp_path / "a.mp3"
+        other.write_bytes(b"x")
+        scratch.remove_scratch_file(str(other))
+        assert not other.exists() and tmp_path.exists()
+
+    def test_cleanup_spares_kept_jobs(self, space):
+        kept = scratch.make_scratch_file("audio.mp3")
+        dropped = scratch.make_scratch_file("audio.mp3")
+        workflow.keep_temp_audio(kept)
+        space.cleanup()
+        assert os.path.exists(kept) and not os.path.exists(dropped)
+        assert ScratchSpace(space.root).sweep() == 0
+        assert os.path.exists(kept)
+
+
+class TestSweep:
+    def test_removes_only_stale_directories(self, tmp_path):
+        root = str(tmp_path / "scratch")
+        os.makedirs(root)
+        host = socket.gethostname()
+        dead = _job_dir(root, "job-dead", f"{_dead_pid()} {host}")
+        alive = _job_dir(root, "job-alive", f"{os.getpid()} {host}")
+        remote_new = _job_dir(root, "job-remote", "1 elsewhere")
+        remote_old = _job_dir(root, "job-remote-old", "1 elsewhere", age=2 * scratch.STALE_SECONDS)
+        orphan_old = _job_dir(root, "job-orphan", age=2 * scratch.STALE_SECONDS)
+        unrelated = _job_dir(root, "not-a-job", age=2 * scratch.STALE_SECONDS)
+
+        space = ScratchSpace(root)
+        assert not os.path.exists(dead)
+        assert not os.path.exists(remote_old) and not os.path.exists(orphan_old)
+        assert all(os.path.exists(p) for p in (alive, remote_new, unrelated))
+        assert space.sweep() == 0
+
+
+class TestFreeSpace:
+    def test_waits_until_space_frees(self, space, monkeypatch):
+        free = iter([100, 100, 100, 10_000])
+        monkeypatch.setattr(space, "free_bytes", lambda: next(free))
+        space.min_free_bytes = 1000
+        messages = []
+        space.wait_for_space(poll_seconds=0.01, on_wait=messages.append)
+        assert len(messages) == 1 and "Waiting for scratch space" in messages[0]
+
+    def test_needed_bytes_count_against_floor(self, space, monkeypatch):
+        monkeypatch.setattr(space, "free_bytes", lambda: 5000)
+        space.min_free_bytes = 1000
+        assert space.has_space(4000)
+        assert not space.has_space(4001)
+        with pytest.raises(InsufficientSpaceError):
+            space.wait_for_space(4001, timeout=0.05, poll_seconds=0.01)
+
+    def test_default_waits_are_bounded(self, space, monkeypatch):
+        assert scratch.DEFAULT_MIN_FREE_BYTES == 0 and space.has_space()
+        monkeypatch.setattr(space, "free_bytes", lambda: 100)
+        space.min_free_bytes = 1000
+        space.space_timeout = 0.05
+        with pytest.raises(InsufficientSpaceError):
+            space.wait_for_space(poll_seconds=0.01)
+        with pytest.raises(InsufficientSpaceError):
+            asyncio.run(space.await_for_space(poll_seconds=0.01))
+
+    def test_async_wait_until_space_frees(self, space, monkeypatch):
+        free = iter([100, 100, 10_000])
+        monkeypatch.setattr(space, "free_bytes", lambda: next(free))
+        space.min_free_bytes = 1000
+        messages = []
+        asyncio.run(space.await_for_space(poll_seconds=0.01, on_wait=messages.append))
+        assert len(messages) == 1
+
+    def test_impossible_size_fails_at_once(self, space, monkeypatch):
+        monkeypatch.setattr(space, "free_bytes", lambda: 5000)
+        monkeypatch.setattr(space, "total_bytes", lambda: 10_000)
+        space.min_free_bytes = 1000
+        started = time.monotonic()
+        with pytest.raises(InsufficientSpaceError, match="exceed"):
+            space.wait_for_space(9001, timeout=None, poll_seconds=0.01)
+        assert time.monotonic() - started < 0.5
+
+    def test_queue_fails_job_that_cannot_fit(self, space, monkeypatch, tmp_path):
+        import job_queue
+
+        monkeypatch.setattr(space, "free_bytes", lambda: 10**8)
+        monkeypatch.setattr(space, "total_bytes", lambda: 10**9)
+        space.min_free_bytes = 1
+        downloads = []
+        monkeypatch.setattr(job_queue, "download_audio", lambda url, path, **kw: downloads.append(url))
+        monkeypatch.setattr(job_queue, "probe_stream", lambda url, **kw: {"estimated_bytes": 10**10})
+        monkeypatch.setattr(job_queue, "check_limits", lambda probe, **kw: [])
+
+        jobs = job_queue.JobQueue(on_event=lambda e: None, inference_workers=1, max_bytes=10**11)
+        jobs.submit("https://example.com/huge")
+        jobs.shutdown(wait=True)
+        job = jobs.jobs()[0]
+        assert job.state == job_queue.FAILED and "exceed" in job.error
+        assert downloads == []
+
+    def test_queue_holds_downloads(self, space, monkeypatch, tmp_path):
+        import job_queue
+
+        low = threading.Event()
+        low.set()
+        monkeypatch.setattr(space, "free_bytes", lambda: 0 if low.is_set() else 10**12)
+        monkeypatch.setattr(space, "wait_for_space", lambda *a, **k: ScratchSpace.wait_for_space(
+            space, *a, poll_seconds=0.01, **k))
+        space.min_free_bytes = 1
+        downloads = []
+        monkeypatch.setattr(job_queue, "download_audio", lambda url, path, **kw: downloads.append(url))
+        monkeypatch.setattr(job_queue, "transcribe_to_output", lambda *a, **kw: {"segments": []})
+        monkeypatch.setattr(job_queue, "resolve_output_path", lambda out, fmt="pdf": str(tmp_path / "x.txt"))
+
+        events = []
+        jobs = job_queue.JobQueue(on_event=events.append, inference_workers=1)
+        jobs.submit("https://example.com/a")
+        time.sleep(0.2)
+        assert downloads == []
+        assert any("Waiting for scratch space" in e["message"] for e in events)
+        low.clear()
+        jobs.shutdown(wait=True)
+        assert downloads == ["https://example.com/a"]
+        assert os.listdir(space.root) == []
+
+
+SIGTERM_SCRIPT = """
+import sys, time
+import scratch
+space = scratch.configure(sys.argv[1], min_free_bytes=0)
+space.install_signal_handlers()
+print(scratch.make_scratch_file("audio.mp3"), flush=True)
+time.sleep(60)
+"""
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX signals")
+def test_sigterm_removes_job_directories(tmp_path):
+    proc = subprocess.Popen(
+        [sys.executable, "-c", SIGTERM_SCRIPT, str(tmp_path / "scratch")],
+        cwd=REPO, stdout=subprocess.PIPE, text=True,
+    )
+    audio = proc.stdout.readline().strip()
+    assert os.path.exists(audio)
+    proc.send_signal(signal.SIGTERM)
+    assert proc.wait(timeout=30) == 128 + signal.SIGTERM
+    assert not os.path.exists(os.path.dirname(audio))
@@ -0,0 +1,109 @@
+"""Tests for the transcript search index."""
+
+import os
+
+import pytest
+
+from search_index import TranscriptIndex, parse_srt_transcript, parse_txt_transcript
+from writers import write_srt, write_txt
+
+SEGMENTS = [
+    {"start": 0.0, "end": 5.25, "text": " Welcome to the quarterly budget review."},
+    {"start": 5.25, "end": 12.5, "text": " Revenue grew in the northern region."},
+    {"start": 3725.0, "end": 3730.0, "text": " Any questions about the budget?"},
+]
+
+METADATA = {
+    "source_url": "https://example.com/stream.m3u8",
+    "date": "2025-01-01 12:00:00",
+    "model": "base",
+}
+
+
+class TestParsers:
+    def test_txt_roundtrip(self, tmp_path):
+        path = str(tmp_path / "a.txt")
+        write_txt(SEGMENTS, path, metadata=METADATA)
+        meta, segs = parse_txt_transcript(path)
+        assert meta["source_url"] == METADATA["source_url"]
+        assert meta["model"] == "base"
+        assert len(segs) == 3
+        # TXT timestamps are whole seconds
+        assert segs[2]["start_ms"] == 3725000
+        assert segs[1]["text"] == "Revenue grew in the northern region."
+
+    def test_srt_roundtrip_keeps_millis(self, tmp_path):
+        path = str(tmp_path / "a.srt")
+        write_srt(SEGMENTS, path)
+        _meta, segs = parse_srt_transcript(path)
+        assert [s["end_ms"] for s in segs] == [5250, 12500, 3730000]
+
+
+class TestTranscriptIndex:
+    def test_add_and_search(self, tmp_path):
+        with TranscriptIndex(str(tmp_path / "idx.db")) as index:
+            index.add_job(SEGMENTS, str(tmp_path / "job.pdf"), metadata=METADATA)
+            hits = index.search("budget")
+        assert len(hits) == 2
+        assert {h["start_ms"] for h in hits} == {0, 3725000}
+        assert hits[0]["source_url"] == METADATA["source_url"]
+        assert hits[0]["model"] == "base"
+
+    def test_all_terms_must_match(self, tmp_path):
+        with TranscriptIndex(str(tmp_path / "idx.db")) as index:
+            index.add_job(SEGMENTS, str(tmp_path / "job.pdf"), metadata=METADATA)
+            assert len(index.search("budget questions")) == 1
+            assert index.search("budget nonexistentword") == []
+
+    def test_special_characters_are_literal(self, tmp_path):
+        with TranscriptIndex(str(tmp_path / "idx.db")) as index:
+            index.add_job(SEGMENTS, str(tmp_path / "job.pdf"))
+            assert index.search('budget"  AND (') == []
+
+    def test_readding_job_replaces_segments(self, tmp_path):
+        with TranscriptIndex(str(tmp_path / "idx.db")) as index:
+            out = str(tmp_path / "job.pdf")
+            index.add_job(SEGMENTS, out, metadata=METADATA)
+            index.add_job(SEGMENTS[:1], out, metadata=METADATA)
+            assert index.stats() == {"jobs": 1, "segments": 1}
+            assert len(index.search("budget")) == 1
+
+    def test_index_directory_is_incremental(self, tmp_path):
+        tdir = tmp_path / "transcripts"
+        tdir.mkdir()
+        write_txt(SEGMENTS, str(tdir / "one.txt"), metadata=METADATA)
+        write_srt(SEGMENTS, str(tdir / "two.srt"))
+        (tdir / "three.pdf").write_bytes(b"%PDF-1.4")
+
+        with TranscriptIndex(str(tmp_path / "idx.db")) as index:
+            assert index.index_directory(str(tdir)) == (2, 0)
+            assert index.index_directory(str(tdir)) == (0, 2)
+
+            os.utime(tdir / "one.txt", (0, 12345))
+            assert index.index_directory(str(tdir)) == (1, 1)
+            assert index.stats()["jobs"] == 2
+
+    def test_prune_removes_missing_files(self, tmp_path):
+        path = tmp_path / "gone.txt"
+        write_txt(SEGMENTS, str(path))
+        with TranscriptIndex(str(tmp_path / "idx.db")) as index:
+            index.index_file(str(path))
+            path.unlink()
+            assert index.prune() == 1
+            assert index.search("budget") == []
+
+    def test_speaker_labels_are_not_indexed(self, tmp_path):
+        path = tmp_path / "diarized.txt"
+        write_txt([dict(seg, speaker="Speaker 2") for seg in SEGMENTS], str(path))
+        with TranscriptIndex(str(tmp_path / "idx.db")) as index:
+            index.index_file(str(path))
+            assert index.search("speaker") == []
+            hits = index.search("revenue")
+        assert hits[0]["text"] == "Revenue grew in the northern region."
+
+    def test_bad_raw_query_is_a_value_error(self, tmp_path):
+        with TranscriptIndex(str(tmp_path / "idx.db")) as index:
+            index.add_job(SEGMENTS, str(tmp_path / "job.pdf"))
+            assert len(index.search("budget OR revenue", raw=True)) == 3
+            with pytest.raises(ValueError, match="Invalid FTS5 query"):
+                index.search('budget AND (', raw=True)
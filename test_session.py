@@ -0,0 +1,149 @@
+"""Tests for stateful (streaming) transcription sessions."""
+
+import numpy as np
+import pytest
+import torch
+from whisper.model import ModelDimensions, Whisper
+from whisper.tokenizer import LANGUAGES
+
+from transcriber import PROMPT_TOKENS, SAMPLE_RATE, TranscriptionSession, detect_language
+
+
+class FakeModel:
+    """One segment per 10 s of audio; records (duration, language, prompt) per call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **kwargs):
+        duration = len(audio) / SAMPLE_RATE
+        self.calls.append((duration, language, initial_prompt))
+        segments, t = [], 0.0
+        while t < duration:
+            end = min(t + 10.0, duration)
+            segments.append({"id": len(segments), "start": t, "end": end, "text": f" w{len(self.calls)}.{t:.0f}"})
+            t = end
+        return {"text": "", "segments": segments, "language": language or "en"}
+
+
+def _pcm(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.int16).tobytes()
+
+
+class TestStreaming:
+    def test_feed_and_flush(self):
+        model = FakeModel()
+        seen = []
+        session = TranscriptionSession(model, chunk_seconds=30, on_segment=seen.append)
+
+        # 25 s in 1 s packets: no complete chunk yet
+        for _ in range(25):
+            assert session.feed(_pcm(1)) == []
+        assert model.calls == []
+
+        # Completing the first chunk finalizes all but its last segment
+        final = session.feed(_pcm(10))
+        assert [s["start"] for s in final] == [0.0, 10.0]
+        assert session.offset == 20 * SAMPLE_RATE
+
+        final = session.flush()
+        assert final and final[-1]["end"] == pytest.approx(35.0)
+        assert seen == session.segments
+        assert [s["id"] for s in session.segments] == list(range(len(session.segments)))
+        for prev, cur in zip(session.segments, session.segments[1:]):
+            assert cur["start"] == pytest.approx(prev["end"])
+
+    def test_language_and_prompt_carried(self):
+        model = FakeModel()
+        session = TranscriptionSession(model, chunk_seconds=30)
+        session.feed(_pcm(65))
+        session.flush()
+        assert model.calls[0][1:] == (None, None)
+        for _d, language, prompt in model.calls[1:]:
+            assert language == "en"
+            assert prompt.split()[-1] in session.result()["text"]
+        assert session.result()["language"] == "en"
+
+    def test_initial_prompt_seeds_first_chunk(self):
+        model = FakeModel()
+        session = TranscriptionSession(model, chunk_seconds=30, initial_prompt="Glossary: HLS.")
+        session.feed(_pcm(65))
+        session.flush()
+        assert model.calls[0][2] == "Glossary: HLS."
+        assert all(prompt != "Glossary: HLS." for _d, _l, prompt in model.calls[1:])
+
+    def test_float_samples_and_stats(self):
+        session = TranscriptionSession(FakeModel(), chunk_seconds=30)
+        session.feed(np.zeros(45 * SAMPLE_RATE, dtype=np.float32))
+        session.flush()
+        stats = session.chunk_stats
+        assert [s["start"] for s in stats] == [0.0, 20.0]
+        assert [s["audio_seconds"] for s in stats] == [30.0, 25.0]
+        assert all(s["seconds"] >= 0 for s in stats)
+
+    def test_flush_is_repeatable(self):
+        session = TranscriptionSession(FakeModel(), chunk_seconds=30)
+        assert session.flush() == []
+        session.feed(_pcm(5))
+        session.flush()
+        session.feed(_pcm(5))
+        assert session.flush()[0]["start"] == pytest.approx(5.0)
+
+    def test_prompt_capped_by_tokens(self):
+        session = TranscriptionSession(FakeModel())
+        session.segments = [
+            {"text": f" s{i}", "tokens": list(range(100))} for i in range(5)
+        ]
+        assert session.prompt == "s3 s4"
+        assert 2 * 100 <= PROMPT_TOKENS < 3 * 100
+
+    def test_invalid_chunk(self):
+        with pytest.raises(ValueError, match="chunk_seconds"):
+            TranscriptionSession(FakeModel(), chunk_seconds=0)
+
+
+@pytest.fixture(scope="module")
+def untrained_model():
+    """A tiny randomly initialised Whisper -- real decoding code, no downloads."""
+    torch.manual_seed(0)
+    dims = ModelDimensions(
+        n_mels=80, n_audio_ctx=1500, n_audio_state=32, n_audio_head=2, n_audio_layer=1,
+        n_vocab=51865, n_text_ctx=448, n_text_state=32, n_text_head=2, n_text_layer=1,
+    )
+    return Whisper(dims).eval()
+
+
+class TestEncoderReuse:
+    # The fallback also decodes greedily: sampling from random weights can hit all -inf logits
+    OPTIONS = {"fp16": False, "temperature": (0.0, 0.0), "compression_ratio_threshold": 0.1}
+
+    def test_same_result_fewer_encoder_passes(self, untrained_model):
+        audio = (0.1 * np.random.default_rng(0).standard_normal(30 * SAMPLE_RATE)).astype(np.float32)
+        encoder = untrained_model.encoder
+        calls = []
+        handle = encoder.register_forward_hook(lambda *args: calls.append(1))
+        try:
+            torch.manual_seed(1)
+            expected = untrained_model.transcribe(audio, **self.OPTIONS)
+            independent = len(calls)
+
+            calls.clear()
+            torch.manual_seed(1)
+            session = TranscriptionSession(untrained_model, **self.OPTIONS)
+            session.feed(audio)
+            session.flush()
+        finally:
+            handle.remove()
+
+        assert untrained_model.encoder is encoder
+        assert [s["text"] for s in session.segments] == [s["text"] for s in expected["segments"]]
+        assert session.language == expected["language"]
+        # Language detection and temperature fallbacks reuse the window's pass
+        assert len(calls) < independent
+        assert session.chunk_stats[0]["encoder_reuses"] == independent - len(calls)
+        assert session.chunk_stats[0]["encoder_reuses"] >= 2
+
+
+def test_detect_language(untrained_model):
+    audio = (0.1 * np.random.default_rng(0).standard_normal(40 * SAMPLE_RATE)).astype(np.float32)
+    assert detect_language(audio, untrained_model) in LANGUAGES
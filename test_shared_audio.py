@@ -0,0 +1,120 @@
+"""Tests for the shared-memory audio buffer."""
+
+import multiprocessing as mp
+import os
+
+import numpy as np
+import pytest
+
+import transcriber
+from shared_audio import SharedAudio
+from test_bounded_memory import FakeModel, _write_pcm
+from transcriber import SAMPLE_RATE, transcribe_audio
+
+
+def _slice_sum(inbox, results):
+    audio, start, stop = inbox.get()
+    results.put((audio.refcount, float(audio.window(start, stop).sum())))
+    audio.close()
+
+
+def _hold_and_exit(inbox, results):
+    audio = inbox.get()
+    results.put(audio.refcount)
+    results.close()
+    results.join_thread()
+    os._exit(0)  # like a terminated pool worker: never closes its reference
+
+
+def _exists(name):
+    try:
+        SharedAudio.attach(name).close()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+@pytest.fixture
+def ctx():
+    if "fork" not in mp.get_all_start_methods():
+        pytest.skip("needs the fork start method")
+    # Handles are sent through queues, so they are pickled (and attached)
+    # even though the child is forked
+    return mp.get_context("fork")
+
+
+class TestLifetime:
+    def test_child_reads_same_samples(self, ctx):
+        with SharedAudio.from_samples(np.arange(1000, dtype=np.float32)) as audio:
+            inbox, results = ctx.Queue(), ctx.Queue()
+            proc = ctx.Process(target=_slice_sum, args=(inbox, results))
+            proc.start()
+            inbox.put((audio, 100, 200))
+            refs, total = results.get(timeout=30)
+            proc.join()
+            assert refs == 2
+            assert total == float(np.arange(100, 200).sum())
+            assert audio.refcount == 1
+
+    def test_last_reference_unlinks(self):
+        owner = SharedAudio.create(10)
+        other = SharedAudio.attach(owner.name)
+        assert owner.refcount == 2
+        owner.close()
+        assert _exists(other.name)
+        other.samples[:] = 1.0  # still mapped and usable
+        other.close()
+        assert not _exists(owner.name)
+        owner.close()  # idempotent
+
+    def test_dead_holder_does_not_leak(self, ctx):
+        audio = SharedAudio.from_samples(np.zeros(10, dtype=np.float32))
+        inbox, results = ctx.Queue(), ctx.Queue()
+        proc = ctx.Process(target=_hold_and_exit, args=(inbox, results))
+        proc.start()
+        inbox.put(audio)
+        assert results.get(timeout=30) == 2
+        proc.join()
+        name = audio.name
+        audio.close()
+        assert not _exists(name)
+
+    def test_from_pcm_file(self, tmp_path):
+        pcm = tmp_path / "a.pcm"
+        raw = np.array([0, 16384, -32768, 32767], dtype=np.int16)
+        raw.tofile(pcm)
+        with SharedAudio.from_pcm_file(str(pcm)) as audio:
+            np.testing.assert_allclose(audio.samples, raw / 32768.0)
+            assert audio.sample_rate == SAMPLE_RATE and len(audio) == 4
+
+    def test_rejects_multichannel(self):
+        with pytest.raises(ValueError):
+            SharedAudio.from_samples(np.zeros((2, 10), dtype=np.float32))
+
+
+class TestTranscriberAcceptsSharedAudio:
+    @pytest.fixture
+    def model(self, monkeypatch):
+        model = FakeModel()
+        monkeypatch.setattr(transcriber, "_load_model", lambda name: model)
+        return model
+
+    def test_plain_mode_gets_samples(self, model):
+        with SharedAudio.from_samples(np.zeros(25 * SAMPLE_RATE, dtype=np.float32)) as audio:
+            result = transcribe_audio(audio)
+            assert audio.refcount == 1  # not closed by the transcriber
+        assert model.calls[0][0] == pytest.approx(25.0)
+        assert result["segments"][-1]["end"] == pytest.approx(25.0)
+
+    def test_bounded_mode_matches_pcm_file(self, model, tmp_path):
+        pcm = str(tmp_path / "a.pcm")
+        _write_pcm(pcm, 95)
+        from_file = transcriber.transcribe_pcm_windows(FakeModel(), pcm, window_seconds=30)
+        with SharedAudio.from_pcm_file(pcm) as audio:
+            result = transcribe_audio(audio, bounded_memory=True, window_seconds=30)
+        assert result["segments"] == from_file["segments"]
+
+    def test_wrong_sample_rate(self, model):
+        with SharedAudio.from_samples(np.zeros(10, dtype=np.float32), sample_rate=8000) as audio:
+            with pytest.raises(ValueError):
+                transcribe_audio(audio)
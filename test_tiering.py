@@ -0,0 +1,148 @@
+"""Tests for speculative model tiering."""
+
+import numpy as np
+import pytest
+
+import tiering
+from shared_audio import SharedAudio
+from tiering import merge_refined, needs_refinement, refinement_spans, transcribe_tiered
+from transcriber import SAMPLE_RATE
+
+
+def _seg(start, end, text, logprob=-0.2, ratio=1.5, no_speech=0.05):
+    return {
+        "start": start, "end": end, "text": text,
+        "avg_logprob": logprob, "compression_ratio": ratio, "no_speech_prob": no_speech,
+    }
+
+
+DRAFT = [
+    _seg(0.0, 4.0, " good one"),
+    _seg(4.0, 8.0, " mumbled", logprob=-1.3),
+    _seg(8.0, 10.0, " also mumbled", ratio=2.9),
+    _seg(10.0, 20.0, " good two"),
+    _seg(30.0, 35.0, " noisy", no_speech=0.8),
+]
+
+
+# Flagged segments on both sides of a short kept one
+INTERLEAVED = [
+    _seg(0.0, 4.0, " A", logprob=-1.5),
+    _seg(4.0, 4.8, " ok B"),
+    _seg(4.8, 8.0, " C", logprob=-1.5),
+    _seg(8.0, 12.0, " ok D"),
+]
+
+
+class TestNeedsRefinement:
+    def test_flags_each_threshold(self):
+        assert [needs_refinement(s) for s in DRAFT] == [False, True, True, False, True]
+
+    def test_thresholds_configurable(self):
+        assert not needs_refinement(DRAFT[1], min_avg_logprob=-2.0)
+
+
+class TestSpans:
+    def test_adjacent_flags_merge_and_pad(self):
+        flagged = [needs_refinement(s) for s in DRAFT]
+        # Padding only reaches into silence, not into the kept neighbours
+        assert refinement_spans(DRAFT, flagged) == [(4.0, 10.0), (29.5, 35.5)]
+
+    def test_no_merge_across_kept_segment(self):
+        flagged = [needs_refinement(s) for s in INTERLEAVED]
+        assert flagged == [True, False, True, False]
+        assert refinement_spans(INTERLEAVED, flagged) == [(0.0, 4.0), (4.8, 8.0)]
+
+    def test_clamped(self):
+        spans = refinement_spans([_seg(0.2, 3.0, "x")], [True], duration=3.1)
+        assert spans == [(0.0, 3.1)]
+
+
+class TestMerge:
+    def test_replaces_flagged_keeps_rest(self):
+        flagged = [needs_refinement(s) for s in DRAFT]
+        spans = refinement_spans(DRAFT, flagged)
+        refined = [
+            {"start": 4.1, "end": 7.0, "text": " clear A"},
+            {"start": 7.0, "end": 10.2, "text": " clear B"},
+        ]
+        merged = merge_refined(DRAFT, flagged, spans, refined)
+        texts = [s["text"] for s in merged]
+        # Second span produced nothing, so its draft segment is kept
+        assert texts == [" good one", " clear A", " clear B", " good two", " noisy"]
+        assert [s["id"] for s in merged] == list(range(5))
+
+    def test_kept_segments_not_duplicated(self):
+        flagged = [needs_refinement(s) for s in INTERLEAVED]
+        spans = refinement_spans(INTERLEAVED, flagged)
+        refined = [{"start": 0.1, "end": 3.9, "text": " A fixed"}, {"start": 4.9, "end": 7.9, "text": " C fixed"}]
+        merged = merge_refined(INTERLEAVED, flagged, spans, refined)
+        assert [s["text"] for s in merged] == [" A fixed", " ok B", " C fixed", " ok D"]
+        for prev, cur in zip(merged, merged[1:]):
+            assert cur["start"] >= prev["end"]
+
+    def test_span_covering_kept_segment_replaces_it(self):
+        # A wide span (as older merging produced) must not keep the draft text inside it
+        flagged = [True, False, True, False]
+        refined = [{"start": 0.0, "end": 4.2, "text": " A"}, {"start": 4.2, "end": 8.0, "text": " ok B C fixed"}]
+        merged = merge_refined(INTERLEAVED, flagged, [(0.0, 8.5)], refined)
+        assert [s["text"] for s in merged] == [" A", " ok B C fixed", " ok D"]
+
+
+class TestTranscribeTiered:
+    def test_draft_published_then_refined(self, monkeypatch):
+        calls = []
+
+        def fake_transcribe(audio_path, model_name="base", language=None, **kwargs):
+            calls.append((model_name, language, kwargs.get("transcribe_options")))
+            if model_name == "tiny":
+                return {"text": "", "segments": [dict(s) for s in DRAFT], "language": "en"}
+            return {"text": "", "segments": [{"start": 4.0, "end": 10.0, "text": " fixed"}]}
+
+        monkeypatch.setattr(tiering, "transcribe_audio", fake_transcribe)
+        drafts = []
+        result = transcribe_tiered("a.mp3", "tiny", "medium", on_draft=drafts.append)
+
+        assert len(drafts) == 1 and len(drafts[0]["segments"]) == len(DRAFT)
+        model, language, options = calls[1]
+        assert model == "medium" and language == "en"
+        assert options["clip_timestamps"] == [4.0, 10.0, 29.5, 35.5]
+        assert [s["model"] for s in result["segments"]] == ["tiny", "medium", "tiny", "tiny"]
+        assert result["refined_seconds"] == pytest.approx(12.0)
+
+    def test_bounded_memory_refines_span_slices(self, monkeypatch):
+        drafts, slices = [], []
+
+        def fake_transcribe(audio_path, model_name="base", language=None, bounded_memory=False, **kwargs):
+            drafts.append(bounded_memory)
+            return {"text": "", "segments": [dict(s) for s in INTERLEAVED], "language": "en"}
+
+        def fake_samples(samples, model_name="base", language=None, transcribe_options=None):
+            slices.append(len(samples) / SAMPLE_RATE)
+            return {"segments": [{"start": 0.1, "end": len(samples) / SAMPLE_RATE - 0.1, "text": " fixed"}]}
+
+        monkeypatch.setattr(tiering, "transcribe_audio", fake_transcribe)
+        monkeypatch.setattr(tiering, "transcribe_samples", fake_samples)
+        audio = SharedAudio.from_samples(np.zeros(12 * SAMPLE_RATE, dtype=np.float32))
+        try:
+            result = transcribe_tiered(audio, "tiny", "medium", bounded_memory=True)
+        finally:
+            audio.close()
+
+        assert drafts == [True]
+        assert slices == pytest.approx([4.0, 3.2])
+        assert [(s["start"], s["text"]) for s in result["segments"]] == [
+            (0.1, " fixed"), (4.0, " ok B"), (pytest.approx(4.9), " fixed"), (8.0, " ok D"),
+        ]
+
+    def test_clean_draft_skips_refinement(self, monkeypatch):
+        calls = []
+
+        def fake_transcribe(audio_path, model_name="base", language=None, **kwargs):
+            calls.append(model_name)
+            return {"text": "", "segments": [_seg(0.0, 1.0, " fine")], "language": "en"}
+
+        monkeypatch.setattr(tiering, "transcribe_audio", fake_transcribe)
+        result = transcribe_tiered("a.mp3", "tiny", "medium")
+        assert calls == ["tiny"]
+        assert result["refined_seconds"] == 0.0
@@ -0,0 +1,254 @@
+"""
+Speculative model tiering.
+
+A small model transcribes the whole input first; only the segments it was
+unsure about are then re-transcribed with a larger model and merged back in
+place.  On clean audio most segments pass, so the result approaches
+large-model quality at a fraction of the compute.
+
+Segment confidence uses the fields Whisper already reports per segment:
+``avg_logprob``, ``compression_ratio`` and ``no_speech_prob``.
+"""
+
+import logging
+import subprocess
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from scratch import make_scratch_file, remove_scratch_file
+from shared_audio import SharedAudio
+from transcriber import (
+    SAMPLE_RATE,
+    decode_to_pcm,
+    pcm_to_float,
+    transcribe_audio,
+    transcribe_samples,
+)
+
+log = logging.getLogger(__name__)
+
+# A draft segment is re-transcribed if any of these checks fails.
+DEFAULT_MIN_AVG_LOGPROB = -0.6
+DEFAULT_MAX_COMPRESSION_RATIO = 2.2
+DEFAULT_MAX_NO_SPEECH_PROB = 0.5
+
+# Refinement spans are padded slightly (into silence, never into a kept
+# segment) and flagged neighbours closer than the gap are merged, so the
+# larger model gets some context at each edge.
+SPAN_PADDING_SECONDS = 0.5
+SPAN_MERGE_GAP_SECONDS = 1.0
+
+
+def needs_refinement(
+    segment: Dict[str, Any],
+    min_avg_logprob: float = DEFAULT_MIN_AVG_LOGPROB,
+    max_compression_ratio: float = DEFAULT_MAX_COMPRESSION_RATIO,
+    max_no_speech_prob: float = DEFAULT_MAX_NO_SPEECH_PROB,
+) -> bool:
+    """Return True if a draft segment falls outside the confidence thresholds."""
+    return (
+        segment.get("avg_logprob", 0.0) < min_avg_logprob
+        or segment.get("compression_ratio", 0.0) > max_compression_ratio
+        or segment.get("no_speech_prob", 0.0) > max_no_speech_prob
+    )
+
+
+def refinement_spans(
+    segments: List[Dict[str, Any]],
+    flagged: List[bool],
+    duration: Optional[float] = None,
+) -> List[Tuple[float, float]]:
+    """
+    Group flagged segments into padded, merged ``(start, end)`` time spans,
+    clamped to ``[0, duration]``.
+
+    A span never reaches into an unflagged segment: padding stops at the
+    neighbouring kept segment and spans are only merged across a gap, so
+    the refined text cannot repeat words the draft keeps.
+    """
+    spans: List[Tuple[float, float]] = []
+    for i, (seg, flag) in enumerate(zip(segments, flagged)):
+        if not flag:
+            continue
+        start = max(0.0, seg["start"] - SPAN_PADDING_SECONDS)
+        end = seg["end"] + SPAN_PADDING_SECONDS
+        if i > 0 and not flagged[i - 1]:
+            start = max(start, segments[i - 1]["end"])
+        if i + 1 < len(segments) and not flagged[i + 1]:
+            end = min(end, segments[i + 1]["start"])
+        if duration is not None:
+            end = min(end, duration)
+        if spans and i > 0 and flagged[i - 1] and start - spans[-1][1] <= SPAN_MERGE_GAP_SECONDS:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], end))
+        else:
+            spans.append((start, end))
+    return spans
+
+
+def merge_refined(
+    draft: List[Dict[str, Any]],
+    flagged: List[bool],
+    spans: List[Tuple[float, float]],
+    refined: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Replace the draft segments of each span with its refined segments.
+
+    Refined segments are assigned to the span their midpoint falls in.  A
+    span the larger model produced text for replaces every draft segment
+    whose midpoint lies inside it, flagged or not, so no audio is
+    transcribed twice; draft segments outside spans are kept as-is.  The
+    result is sorted by start time and renumbered.
+    """
+    def _span_of(t: float) -> Optional[int]:
+        for i, (s, e) in enumerate(spans):
+            if s <= t < e:
+                return i
+        return None
+
+    merged: List[Dict[str, Any]] = []
+    kept_spans = set()
+    for seg in refined:
+        idx = _span_of((seg["start"] + seg["end"]) / 2)
+        if idx is None:
+            continue
+        kept_spans.add(idx)
+        merged.append(seg)
+
+    # If the larger model produced nothing for a span (e.g. it judged it
+    # silent), fall back to the draft rather than dropping the text.
+    for seg in draft:
+        idx = _span_of((seg["start"] + seg["end"]) / 2)
+        if idx is None or idx not in kept_spans:
+            merged.append(seg)
+
+    merged.sort(key=lambda seg: seg["start"])
+    return [{**seg, "id": i} for i, seg in enumerate(merged)]
+
+
+def _transcribe_spans(
+    audio_path: Union[str, SharedAudio],
+    spans: List[Tuple[float, float]],
+    model_name: str,
+    language: Optional[str],
+) -> List[Dict[str, Any]]:
+    """
+    Transcribe each span from its own slice of the audio, timestamps absolute.
+
+    Files are decoded once to a memory-mapped PCM file, so only the span
+    being transcribed is ever held as float samples.
+    """
+    pcm_path = None
+    if isinstance(audio_path, SharedAudio):
+        samples: np.ndarray = audio_path.samples
+    else:
+        pcm_path = make_scratch_file("audio.pcm")
+        decoder = decode_to_pcm(audio_path, pcm_path)
+        if decoder.wait() != 0:
+            remove_scratch_file(pcm_path)
+            raise subprocess.CalledProcessError(decoder.returncode, decoder.args)
+        samples = np.memmap(pcm_path, dtype=np.int16, mode="r")
+    try:
+        segments = []
+        for start, end in spans:
+            piece = samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+            if piece.dtype != np.float32:
+                piece = pcm_to_float(piece.tobytes())
+            result = transcribe_samples(
+                piece, model_name=model_name, language=language,
+                transcribe_options={"condition_on_previous_text": False},
+            )
+            segments.extend(
+                {**seg, "start": seg["start"] + start, "end": seg["end"] + start}
+                for seg in result["segments"]
+            )
+        return segments
+    finally:
+        if pcm_path is not None:
+            del samples
+            remove_scratch_file(pcm_path)
+
+
+def transcribe_tiered(
+    audio_path: Union[str, SharedAudio],
+    draft_model: str = "tiny",
+    final_model: str = "medium",
+    language: Optional[str] = None,
+    min_avg_logprob: float = DEFAULT_MIN_AVG_LOGPROB,
+    max_compression_ratio: float = DEFAULT_MAX_COMPRESSION_RATIO,
+    max_no_speech_prob: float = DEFAULT_MAX_NO_SPEECH_PROB,
+    on_draft: Optional[Callable[[dict], None]] = None,
+    bounded_memory: bool = False,
+) -> dict:
+    """
+    Transcribe with *draft_model*, then refine low-confidence segments.
+
+    Args:
+        audio_path: Path to the audio file, or a decoded :class:`SharedAudio`.
+        draft_model: Fast model used for the whole input.
+        final_model: Larger model used only for flagged spans.
+        language: Optional ISO-639-1 language code.  If omitted, the
+            language detected by the draft is reused for refinement.
+        min_avg_logprob: Refine segments with a lower ``avg_logprob``.
+        max_compression_ratio: Refine segments with a higher ``compression_ratio``.
+        max_no_speech_prob: Refine segments with a higher ``no_speech_prob``.
+        on_draft: Called with the draft result before refinement starts,
+            so callers can publish a preliminary transcript immediately.
+        bounded_memory: Transcribe the draft window by window, and refine
+            each span from its own slice of a memory-mapped PCM file instead
+            of loading the whole input.
+
+    Returns:
+        Whisper-style result dict.  Each segment carries a ``model`` key
+        naming the model that produced it; ``refined_seconds`` reports how
+        much audio the larger model processed.
+    """
+    draft = transcribe_audio(
+        audio_path, model_name=draft_model, language=language,
+        bounded_memory=bounded_memory,
+    )
+    draft_segments = [{**seg, "model": draft_model} for seg in draft["segments"]]
+    draft = {**draft, "segments": draft_segments, "refined_seconds": 0.0}
+
+    if on_draft:
+        on_draft(draft)
+
+    flagged = [
+        needs_refinement(seg, min_avg_logprob, max_compression_ratio, max_no_speech_prob)
+        for seg in draft_segments
+    ]
+    spans = refinement_spans(draft_segments, flagged)
+    if not spans:
+        log.info("Draft passed all confidence checks -- no refinement needed.")
+        return draft
+
+    refined_seconds = sum(e - s for s, e in spans)
+    log.info(
+        "Refining %d/%d segments (%.1fs of audio in %d span(s)) with '%s'...",
+        sum(flagged), len(flagged), refined_seconds, len(spans), final_model,
+    )
+
+    refine_language = language or draft.get("language")
+    if bounded_memory:
+        refined = _transcribe_spans(audio_path, spans, final_model, refine_language)
+    else:
+        clips: List[float] = [t for span in spans for t in span]
+        refined = transcribe_audio(
+            audio_path,
+            model_name=final_model,
+            language=refine_language,
+            transcribe_options={
+                "clip_timestamps": clips,
+                "condition_on_previous_text": False,
+            },
+        )["segments"]
+    refined_segments = [{**seg, "model": final_model} for seg in refined]
+
+    segments = merge_refined(draft_segments, flagged, spans, refined_segments)
+    return {
+        "text": "".join(seg["text"] for seg in segments),
+        "segments": segments,
+        "language": draft.get("language"),
+        "refined_seconds": refined_seconds,
+    }
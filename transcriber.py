@@ -1,37 +1,105 @@
 """Audio downloading and transcription utilities."""
 
+import contextlib
 import logging
 import os
 import subprocess
-import tempfile
-from typing import Any, Dict, Optional
+import sys
+import threading
+import time
+import urllib.error
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlparse
 
+import numpy as np
+import torch
 import whisper
+from whisper.audio import SAMPLE_RATE
+
+from download_scheduler import default_scheduler
+from hls import DEFAULT_MIN_BANDWIDTH, format_bytes, select_rendition
+from scratch import make_scratch_file, remove_scratch_file
+from shared_audio import SharedAudio
 
 log = logging.getLogger(__name__)
 
 VALID_MODELS = {"tiny", "base", "small", "medium", "large"}
 
+# Bounded-memory mode: audio is decoded to 16-bit mono PCM on disk and fed to
+# Whisper one window at a time, so RSS no longer scales with input length.
+DEFAULT_WINDOW_SECONDS = 600.0
+_PCM_DTYPE = np.int16
+_PCM_BYTES = np.dtype(_PCM_DTYPE).itemsize
+_DECODE_POLL_SECONDS = 0.05
+
+# Streaming sessions: audio is transcribed in chunks of Whisper's native
+# 30 s context; the prompt carried between chunks is capped at the same
+# n_text_ctx // 2 - 1 tokens Whisper allows for its own conditioning.
+DEFAULT_CHUNK_SECONDS = 30.0
+PROMPT_TOKENS = 223
+
 # ---------------------------------------------------------------------------
 # Model cache -- avoids reloading the same Whisper model repeatedly
 # ---------------------------------------------------------------------------
 _model_cache: Dict[str, Any] = {}
+# Threads that run inference side by side each load their own copy of a model
+# (Whisper installs per-call hooks on it); slot 0 is the shared default.
+_model_slot = threading.local()
 
 
 def make_temp_audio_path() -> str:
-    """Create a unique temporary file path for audio downloads."""
-    fd, path = tempfile.mkstemp(suffix=".mp3")
-    os.close(fd)
-    return path
+    """
+    Return an audio download path inside a new scratch job directory.
+
+    yt-dlp's intermediates land in the same directory; remove it all with
+    :func:`scratch.remove_scratch_file`.
+    """
+    return make_scratch_file("audio.mp3")
+
+
+def _pick_audio_rendition(m3u8_url: str, min_bandwidth: int) -> str:
+    """
+    Return the URL of the cheapest usable audio rendition of *m3u8_url*.
+
+    Falls back to *m3u8_url* itself (yt-dlp's default choice) if it is not an
+    HLS master playlist or cannot be fetched/parsed.
+    """
+    if not urlparse(m3u8_url).path.lower().endswith(".m3u8"):
+        return m3u8_url
+    try:
+        choice = select_rendition(m3u8_url, min_bandwidth=min_bandwidth)
+    except (urllib.error.URLError, OSError, ValueError) as exc:
+        log.warning("Could not inspect master playlist (%s); using yt-dlp default.", exc)
+        return m3u8_url
+    if choice is None:
+        return m3u8_url
+
+    log.info(
+        "Selected %s: ~%s to fetch vs ~%s for the default variant (%.0fs of media)",
+        choice["kind"],
+        format_bytes(choice["estimated_bytes"]),
+        format_bytes(choice["default_estimated_bytes"]),
+        choice["duration"],
+    )
+    return choice["uri"]
 
 
-def download_audio(m3u8_url: str, output_path: str) -> str:
+def download_audio(
+    m3u8_url: str,
+    output_path: str,
+    select_audio: bool = True,
+    min_bandwidth: int = DEFAULT_MIN_BANDWIDTH,
+) -> str:
     """
     Download audio from an m3u8 stream and save it as an MP3 file using yt-dlp.
 
     Args:
         m3u8_url: The URL to download audio from.
         output_path: Destination file path for the MP3.
+        select_audio: Parse HLS master playlists and download an audio-only
+            (or lowest-bandwidth) rendition instead of yt-dlp's best variant.
+        min_bandwidth: Lowest declared variant bandwidth (bits/s) accepted
+            by *select_audio*.
 
     Returns:
         The path to the downloaded MP3 file.
@@ -41,19 +109,63 @@ def download_audio(m3u8_url: str, output_path: str) -> str:
         FileNotFoundError: If yt-dlp completes but the output file is missing.
         subprocess.CalledProcessError: If yt-dlp exits with a non-zero code.
     """
-    if not m3u8_url or not m3u8_url.strip():
+    m3u8_url = validate_url(m3u8_url)
+
+    source_url = m3u8_url
+    if select_audio:
+        source_url = _pick_audio_rendition(m3u8_url, min_bandwidth)
+
+    # The download holds a slot on the source host like any other fetch
+    with default_scheduler().transfer(source_url) as ticket:
+        log.info("Downloading audio from %s using yt-dlp...", source_url)
+        cmd, expected_file = ytdlp_command(source_url, output_path, rate_limit=ticket["rate_limit"])
+        try:
+            # Progress goes to stderr so stdout stays free for "-o -" output
+            subprocess.run(cmd, check=True, stdout=sys.stderr)
+        except subprocess.CalledProcessError as exc:
+            log.error("yt-dlp failed: %s", exc)
+            raise
+        if os.path.exists(expected_file):
+            ticket["output_bytes"] = os.path.getsize(expected_file)
+
+    if os.path.exists(expected_file):
+        log.info("Audio saved to %s", expected_file)
+        return expected_file
+
+    raise FileNotFoundError(
+        f"yt-dlp finished but {expected_file} was not found."
+    )
+
+
+def validate_url(url: str) -> str:
+    """
+    Return *url* stripped, or raise ValueError if it cannot be downloaded.
+
+    Raises:
+        ValueError: If the URL is empty or not http(s).
+    """
+    if not url or not url.strip():
         raise ValueError("URL cannot be empty.")
 
-    m3u8_url = m3u8_url.strip()
-    if not m3u8_url.startswith(("http://", "https://")):
+    url = url.strip()
+    if not url.startswith(("http://", "https://")):
         raise ValueError(
-            f"Invalid URL (must start with http:// or https://): {m3u8_url}"
+            f"Invalid URL (must start with http:// or https://): {url}"
         )
+    return url
 
-    log.info("Downloading audio from %s using yt-dlp...", m3u8_url)
 
-    base_name = os.path.splitext(output_path)[0]
+def ytdlp_command(
+    source_url: str,
+    output_path: str,
+    rate_limit: Optional[float] = None,
+) -> Tuple[List[str], str]:
+    """
+    The yt-dlp command extracting MP3 audio for *output_path*, and the file it creates.
 
+    *rate_limit* caps the download at that many bytes/s (``--limit-rate``).
+    """
+    base_name = os.path.splitext(output_path)[0]
     cmd = [
         "yt-dlp",
         "--extract-audio",
@@ -61,73 +173,564 @@ def download_audio(m3u8_url: str, output_path: str) -> str:
         "--output", f"{base_name}.%(ext)s",
         "--force-overwrites",
         "--no-check-certificates",
-        m3u8_url,
     ]
+    if rate_limit:
+        cmd += ["--limit-rate", str(max(1, int(rate_limit)))]
+    cmd.append(source_url)
+    return cmd, f"{base_name}.mp3"
 
-    try:
-        subprocess.run(cmd, check=True)
-    except subprocess.CalledProcessError as exc:
-        log.error("yt-dlp failed: %s", exc)
-        raise
 
-    expected_file = f"{base_name}.mp3"
-    if os.path.exists(expected_file):
-        log.info("Audio saved to %s", expected_file)
-        return expected_file
+def set_model_slot(slot: int) -> None:
+    """
+    Make the calling thread use model copy number *slot*.
 
-    raise FileNotFoundError(
-        f"yt-dlp finished but {expected_file} was not found."
-    )
+    Inference workers running concurrently must use distinct slots; slot 0
+    (the default) is shared by everything else.
+    """
+    _model_slot.value = slot
 
 
 def _load_model(model_name: str) -> Any:
     """Load (or return cached) Whisper model."""
-    if model_name in _model_cache:
-        log.debug("Using cached Whisper model '%s'", model_name)
-        return _model_cache[model_name]
+    slot = getattr(_model_slot, "value", 0)
+    key = f"{model_name}#{slot}" if slot else model_name
+    if key in _model_cache:
+        log.debug("Using cached Whisper model '%s'", key)
+        return _model_cache[key]
 
-    log.info("Loading Whisper model '%s'...", model_name)
+    log.info("Loading Whisper model '%s'...", key)
     model = whisper.load_model(model_name)
-    _model_cache[model_name] = model
+    _model_cache[key] = model
     return model
 
 
-def transcribe_audio(
+# ---------------------------------------------------------------------------
+# Bounded-memory (windowed) transcription
+# ---------------------------------------------------------------------------
+
+def decode_to_pcm(audio_path: str, pcm_path: str) -> subprocess.Popen:
+    """
+    Start ffmpeg decoding *audio_path* to raw 16 kHz mono s16le at *pcm_path*.
+
+    The process is returned without waiting so that transcription can begin
+    on the first windows while the rest of the file is still being decoded.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-y",
+        "-i", audio_path,
+        "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE),
+        pcm_path,
+    ]
+    log.debug("Decoding %s to %s", audio_path, pcm_path)
+    return subprocess.Popen(cmd, stdin=subprocess.DEVNULL)
+
+
+def _wait_for_samples(
+    pcm_path: str,
+    needed: int,
+    decoder: Optional[subprocess.Popen],
+) -> int:
+    """Block until *needed* samples exist (or decoding ends); return the count available."""
+    while True:
+        available = os.path.getsize(pcm_path) // _PCM_BYTES
+        if available >= needed:
+            return needed
+        if decoder is None or decoder.poll() is not None:
+            if decoder is not None and decoder.returncode != 0:
+                raise subprocess.CalledProcessError(decoder.returncode, decoder.args)
+            return os.path.getsize(pcm_path) // _PCM_BYTES
+        time.sleep(_DECODE_POLL_SECONDS)
+
+
+def _load_pcm_window(pcm_path: str, start: int, stop: int) -> np.ndarray:
+    """Map samples ``[start, stop)`` of a PCM file and return them as float32."""
+    view = np.memmap(
+        pcm_path, dtype=_PCM_DTYPE, mode="r",
+        offset=start * _PCM_BYTES, shape=(stop - start,),
+    )
+    try:
+        audio = view.astype(np.float32)
+    finally:
+        del view
+    audio /= 32768.0
+    return audio
+
+
+def _window_source(
+    pcm: Union[str, SharedAudio],
+    decoder: Optional[subprocess.Popen],
+) -> Tuple[Callable[[int], int], Callable[[int, int], np.ndarray]]:
+    """``(wait_for_samples, load_window)`` for a PCM file or a shared buffer."""
+    if isinstance(pcm, SharedAudio):
+        return (lambda needed: min(needed, len(pcm))), pcm.window
+    return (lambda needed: _wait_for_samples(pcm, needed, decoder)), (
+        lambda start, stop: _load_pcm_window(pcm, start, stop)
+    )
+
+
+def _shift_segment(seg: Dict[str, Any], offset: float, seg_id: int) -> Dict[str, Any]:
+    seg = dict(seg)
+    seg["id"] = seg_id
+    seg["start"] += offset
+    seg["end"] += offset
+    if seg.get("words"):
+        seg["words"] = [
+            {**w, "start": w["start"] + offset, "end": w["end"] + offset}
+            for w in seg["words"]
+        ]
+    return seg
+
+
+# ---------------------------------------------------------------------------
+# Stateful (streaming) transcription
+# ---------------------------------------------------------------------------
+
+class _EncoderCache(torch.nn.Module):
+    """
+    Wraps a Whisper audio encoder, returning the previous output for a repeated mel.
+
+    Within one ``model.transcribe`` call the same 30 s mel is encoded again
+    for every temperature fallback, for word alignment and (for a full
+    window) for language detection; the decoder's cross-attention
+    keys/values are projected from this output, so reusing it is exact.
+    """
+
+    def __init__(self, encoder: torch.nn.Module) -> None:
+        super().__init__()
+        self.encoder = encoder
+        self.hits = 0
+        self._mel: Optional[torch.Tensor] = None
+        self._features: Optional[torch.Tensor] = None
+
+    def forward(self, mel: torch.Tensor) -> torch.Tensor:
+        cached = self._mel
+        if (
+            cached is not None
+            and cached.shape == mel.shape
+            and cached.dtype == mel.dtype
+            and cached.device == mel.device
+            and torch.equal(cached, mel)
+        ):
+            self.hits += 1
+            return self._features
+        features = self.encoder(mel)
+        self._mel, self._features = mel.detach().clone(), features
+        return features
+
+
+class TranscriptionSession:
+    """
+    Transcribe a stream of audio chunk by chunk with a warm model.
+
+    The session keeps the model, the detected language and the text of the
+    final segments so far; each chunk is transcribed with that text as its
+    prompt (capped at :data:`PROMPT_TOKENS` tokens), so sentences continue
+    across chunk boundaries instead of every call starting cold.  The last
+    segment of every non-final chunk is held back and re-transcribed at the
+    start of the next chunk, so words cut by the boundary are not lost.
+
+    The encoder output of a chunk is reused within its ``model.transcribe``
+    call (see :class:`_EncoderCache`).  Decoder self-attention caches
+    depend on the audio through cross-attention in every layer but the
+    first, so they cannot be carried from one chunk to the next.
+
+    Streaming callers push 16-bit PCM bytes (or float32 samples) with
+    :meth:`feed` and call :meth:`flush` at the end of the stream::
+
+        session = TranscriptionSession("base", on_segment=print)
+        for pcm in packets:
+            session.feed(pcm)
+        session.flush()
+
+    Per-chunk timings are kept in :attr:`chunk_stats`.  A session must not
+    be used from several threads at once.
+
+    Args:
+        model: Whisper model name, or an already loaded model.
+        language: ISO-639-1 code; if None it is detected on the first chunk
+            and pinned for the rest of the stream.
+        chunk_seconds: Audio per ``model.transcribe`` call.
+        on_segment: Called with each segment as soon as it is final.
+        **transcribe_options: Passed through to ``model.transcribe``, except
+            ``initial_prompt``, which is the prompt until the first segment
+            is final.
+    """
+
+    def __init__(
+        self,
+        model: Any = "base",
+        language: Optional[str] = None,
+        chunk_seconds: float = DEFAULT_CHUNK_SECONDS,
+        on_segment: Optional[Callable[[Dict[str, Any]], None]] = None,
+        **transcribe_options: Any,
+    ) -> None:
+        self.chunk_samples = int(chunk_seconds * SAMPLE_RATE)
+        if self.chunk_samples <= 0:
+            raise ValueError("chunk_seconds must be positive.")
+        self.model = get_model(model) if isinstance(model, str) else model
+        self.language = language
+        self.on_segment = on_segment
+        self.initial_prompt: Optional[str] = transcribe_options.pop("initial_prompt", None)
+        self.transcribe_options = transcribe_options
+        self.segments: List[Dict[str, Any]] = []
+        self.chunk_stats: List[Dict[str, float]] = []
+        self.offset = 0  # samples of the stream already transcribed
+        self._pending: List[np.ndarray] = []
+        self._pending_samples = 0
+
+    @property
+    def prompt(self) -> Optional[str]:
+        """
+        Text of the latest final segments, within :data:`PROMPT_TOKENS` tokens.
+
+        Before any segment is final, the ``initial_prompt`` option (if given).
+        """
+        parts: List[str] = []
+        budget = PROMPT_TOKENS
+        for seg in reversed(self.segments):
+            cost = len(seg.get("tokens") or seg["text"].split())
+            if cost > budget:
+                break
+            parts.append(seg["text"])
+            budget -= cost
+        text = "".join(reversed(parts)).strip()
+        return text or self.initial_prompt or None
+
+    def feed(self, pcm: Union[bytes, np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        Add audio to the stream, transcribing every chunk that is complete.
+
+        Args:
+            pcm: 16 kHz mono s16le bytes, or float32 samples.
+
+        Returns:
+            The segments that became final during this call.
+        """
+        samples = pcm_to_float(pcm) if isinstance(pcm, (bytes, bytearray, memoryview)) else pcm
+        if len(samples):
+            self._pending.append(np.asarray(samples, dtype=np.float32))
+            self._pending_samples += len(samples)
+        done = len(self.segments)
+        while self._pending_samples >= self.chunk_samples:
+            audio = self._take_pending()
+            consumed = self.transcribe_chunk(audio[:self.chunk_samples])
+            self._keep_pending(audio[consumed:])
+        return self.segments[done:]
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """
+        Transcribe whatever audio is buffered as the end of the stream.
+
+        The session stays usable; audio fed afterwards continues the same
+        timeline.
+
+        Returns:
+            The segments that became final during this call.
+        """
+        done = len(self.segments)
+        if self._pending_samples:
+            self.transcribe_chunk(self._take_pending(), final=True)
+        return self.segments[done:]
+
+    def transcribe_chunk(self, audio: np.ndarray, final: bool = False) -> int:
+        """
+        Transcribe *audio*, which starts at :attr:`offset` in the stream.
+
+        Unless *final*, the last segment is held back.  Returns the number
+        of samples consumed; the caller passes the rest again at the start
+        of the next chunk.
+        """
+        if not len(audio):
+            return 0
+        started = time.perf_counter()
+        kwargs = dict(self.transcribe_options)
+        with self._encoder_reuse() as cache:
+            result = self.model.transcribe(
+                audio, language=self.language, initial_prompt=self.prompt, **kwargs,
+            )
+        elapsed = time.perf_counter() - started
+        self.language = self.language or result.get("language")
+
+        chunk_segs = list(result["segments"])
+        consumed = len(audio)
+        if not final and len(chunk_segs) > 1:
+            carried = chunk_segs.pop()
+            consumed = int(carried["start"] * SAMPLE_RATE)
+            if consumed <= 0:
+                chunk_segs.append(carried)
+                consumed = len(audio)
+
+        seconds = self.offset / SAMPLE_RATE
+        for seg in chunk_segs:
+            self.segments.append(_shift_segment(seg, seconds, len(self.segments)))
+            if self.on_segment:
+                self.on_segment(self.segments[-1])
+
+        self.chunk_stats.append({
+            "start": seconds,
+            "audio_seconds": len(audio) / SAMPLE_RATE,
+            "seconds": elapsed,
+            "encoder_reuses": cache.hits if cache is not None else 0,
+        })
+        log.debug(
+            "Chunk %.1fs-%.1fs transcribed in %.2fs",
+            seconds, (self.offset + len(audio)) / SAMPLE_RATE, elapsed,
+        )
+        self.offset += consumed
+        return consumed
+
+    def result(self) -> dict:
+        """Whisper-style result dict for everything transcribed so far."""
+        return {
+            "text": "".join(seg["text"] for seg in self.segments),
+            "segments": self.segments,
+            "language": self.language,
+        }
+
+    def _take_pending(self) -> np.ndarray:
+        audio = self._pending[0] if len(self._pending) == 1 else np.concatenate(self._pending)
+        self._pending, self._pending_samples = [], 0
+        return audio
+
+    def _keep_pending(self, rest: np.ndarray) -> None:
+        if len(rest):
+            # Copy so the rest of the chunk can be freed
+            self._pending, self._pending_samples = [rest.copy()], len(rest)
+
+    @contextlib.contextmanager
+    def _encoder_reuse(self) -> Iterator[Optional[_EncoderCache]]:
+        encoder = getattr(self.model, "encoder", None)
+        if not isinstance(encoder, torch.nn.Module) or isinstance(encoder, _EncoderCache):
+            yield None
+            return
+        cache = _EncoderCache(encoder)
+        self.model.encoder = cache
+        try:
+            yield cache
+        finally:
+            self.model.encoder = encoder
+
+
+def transcribe_pcm_windows(
+    model: Any,
+    pcm_path: Union[str, SharedAudio],
+    decoder: Optional[subprocess.Popen] = None,
+    window_seconds: float = DEFAULT_WINDOW_SECONDS,
+    on_segment: Optional[Callable[[Dict[str, Any]], None]] = None,
+    **kwargs: Any,
+) -> dict:
+    """
+    Transcribe a raw PCM file (or a shared buffer) window by window.
+
+    Each window is memory-mapped, converted to float32 and handed to
+    ``model.transcribe`` -- or, for :class:`SharedAudio`, sliced from the
+    shared samples without a copy -- so the log-mel spectrogram is only ever computed
+    for one window.  Windows go through a :class:`TranscriptionSession`:
+    the last segment of every non-final window is dropped and the next
+    window starts at its beginning, so sentences cut by the window edge are
+    re-transcribed whole, and the language detected on the first window and
+    the text so far carry over to the next.
+
+    Args:
+        model: Loaded Whisper model.
+        pcm_path: 16 kHz mono s16le file (may still be growing), or a
+            :class:`SharedAudio` buffer.
+        decoder: ffmpeg process writing *pcm_path*, or None if complete.
+        window_seconds: Audio per ``model.transcribe`` call.
+        on_segment: Called with each final segment as soon as its window
+            is done (for streaming output).
+        **kwargs: Passed through to ``model.transcribe``.
+
+    Returns:
+        Whisper-style result dict with ``text``, ``segments`` and ``language``.
+    """
+    window = int(window_seconds * SAMPLE_RATE)
+    if window <= 0:
+        raise ValueError("window_seconds must be positive.")
+
+    wait_for_samples, load_window = _window_source(pcm_path, decoder)
+    session = TranscriptionSession(
+        model, language=kwargs.pop("language", None), chunk_seconds=window_seconds,
+        on_segment=on_segment, **kwargs,
+    )
+
+    while True:
+        start = session.offset
+        stop = wait_for_samples(start + window)
+        if stop <= start:
+            break
+        final = stop < start + window
+
+        audio = load_window(start, stop)
+        log.debug("Transcribing window %.1fs-%.1fs", start / SAMPLE_RATE, stop / SAMPLE_RATE)
+        session.transcribe_chunk(audio, final=final)
+        del audio
+        if final:
+            break
+
+    return session.result()
+
+
+def _transcribe_bounded(
+    model: Any,
     audio_path: str,
+    window_seconds: float,
+    kwargs: Dict[str, Any],
+    on_segment: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> dict:
+    """Decode *audio_path* to a temporary PCM file and transcribe it windowed."""
+    pcm_path = make_scratch_file("audio.pcm")
+    decoder = decode_to_pcm(audio_path, pcm_path)
+    try:
+        return transcribe_pcm_windows(
+            model, pcm_path, decoder, window_seconds=window_seconds,
+            on_segment=on_segment, **kwargs,
+        )
+    finally:
+        if decoder.poll() is None:
+            decoder.terminate()
+            decoder.wait()
+        remove_scratch_file(pcm_path)
+
+
+def decode_to_shared(audio_path: str) -> SharedAudio:
+    """
+    Decode *audio_path* once into a :class:`SharedAudio` buffer.
+
+    Worker processes that receive the buffer read slices of it instead of
+    each decoding the file or being sent a pickled copy.  The caller owns
+    the returned reference and must :meth:`~SharedAudio.close` it.
+    """
+    pcm_path = make_scratch_file("audio.pcm")
+    try:
+        decoder = decode_to_pcm(audio_path, pcm_path)
+        if decoder.wait() != 0:
+            raise subprocess.CalledProcessError(decoder.returncode, decoder.args)
+        return SharedAudio.from_pcm_file(pcm_path)
+    finally:
+        remove_scratch_file(pcm_path)
+
+
+def get_model(model_name: str) -> Any:
+    """Return the cached Whisper model for *model_name*, loading it if needed."""
+    _validate_model(model_name)
+    return _load_model(model_name)
+
+
+def _validate_model(model_name: str) -> None:
+    if model_name not in VALID_MODELS:
+        raise ValueError(
+            f"Invalid model '{model_name}'. "
+            f"Choose from: {', '.join(sorted(VALID_MODELS))}"
+        )
+
+
+def pcm_to_float(pcm: bytes) -> np.ndarray:
+    """Convert raw 16-bit mono PCM bytes to the float32 waveform Whisper expects."""
+    audio = np.frombuffer(pcm, dtype=_PCM_DTYPE).astype(np.float32)
+    audio /= 32768.0
+    return audio
+
+
+def transcribe_samples(
+    samples: np.ndarray,
+    model_name: str = "base",
+    language: Optional[str] = None,
+    transcribe_options: Optional[Dict[str, Any]] = None,
+) -> dict:
+    """
+    Transcribe an in-memory 16 kHz mono float32 waveform.
+
+    Same as :func:`transcribe_audio` but for audio that has already been
+    decoded (chunks received over the network, slices of a shared buffer).
+    Timestamps are relative to the start of *samples*.
+    """
+    _validate_model(model_name)
+    model = _load_model(model_name)
+
+    kwargs: Dict[str, Any] = dict(transcribe_options or {})
+    if language:
+        kwargs["language"] = language
+    return model.transcribe(samples, **kwargs)
+
+
+def detect_language(samples: np.ndarray, model: Any = "base") -> str:
+    """
+    Detect the language spoken in the first 30 seconds of *samples*.
+
+    Args:
+        samples: 16 kHz mono float32 waveform.
+        model: Whisper model name, or an already loaded model.
+
+    Returns:
+        The most likely ISO-639-1 code (``"en"`` for English-only models).
+    """
+    model = get_model(model) if isinstance(model, str) else model
+    if not model.is_multilingual:
+        return "en"
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(samples), model.dims.n_mels)
+    _tokens, probs = model.detect_language(mel.to(model.device))
+    return max(probs, key=probs.get)
+
+
+def transcribe_audio(
+    audio_path: Union[str, SharedAudio],
     model_name: str = "base",
     language: Optional[str] = None,
+    bounded_memory: bool = False,
+    window_seconds: float = DEFAULT_WINDOW_SECONDS,
+    transcribe_options: Optional[Dict[str, Any]] = None,
+    on_segment: Optional[Callable[[Dict[str, Any]], None]] = None,
 ) -> dict:
     """
     Transcribe an audio file using OpenAI's Whisper model.
 
     Args:
-        audio_path: Path to the audio file.
+        audio_path: Path to the audio file, or an already decoded
+                  :class:`SharedAudio` buffer (not closed here).
         model_name: Whisper model size (tiny, base, small, medium, large).
         language: Optional ISO-639-1 language code (e.g. ``"en"``).
                   If *None*, Whisper auto-detects the language.
+        bounded_memory: Decode to a memory-mapped PCM file and transcribe
+                  window by window, keeping peak memory roughly constant
+                  regardless of input length.
+        window_seconds: Window length for *bounded_memory* mode.
+        transcribe_options: Extra keyword arguments for Whisper's
+                  ``transcribe`` (e.g. ``clip_timestamps``).
+        on_segment: Called with each segment once it is final -- per
+                  window in *bounded_memory* mode, otherwise at the end.
 
     Returns:
         Whisper result dict containing ``text`` and ``segments``.
 
     Raises:
-        ValueError: If the model name is invalid.
+        ValueError: If the model name is invalid or shared audio is not 16 kHz.
         FileNotFoundError: If the audio file does not exist.
     """
-    if model_name not in VALID_MODELS:
-        raise ValueError(
-            f"Invalid model '{model_name}'. "
-            f"Choose from: {', '.join(sorted(VALID_MODELS))}"
-        )
-    if not os.path.exists(audio_path):
+    _validate_model(model_name)
+    shared = isinstance(audio_path, SharedAudio)
+    if not shared and not os.path.exists(audio_path):
         raise FileNotFoundError(f"Audio file not found: {audio_path}")
+    if shared and audio_path.sample_rate != SAMPLE_RATE:
+        raise ValueError(f"Shared audio must be {SAMPLE_RATE} Hz, got {audio_path.sample_rate}")
 
     model = _load_model(model_name)
 
     log.info("Transcribing %s...", audio_path)
 
-    kwargs: Dict[str, Any] = {}
+    kwargs: Dict[str, Any] = dict(transcribe_options or {})
     if language:
         kwargs["language"] = language
 
-    result = model.transcribe(audio_path, **kwargs)
+    if bounded_memory:
+        if shared:
+            return transcribe_pcm_windows(
+                model, audio_path, window_seconds=window_seconds, on_segment=on_segment, **kwargs,
+            )
+        return _transcribe_bounded(model, audio_path, window_seconds, kwargs, on_segment)
+
+    result = model.transcribe(audio_path.samples if shared else audio_path, **kwargs)
+    if on_segment:
+        for seg in result["segments"]:
+            on_segment(seg)
     return result
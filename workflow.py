@@ -7,11 +7,27 @@ the CLI (main.py) and the GUI (gui.py) call the same logic.
 
 import logging
 import os
+import sqlite3
 from datetime import datetime
-from typing import Callable, Optional
+from typing import Any, Callable, Dict, Optional, Union
 
-from transcriber import download_audio, transcribe_audio, make_temp_audio_path
-from writers import write_transcript, SUPPORTED_FORMATS
+from diarize import diarize as diarize_segments
+from hls import DEFAULT_MIN_BANDWIDTH
+from logger import job_context, log_stage
+from profiling import StageProfiler
+from scratch import default_scratch, keep_scratch_file, remove_scratch_file
+from search_index import DEFAULT_INDEX_PATH, TranscriptIndex
+from tiering import transcribe_tiered
+from transcriber import (
+    DEFAULT_WINDOW_SECONDS,
+    decode_to_shared,
+    download_audio,
+    get_model,
+    make_temp_audio_path,
+    transcribe_audio,
+)
+from shared_audio import SharedAudio
+from writers import NdjsonStream, STDOUT, write_transcript, SUPPORTED_FORMATS
 
 log = logging.getLogger(__name__)
 
@@ -22,8 +38,17 @@ _FORMAT_EXT = {
     "pdf": ".pdf",
     "srt": ".srt",
     "txt": ".txt",
+    "json": ".json",
+    "ndjson": ".ndjson",
 }
 
+# NDJSON output is streamed: audio is transcribed in windows this long and
+# each window's segments are emitted as soon as it finishes.
+STREAM_WINDOW_SECONDS = 30.0
+
+# Speaker embeddings per audio hash, reused when a recording is re-run
+DIARIZATION_CACHE_DIR = os.path.join(TRANSCRIPTS_DIR, ".diarization")
+
 
 def resolve_output_path(
     custom_output: Optional[str] = None,
@@ -34,8 +59,10 @@ def resolve_output_path(
 
     If *custom_output* is provided (and non-empty), use it and ensure its
     parent directory exists.  Otherwise, generate a timestamped path inside
-    ``transcripts/``.
+    ``transcripts/``.  ``-`` (stdout) is returned unchanged.
     """
+    if custom_output and custom_output.strip() == STDOUT:
+        return STDOUT
     if custom_output and custom_output.strip():
         output = custom_output.strip()
         parent = os.path.dirname(output)
@@ -46,7 +73,201 @@ def resolve_output_path(
     ext = _FORMAT_EXT.get(fmt, ".pdf")
     os.makedirs(TRANSCRIPTS_DIR, exist_ok=True)
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    return os.path.join(TRANSCRIPTS_DIR, f"transcript_{timestamp}{ext}")
+    output = os.path.join(TRANSCRIPTS_DIR, f"transcript_{timestamp}{ext}")
+
+    # Queued jobs can finish within the same second -- never overwrite.
+    n = 2
+    while os.path.exists(output):
+        output = os.path.join(TRANSCRIPTS_DIR, f"transcript_{timestamp}_{n}{ext}")
+        n += 1
+    return output
+
+
+def remove_temp_audio(audio_path: str) -> None:
+    """
+    Delete a temporary audio file, logging (not raising) on failure.
+
+    For audio from :func:`transcriber.make_temp_audio_path` the whole scratch
+    job directory goes, including any yt-dlp intermediates.
+    """
+    remove_scratch_file(audio_path)
+
+
+def keep_temp_audio(audio_path: str) -> None:
+    """Keep a downloaded audio file (``keep_audio``) after the run finishes."""
+    keep_scratch_file(audio_path)
+    log.info("Audio kept at %s", audio_path)
+
+
+def index_transcript(
+    index_path: str,
+    segments: list,
+    output: str,
+    metadata: dict,
+) -> None:
+    """Add a finished job to the search index; failures are only logged."""
+    try:
+        with TranscriptIndex(index_path) as index:
+            index.add_job(segments, output, metadata=metadata)
+    except (sqlite3.Error, OSError) as exc:
+        log.warning("Failed to update search index %s: %s", index_path, exc)
+
+
+def _fan_out(
+    *callbacks: Optional[Callable[[Dict[str, Any]], None]],
+) -> Optional[Callable[[Dict[str, Any]], None]]:
+    """One segment callback calling every non-None *callbacks*, or None."""
+    active = [cb for cb in callbacks if cb is not None]
+    if not active:
+        return None
+    if len(active) == 1:
+        return active[0]
+
+    def _call_all(segment: Dict[str, Any]) -> None:
+        for cb in active:
+            cb(segment)
+
+    return _call_all
+
+
+def transcribe_to_output(
+    audio_path: str,
+    url: str,
+    output: str,
+    model_name: str = "base",
+    output_format: str = "pdf",
+    language: Optional[str] = None,
+    on_status: Optional[Callable[[str], None]] = None,
+    index_path: Optional[str] = DEFAULT_INDEX_PATH,
+    bounded_memory: bool = False,
+    refine_model: Optional[str] = None,
+    refine_options: Optional[Dict[str, Any]] = None,
+    profiler: Optional[StageProfiler] = None,
+    diarize: bool = False,
+    num_speakers: Optional[int] = None,
+    on_segment: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> dict:
+    """
+    Transcribe already-downloaded audio and write the transcript to *output*.
+
+    This is the inference half of :func:`generate_transcript`, split out so
+    that queued jobs can download concurrently while a single worker runs
+    the model.  Arguments match :func:`generate_transcript`; *profiler*
+    receives the ``transcribe`` and ``write`` stages.
+
+    With ``ndjson`` output (and no *refine_model* or *diarize*), segments
+    are written as each :data:`STREAM_WINDOW_SECONDS` window finishes
+    rather than at the end.
+
+    With *diarize*, the audio is decoded once into shared memory; both
+    Whisper and the diarization stage read that buffer.
+
+    *on_segment* receives every final segment: per window like NDJSON
+    output when segments can be streamed, otherwise once the transcript is
+    complete (refined / diarized).
+
+    Returns:
+        The Whisper result dict that was written.
+    """
+
+    def _status(msg: str) -> None:
+        log.info(msg)
+        if on_status:
+            on_status(msg)
+
+    profiler = profiler or StageProfiler(enabled=False)
+    metadata = {
+        "source_url": url,
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "model": model_name,
+        "language": language or "auto-detected",
+    }
+
+    # Segments are final as soon as their window is done unless a later
+    # stage (refinement, diarization) still changes them
+    live = not refine_model and not diarize
+    stream: Optional[NdjsonStream] = None
+    if output_format == "ndjson" and live:
+        stream = NdjsonStream(output, metadata)
+    emit = _fan_out(stream.write_segment if stream else None, on_segment if live else None)
+
+    # 2. Transcribe
+    models: Dict[str, Any] = {}
+    if profiler.enabled:
+        models = {name: get_model(name) for name in (model_name, refine_model) if name}
+
+    source: Union[str, SharedAudio] = audio_path
+    try:
+        if diarize:
+            _status("Decoding audio...")
+            with log_stage("decode", log), profiler.stage("decode"):
+                source = decode_to_shared(audio_path)
+
+        with log_stage("transcribe", log), profiler.stage("transcribe"), profiler.inference(models):
+            if refine_model:
+                def _write_draft(draft: dict) -> None:
+                    if output == STDOUT:
+                        # Only the refined transcript goes down the pipe
+                        return
+                    _status(f"Writing draft {output_format.upper()} transcript...")
+                    write_transcript(output_format, draft["segments"], output, metadata=metadata)
+                    _status(f"Draft saved to: {output}")
+                    _status(f"Refining low-confidence segments with '{refine_model}' model...")
+
+                _status(f"Transcribing draft with '{model_name}' model...")
+                result = transcribe_tiered(
+                    source,
+                    draft_model=model_name,
+                    final_model=refine_model,
+                    language=language,
+                    on_draft=_write_draft,
+                    bounded_memory=bounded_memory,
+                    **(refine_options or {}),
+                )
+                metadata["model"] = f"{model_name} -> {refine_model}"
+            else:
+                _status(f"Transcribing with '{model_name}' model...")
+                result = transcribe_audio(
+                    source,
+                    model_name=model_name,
+                    language=language,
+                    bounded_memory=bounded_memory or emit is not None,
+                    window_seconds=STREAM_WINDOW_SECONDS if emit else DEFAULT_WINDOW_SECONDS,
+                    on_segment=emit,
+                )
+
+        if isinstance(source, SharedAudio):
+            _status("Identifying speakers...")
+            with log_stage("diarize", log), profiler.stage("diarize"):
+                result["segments"] = diarize_segments(
+                    source.samples, result["segments"],
+                    num_speakers=num_speakers, cache_dir=DIARIZATION_CACHE_DIR,
+                )
+    except BaseException:
+        if stream is not None:
+            stream.close(complete=False)
+        raise
+    finally:
+        if isinstance(source, SharedAudio):
+            source.close()
+
+    if on_segment and not live:
+        for seg in result["segments"]:
+            on_segment(seg)
+
+    # 3. Write output
+    with log_stage("write", log), profiler.stage("write"):
+        if stream is not None:
+            stream.close()
+        else:
+            _status(f"Writing {output_format.upper()} transcript...")
+            write_transcript(output_format, result["segments"], output, metadata=metadata)
+        _status(f"Transcript saved to: {output}")
+
+        if index_path and output != STDOUT:
+            index_transcript(index_path, result["segments"], output, metadata)
+
+    return result
 
 
 def generate_transcript(
@@ -57,6 +278,15 @@ def generate_transcript(
     output_format: str = "pdf",
     language: Optional[str] = None,
     on_status: Optional[Callable[[str], None]] = None,
+    index_path: Optional[str] = DEFAULT_INDEX_PATH,
+    bounded_memory: bool = False,
+    refine_model: Optional[str] = None,
+    refine_options: Optional[Dict[str, Any]] = None,
+    select_audio: bool = True,
+    min_bandwidth: int = DEFAULT_MIN_BANDWIDTH,
+    profile: bool = False,
+    diarize: bool = False,
+    num_speakers: Optional[int] = None,
 ) -> str:
     """
     Full pipeline: download audio, transcribe with Whisper, write output.
@@ -64,11 +294,31 @@ def generate_transcript(
     Args:
         url: M3U8 / stream URL.
         model_name: Whisper model size.
-        output_path: Custom output path (None for auto-generated).
+        output_path: Custom output path (None for auto-generated, ``-``
+            for stdout).
         keep_audio: If True, keep the temporary MP3 after finishing.
-        output_format: Output format -- ``pdf``, ``srt``, or ``txt``.
+        output_format: Output format -- ``pdf``, ``srt``, ``txt``, ``json``
+            or ``ndjson`` (streamed as segments are produced).
         language: Optional ISO-639-1 language code for Whisper.
         on_status: Optional callback invoked with status messages.
+        index_path: Search index to add the new segments to (None to skip).
+        bounded_memory: Transcribe window by window from a memory-mapped
+            PCM file (for very long inputs).
+        refine_model: If set, *model_name* produces a draft that is written
+            immediately, then low-confidence segments are re-transcribed
+            with this larger model and the output is rewritten in place.
+        refine_options: Threshold overrides for
+            :func:`tiering.transcribe_tiered` (``min_avg_logprob``,
+            ``max_compression_ratio``, ``max_no_speech_prob``).
+        select_audio: Pick an audio-only / lowest-bandwidth HLS rendition
+            instead of yt-dlp's default best variant.
+        min_bandwidth: Lowest declared variant bandwidth (bits/s) accepted
+            when *select_audio* is on.
+        profile: Profile each stage and write ``.prof``, ``.collapsed``
+            (flamegraph input) and ``.profile.txt`` files next to the
+            transcript.
+        diarize: Label segments with speakers (``Speaker 1``, ...).
+        num_speakers: Exact number of speakers for *diarize*, if known.
 
     Returns:
         The path to the generated transcript file.
@@ -84,34 +334,45 @@ def generate_transcript(
 
     audio_path = make_temp_audio_path()
     output = resolve_output_path(output_path, fmt=output_format)
+    profiler = StageProfiler(enabled=profile)
 
-    try:
-        # 1. Download
-        _status("Downloading audio...")
-        download_audio(url, audio_path)
-
-        # 2. Transcribe
-        _status(f"Transcribing with '{model_name}' model...")
-        result = transcribe_audio(audio_path, model_name=model_name, language=language)
-
-        # 3. Write output
-        _status(f"Writing {output_format.upper()} transcript...")
-        metadata = {
-            "source_url": url,
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "model": model_name,
-            "language": language or "auto-detected",
-        }
-        write_transcript(output_format, result["segments"], output, metadata=metadata)
-        _status(f"Transcript saved to: {output}")
+    # Tag this run's log records (and its per-job log file) with the output name
+    with job_context(os.path.splitext(os.path.basename(output))[0]):
+        try:
+            # 1. Download
+            default_scratch().wait_for_space(on_wait=_status)
+            _status("Downloading audio...")
+            with log_stage("download", log), profiler.stage("download"):
+                download_audio(
+                    url, audio_path, select_audio=select_audio, min_bandwidth=min_bandwidth,
+                )
 
-        return output
+            # 2-3. Transcribe and write
+            transcribe_to_output(
+                audio_path,
+                url,
+                output,
+                model_name=model_name,
+                output_format=output_format,
+                language=language,
+                on_status=on_status,
+                index_path=index_path,
+                bounded_memory=bounded_memory,
+                refine_model=refine_model,
+                refine_options=refine_options,
+                profiler=profiler,
+                diarize=diarize,
+                num_speakers=num_speakers,
+            )
 
-    finally:
-        # Cleanup temp audio
-        if not keep_audio and os.path.exists(audio_path):
-            try:
-                os.remove(audio_path)
-                log.debug("Removed temporary file %s", audio_path)
-            except OSError as exc:
-                log.warning("Failed to remove temp file %s: %s", audio_path, exc)
+            report_base = output if output != STDOUT else os.path.join(TRANSCRIPTS_DIR, "stdout")
+            for path in profiler.write_report(report_base):
+                _status(f"Profile saved to: {path}")
+            return output
+
+        finally:
+            # Cleanup temp audio
+            if keep_audio:
+                keep_temp_audio(audio_path)
+            else:
+                remove_temp_audio(audio_path)
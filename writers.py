@@ -1,18 +1,35 @@
 """
 Output format writers for transcript segments.
 
-Supported formats: PDF, SRT, TXT.
+Supported formats: PDF, SRT, TXT, JSON and NDJSON.  Every writer accepts
+``"-"`` as the output path to write to stdout instead of a file.
 """
 
+import contextlib
+import json
 import logging
+import sys
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
 
+import numpy as np
 from fpdf import FPDF
 
 log = logging.getLogger(__name__)
 
-SUPPORTED_FORMATS = {"pdf", "srt", "txt"}
+SUPPORTED_FORMATS = {"pdf", "srt", "txt", "json", "ndjson"}
+
+# Output path meaning "write to stdout"
+STDOUT = "-"
+
+# Segment fields copied into JSON output when present
+_JSON_OPTIONAL_FIELDS = ("model", "speaker", "avg_logprob", "no_speech_prob")
+
+# Lookup tables for the bulk timestamp formatters
+_MMSS = [f"{m:02d}:{s:02d}" for m in range(60) for s in range(60)]
+_MILLIS = [f"{ms:03d}" for ms in range(1000)]
+# Beyond this the bulk path hands values to the scalar formatters
+_BULK_MAX_SECONDS = 1e9
 
 
 # ---------------------------------------------------------------------------
@@ -34,6 +51,80 @@ def _srt_timestamp(seconds: float) -> str:
     return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
 
 
+def _bulk_split(seconds: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Float array of *seconds* and a mask of the values the bulk path handles."""
+    values = np.asarray(seconds, dtype=np.float64)
+    fast = (values >= 0) & (values < _BULK_MAX_SECONDS)
+    return values, fast
+
+
+def format_seconds_bulk(seconds: Sequence[float]) -> List[str]:
+    """:func:`format_seconds` for many values at once (identical output)."""
+    values, fast = _bulk_split(seconds)
+    whole = np.trunc(np.where(fast, values, 0)).astype(np.int64)
+    days, whole = np.divmod(whole, 86400)
+    hours, rest = np.divmod(whole, 3600)
+    out = [
+        f"{d} day{'s' if d != 1 else ''}, {h}:{_MMSS[r]}" if d else f"{h}:{_MMSS[r]}"
+        for d, h, r in zip(days.tolist(), hours.tolist(), rest.tolist())
+    ]
+    for i in np.flatnonzero(~fast).tolist():
+        out[i] = format_seconds(seconds[i])
+    return out
+
+
+def _srt_timestamps(seconds: Sequence[float]) -> List[str]:
+    """:func:`_srt_timestamp` for many values at once (identical output)."""
+    values, fast = _bulk_split(seconds)
+    values = np.where(fast, values, 0.0)
+    whole = np.trunc(values)
+    frac = values - whole
+    # timedelta rounds to the microsecond, which can carry into the seconds;
+    # the milliseconds are truncated from the unrounded fraction
+    total = whole.astype(np.int64) + (np.round(frac * 1e6) >= 1e6)
+    millis = np.trunc(frac * 1000).astype(np.int64)
+    hours, rest = np.divmod(total, 3600)
+    out = [
+        f"{h:02d}:{_MMSS[r]},{_MILLIS[ms]}"
+        for h, r, ms in zip(hours.tolist(), rest.tolist(), millis.tolist())
+    ]
+    for i in np.flatnonzero(~fast).tolist():
+        out[i] = _srt_timestamp(seconds[i])
+    return out
+
+
+def _segment_text(segment: Dict[str, Any]) -> str:
+    """Stripped text, prefixed with the speaker label of diarized segments."""
+    text = segment["text"].strip()
+    speaker = segment.get("speaker")
+    return f"{speaker}: {text}" if speaker else text
+
+
+@contextlib.contextmanager
+def _open_text(output_path: str) -> Iterator[TextIO]:
+    """Open *output_path* for writing, or yield stdout (unclosed) for ``-``."""
+    if output_path == STDOUT:
+        yield sys.stdout
+        sys.stdout.flush()
+        return
+    with open(output_path, "w", encoding="utf-8") as fh:
+        yield fh
+
+
+def segment_record(segment: Dict[str, Any], idx: int) -> Dict[str, Any]:
+    """JSON-ready dict for one segment (times in seconds, rounded to ms)."""
+    record: Dict[str, Any] = {
+        "id": idx,
+        "start": round(float(segment["start"]), 3),
+        "end": round(float(segment["end"]), 3),
+        "text": segment["text"].strip(),
+    }
+    for key in _JSON_OPTIONAL_FIELDS:
+        if segment.get(key) is not None:
+            record[key] = segment[key]
+    return record
+
+
 # ---------------------------------------------------------------------------
 # PDF writer
 # ---------------------------------------------------------------------------
@@ -97,7 +188,7 @@ def write_pdf(
     for segment in segments:
         start = format_seconds(segment["start"])
         end = format_seconds(segment["end"])
-        text = segment["text"].strip()
+        text = _segment_text(segment)
 
         pdf.set_font("helvetica", "B", 10)
         pdf.cell(30, 8, f"[{start} - {end}]", new_x="RIGHT", new_y="TOP", align="L")
@@ -107,7 +198,11 @@ def write_pdf(
         pdf.ln(2)
 
     log.info("Writing PDF to %s...", output_path)
-    pdf.output(output_path)
+    if output_path == STDOUT:
+        sys.stdout.buffer.write(pdf.output())
+        sys.stdout.buffer.flush()
+    else:
+        pdf.output(output_path)
 
 
 # ---------------------------------------------------------------------------
@@ -121,12 +216,14 @@ def write_srt(
 ) -> None:
     """Write segments to an SRT subtitle file."""
     log.info("Writing SRT to %s...", output_path)
-    with open(output_path, "w", encoding="utf-8") as fh:
-        for idx, seg in enumerate(segments, start=1):
-            start_ts = _srt_timestamp(seg["start"])
-            end_ts = _srt_timestamp(seg["end"])
-            text = seg["text"].strip()
-            fh.write(f"{idx}\n{start_ts} --> {end_ts}\n{text}\n\n")
+    starts = _srt_timestamps([seg["start"] for seg in segments])
+    ends = _srt_timestamps([seg["end"] for seg in segments])
+    body = "".join([
+        f"{idx}\n{start} --> {end}\n{_segment_text(seg)}\n\n"
+        for idx, (seg, start, end) in enumerate(zip(segments, starts, ends), start=1)
+    ])
+    with _open_text(output_path) as fh:
+        fh.write(body)
 
 
 # ---------------------------------------------------------------------------
@@ -140,21 +237,91 @@ def write_txt(
 ) -> None:
     """Write segments to a plain-text file with timestamps."""
     log.info("Writing TXT to %s...", output_path)
-    with open(output_path, "w", encoding="utf-8") as fh:
-        if metadata:
-            if metadata.get("source_url"):
-                fh.write(f"Source: {metadata['source_url']}\n")
-            if metadata.get("date"):
-                fh.write(f"Date:   {metadata['date']}\n")
-            if metadata.get("model"):
-                fh.write(f"Model:  {metadata['model']}\n")
-            fh.write("\n" + "=" * 60 + "\n\n")
-
-        for seg in segments:
-            start = format_seconds(seg["start"])
-            end = format_seconds(seg["end"])
-            text = seg["text"].strip()
-            fh.write(f"[{start} - {end}]  {text}\n")
+    parts: List[str] = []
+    if metadata:
+        if metadata.get("source_url"):
+            parts.append(f"Source: {metadata['source_url']}\n")
+        if metadata.get("date"):
+            parts.append(f"Date:   {metadata['date']}\n")
+        if metadata.get("model"):
+            parts.append(f"Model:  {metadata['model']}\n")
+        parts.append("\n" + "=" * 60 + "\n\n")
+
+    starts = format_seconds_bulk([seg["start"] for seg in segments])
+    ends = format_seconds_bulk([seg["end"] for seg in segments])
+    parts.extend([
+        f"[{start} - {end}]  {_segment_text(seg)}\n"
+        for seg, start, end in zip(segments, starts, ends)
+    ])
+    with _open_text(output_path) as fh:
+        fh.write("".join(parts))
+
+
+# ---------------------------------------------------------------------------
+# JSON / NDJSON writers
+# ---------------------------------------------------------------------------
+
+def write_json(
+    segments: List[Dict[str, Any]],
+    output_path: str,
+    metadata: Optional[Dict[str, str]] = None,
+) -> None:
+    """Write the whole result as one JSON document: ``{"metadata", "segments"}``."""
+    log.info("Writing JSON to %s...", output_path)
+    doc = {
+        "metadata": dict(metadata or {}),
+        "segments": [segment_record(seg, idx) for idx, seg in enumerate(segments)],
+    }
+    with _open_text(output_path) as fh:
+        json.dump(doc, fh, ensure_ascii=False, indent=2)
+        fh.write("\n")
+
+
+class NdjsonStream:
+    """
+    Newline-delimited JSON, one object per line, flushed as it is written.
+
+    Lines are ``{"type": "metadata", ...}`` first, then one
+    ``{"type": "segment", ...}`` per segment, and ``{"type": "done",
+    "segments": n}`` on a complete :meth:`close`, so a consumer reading a
+    pipe knows whether the transcript is complete.
+    """
+
+    def __init__(self, output_path: str, metadata: Optional[Dict[str, str]] = None) -> None:
+        self.output_path = output_path
+        self.count = 0
+        if output_path == STDOUT:
+            self._fh: TextIO = sys.stdout
+        else:
+            self._fh = open(output_path, "w", encoding="utf-8")
+        self._write({"type": "metadata", **(metadata or {})})
+
+    def _write(self, obj: Dict[str, Any]) -> None:
+        self._fh.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def write_segment(self, segment: Dict[str, Any]) -> None:
+        self._write({"type": "segment", **segment_record(segment, self.count)})
+        self.count += 1
+
+    def close(self, complete: bool = True) -> None:
+        if complete:
+            self._write({"type": "done", "segments": self.count})
+        if self._fh is not sys.stdout:
+            self._fh.close()
+
+
+def write_ndjson(
+    segments: List[Dict[str, Any]],
+    output_path: str,
+    metadata: Optional[Dict[str, str]] = None,
+) -> None:
+    """Write segments as NDJSON (see :class:`NdjsonStream`)."""
+    log.info("Writing NDJSON to %s...", output_path)
+    stream = NdjsonStream(output_path, metadata)
+    for seg in segments:
+        stream.write_segment(seg)
+    stream.close()
 
 
 # ---------------------------------------------------------------------------
@@ -165,6 +332,8 @@ _WRITERS = {
     "pdf": write_pdf,
     "srt": write_srt,
     "txt": write_txt,
+    "json": write_json,
+    "ndjson": write_ndjson,
 }
 
 
@@ -178,9 +347,9 @@ def write_transcript(
     Dispatch to the correct writer based on *fmt*.
 
     Args:
-        fmt: Output format (``pdf``, ``srt``, or ``txt``).
+        fmt: Output format (``pdf``, ``srt``, ``txt``, ``json`` or ``ndjson``).
         segments: Whisper segment dicts.
-        output_path: Destination file path.
+        output_path: Destination file path, or ``-`` for stdout.
         metadata: Optional metadata dict for the header/footer.
 
     Raises: